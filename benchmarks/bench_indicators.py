@@ -0,0 +1,49 @@
+"""
+技术指标引擎基准测试：随机生成 股票数 × 交易日数 的日K线，一次调用计算全部指标
+
+运行方式：python -m benchmarks.bench_indicators --stocks 5000 --days 1250
+"""
+import argparse
+import time
+
+import numpy as np
+
+from src.analytics.indicators import compute_indicators
+
+
+def random_ohlcv(stocks: int, days: int, seed: int = 0):
+    """几何随机游走生成的OHLCV"""
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, (stocks, days)), axis=1))
+    spread = np.abs(rng.normal(0, 0.01, (stocks, days)))
+    return {
+        "open": close * (1 + rng.normal(0, 0.005, (stocks, days))),
+        "high": close * (1 + spread),
+        "low": close * (1 - spread),
+        "close": close,
+        "volume": rng.lognormal(13, 0.5, (stocks, days)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the NumPy indicator engine")
+    parser.add_argument("--stocks", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=1250, help="Trading days (about 250 per year)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    ohlcv = random_ohlcv(args.stocks, args.days)
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        indicators = compute_indicators(ohlcv)
+        timings.append(time.perf_counter() - start)
+
+    bars = args.stocks * args.days
+    best = min(timings)
+    print(f"{args.stocks} stocks x {args.days} days = {bars:,} bars, {len(indicators)} indicator series")
+    print(f"best of {args.repeat}: {best:.2f}s ({bars / best / 1e6:.1f}M bars/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+K线存储基准测试：对比每次分析都通过MCP拉取K线与使用本地列式存储的预取耗时
+
+在临时目录生成随机日线（覆盖3年估值回看期），MCP服务器由桩函数代替：每次调用先等待
+--mcp-latency 毫秒（stdio往返和数据源查询），再按返回行数每行等待 --mcp-row-cost 毫秒
+（数据源分页和Markdown序列化），返回与get_historical_k_data/get_adjust_factor_data
+相同格式的Markdown表格（价格不做复权，不影响耗时）。逐只股票测量K线和估值两个数据块：
+    - mcp:              按build_prefetch_requests拉取6个月K线和3年估值数据并解析Markdown
+    - store（新交易日）: prefetch_from_store增量同步一根新K线，再从存储读取
+    - store（当日重跑）: 存储已是最新，不调用MCP，只从存储读取
+加上 --mcp 时再对指定股票实际调用get_historical_k_data（需要可用的MCP服务器）。
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_kline_store --stocks 20 --mcp-latency 150 [--mcp sh.600519]
+    python benchmarks/bench_kline_store.py --stocks 20
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, time as dt_time, timedelta
+
+import numpy as np
+import pandas as pd
+
+# 直接以脚本运行时把项目根目录加入路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.agents.prefetch_agent import (  # noqa: E402
+    VALUATION_LOOKBACK_DAYS, build_prefetch_requests, prefetch_from_store)
+from src.analytics.kline import kline_frame  # noqa: E402
+from src.analytics.kline_store import KlineStore, frame_from_columns  # noqa: E402
+from src.analytics.valuation import valuation_frame  # noqa: E402
+from src.tools.tool_cache import CHINA_TZ  # noqa: E402
+
+# 未指定fields时get_historical_k_data返回的字段
+DEFAULT_KLINE_FIELDS = ["date", "code", "open", "high", "low", "close", "volume", "amount",
+                        "turn", "tradestatus", "pctChg"]
+FACTOR_FIELDS = ["code", "dividOperateDate", "foreAdjustFactor", "backAdjustFactor", "adjustFactor"]
+
+
+def markdown_table(df: pd.DataFrame) -> str:
+    lines = ["| " + " | ".join(df.columns) + " |", "|" + "---|" * len(df.columns)]
+    for row in df.itertuples(index=False):
+        lines.append("| " + " | ".join(str(value) for value in row) + " |")
+    return "\n".join(lines)
+
+
+def random_history(code: str, dates: pd.DatetimeIndex, rng: np.random.Generator):
+    """随机游走生成的不复权日线（含估值字段）和两次除权除息"""
+    days = len(dates)
+    close = np.round(10 * np.exp(np.cumsum(rng.normal(0, 0.02, days))), 2)
+    bars = pd.DataFrame({
+        "date": dates.strftime("%Y-%m-%d"), "code": code, "open": close,
+        "high": np.round(close * 1.01, 2), "low": np.round(close * 0.99, 2), "close": close,
+        "volume": rng.lognormal(13, 0.5, days).round(), "amount": np.round(close * 1e6, 2),
+        "turn": 1.0, "tradestatus": 1, "pctChg": 0.0, "peTTM": np.round(close * 2, 4),
+        "pbMRQ": np.round(close / 5, 4), "psTTM": 3.0, "pcfNcfTTM": 12.0})
+    factors = pd.DataFrame({
+        "code": code, "dividOperateDate": bars["date"].iloc[[days // 3, 2 * days // 3]].tolist(),
+        "foreAdjustFactor": [0.83, 0.91], "backAdjustFactor": [1.1, 1.2], "adjustFactor": [1.1, 1.2]})
+    return bars, factors
+
+
+class StubMCP:
+    """代替MCP服务器的call_mcp_tool：按请求的日期范围返回生成的数据，并模拟往返和传输耗时"""
+
+    def __init__(self, history, latency_ms: float, row_cost_ms: float):
+        self.history = history
+        self.latency_ms = latency_ms
+        self.row_cost_ms = row_cost_ms
+        self.calls = 0
+        self.rows = 0
+
+    async def __call__(self, tool_name: str, args):
+        bars, factors = self.history[args["code"]]
+        if tool_name == "get_adjust_factor_data":
+            dates = factors["dividOperateDate"]
+            table = factors[(dates >= args["start_date"]) & (dates <= args["end_date"])][FACTOR_FIELDS]
+        else:
+            fields = args.get("fields") or DEFAULT_KLINE_FIELDS
+            if isinstance(fields, str):
+                fields = fields.split(",")
+            table = bars[(bars["date"] >= args["start_date"]) & (bars["date"] <= args["end_date"])][fields]
+        self.calls += 1
+        self.rows += len(table)
+        await asyncio.sleep((self.latency_ms + len(table) * self.row_cost_ms) / 1000)
+        return markdown_table(table)
+
+
+async def fetch_via_mcp(stub: StubMCP, code: str, current_date: str):
+    """不使用存储时的预取：K线和估值两个请求并发，分析师再解析Markdown"""
+    requests = [(path[0], name, args) for path, name, args in build_prefetch_requests(code, current_date)
+                if path[0] in ("kline", "valuation")]
+    texts = await asyncio.gather(*(stub(name, args) for _, name, args in requests))
+    for (section, _, _), text in zip(requests, texts):
+        if section == "kline":
+            kline_frame(text)
+        else:
+            valuation_frame(text)
+
+
+async def fetch_via_store(store: KlineStore, stub: StubMCP, code: str, current_date: str):
+    """使用存储时的预取：增量同步后，分析师直接从存储读取（与read_prefetched相同）"""
+    sections = await prefetch_from_store(store, code, current_date, stub)
+    assert sections, f"store did not cover {code}"
+    for section in sections.values():
+        source = section["source"]
+        frame_from_columns(store.read(code, source["start_date"], source["end_date"],
+                                      source["fields"], source["adjust"]))
+
+
+async def time_per_stock(codes, fetch, stub: StubMCP):
+    """依次处理每只股票，返回 (每只股票的毫秒数, 每只股票的MCP调用数, 每只股票传输的行数)"""
+    stub.calls = stub.rows = 0
+    start = time.perf_counter()
+    for code in codes:
+        await fetch(code)
+    elapsed = time.perf_counter() - start
+    return elapsed / len(codes) * 1000, stub.calls / len(codes), stub.rows / len(codes)
+
+
+async def time_real_mcp(codes, start_date: str, end_date: str) -> float:
+    from src.tools.mcp_client import call_mcp_tool
+    start = time.perf_counter()
+    for code in codes:
+        await call_mcp_tool("get_historical_k_data", {
+            "code": code, "start_date": start_date, "end_date": end_date,
+            "frequency": "d", "adjust_flag": "2"})
+    return (time.perf_counter() - start) / len(codes) * 1000
+
+
+async def run(args):
+    today = datetime.now(CHINA_TZ)
+    current_date = today.strftime("%Y-%m-%d")
+    dates = pd.bdate_range(start=today.date() - timedelta(days=VALUATION_LOOKBACK_DAYS + 30),
+                           end=current_date)
+    rng = np.random.default_rng(0)
+    codes = [f"sh.{600000 + i}" for i in range(args.stocks)]
+    history = {code: random_history(code, dates, rng) for code in codes}
+    stub = StubMCP(history, args.mcp_latency, args.mcp_row_cost)
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        # 存储中已有到上一个交易日的数据，最近一次同步在当日数据就绪之前
+        store = KlineStore(store_dir)
+        synced_at = datetime.combine(dates[-2].date(), dt_time(9), tzinfo=CHINA_TZ).isoformat()
+        for code, (bars, factors) in history.items():
+            stored_factors = pd.DataFrame({"date": factors["dividOperateDate"],
+                                           "back": factors["backAdjustFactor"]})
+            store.append(code, bars.iloc[:-1], stored_factors,
+                         start_date=bars["date"].iloc[0], synced_at=synced_at)
+
+        results = [
+            ("mcp (fetch every run)", await time_per_stock(
+                codes, lambda code: fetch_via_mcp(stub, code, current_date), stub)),
+            ("store (new trading day)", await time_per_stock(
+                codes, lambda code: fetch_via_store(store, stub, code, current_date), stub)),
+            ("store (same-day rerun)", await time_per_stock(
+                codes, lambda code: fetch_via_store(store, stub, code, current_date), stub)),
+        ]
+
+    print(f"{args.stocks} stocks, stub MCP latency {args.mcp_latency:g} ms + "
+          f"{args.mcp_row_cost:g} ms/row, kline + valuation sections per stock")
+    for name, (ms, calls, rows) in results:
+        print(f"{name:<26} {ms:9.2f} ms/stock  {calls:4.1f} MCP calls  {rows:7.1f} rows")
+
+    if args.mcp:
+        start = (today - timedelta(days=183)).strftime("%Y-%m-%d")
+        mcp_ms = await time_real_mcp(args.mcp, start, current_date)
+        print(f"{'real MCP kline fetch':<26} {mcp_ms:9.2f} ms/stock (plus parsing)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark K-line prefetch through the local store against MCP fetches")
+    parser.add_argument("--stocks", type=int, default=20)
+    parser.add_argument("--mcp-latency", type=float, default=150.0,
+                        help="Simulated round trip per MCP call in milliseconds")
+    parser.add_argument("--mcp-row-cost", type=float, default=0.02,
+                        help="Simulated transfer and formatting cost per returned row in milliseconds")
+    parser.add_argument("--mcp", nargs="*", metavar="CODE",
+                        help="Also time real MCP fetches for these stock codes")
+    args = parser.parse_args()
+    # 预取的同步日志会逐只股票输出，基准测试时只保留警告
+    logging.disable(logging.INFO)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+DataPrefetch Agent: Deterministically fetches the standard data bundle for a stock
+before the analysts run, so their ReAct loops start from data instead of discovering it.
+预取有截止时间（NODE_DEADLINE_DATA_PREFETCH），超时后保留已获取的数据块，
+未完成的请求记为失败，对应的分析师改用工具自行获取。
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Tuple
+
+from src.utils.state_definition import AgentState
+from src.tools.mcp_client import call_mcp_tool
+from src.analytics.kline_store import KlineStore, get_kline_store, format_markdown
+from src.utils.logging_config import setup_logger, ERROR_ICON, SUCCESS_ICON, WAIT_ICON
+from src.utils.execution_logger import get_execution_logger
+from src.utils.deadlines import get_node_deadline
+
+logger = setup_logger(__name__)
+
+# 预取的时间范围
+KLINE_LOOKBACK_DAYS = 183           # 约6个月的日K线
+VALUATION_LOOKBACK_DAYS = 3 * 365   # 约3年的估值历史
+FINANCIAL_QUARTERS = 8              # 最近8个季度的财务数据
+DIVIDEND_YEARS = 3                  # 最近3年的分红数据
+
+# 季度财务数据对应的MCP工具
+FINANCIAL_TOOLS = {
+    "profit": "get_profit_data",
+    "operation": "get_operation_data",
+    "growth": "get_growth_data",
+    "balance": "get_balance_data",
+    "cash_flow": "get_cash_flow_data",
+    "dupont": "get_dupont_data",
+}
+
+VALUATION_FIELDS = ["date", "code", "close", "peTTM", "pbMRQ", "psTTM", "pcfNcfTTM"]
+
+# 从本地K线存储生成K线数据块时包含的字段（前复权）
+KLINE_STORE_FIELDS = ["open", "high", "low", "close", "volume", "amount", "turn", "tradestatus", "pctChg"]
+
+# 各数据块的中文标题，用于拼接到分析师的提示词中
+SECTION_TITLES = {
+    "basic_info": "股票基本信息",
+    "kline": "近6个月日K线（前复权）",
+    "valuation": "历史估值指标（PE/PB/PS/PCF）",
+    "financials": "最近8个季度财务数据",
+    "dividends": "近年分红数据",
+}
+
+# 各分析师使用的数据块；增量分析按这些数据块的指纹判断分析结果能否复用
+ANALYST_SECTIONS = {
+    "fundamental_agent": ["basic_info", "financials", "dividends"],
+    "technical_agent": ["basic_info", "kline"],
+    "value_agent": ["basic_info", "valuation", "dividends"],
+}
+
+
+def recent_quarters(current_date: str, count: int = FINANCIAL_QUARTERS) -> List[Tuple[int, int]]:
+    """返回current_date之前已结束的最近count个季度，按时间倒序，如 [(2024, 3), (2024, 2), ...]"""
+    today = datetime.strptime(current_date, "%Y-%m-%d")
+    year, quarter = today.year, (today.month - 1) // 3
+    quarters = []
+    while len(quarters) < count:
+        if quarter == 0:
+            year, quarter = year - 1, 4
+        quarters.append((year, quarter))
+        quarter -= 1
+    return quarters
+
+
+def build_prefetch_requests(stock_code: str, current_date: str) -> List[Tuple[Tuple[str, ...], str, Dict[str, Any]]]:
+    """
+    构造标准数据包的全部工具调用
+
+    Returns:
+        列表，每项为 (结果路径, 工具名称, 工具参数)，结果路径用于把结果放回嵌套字典
+    """
+    today = datetime.strptime(current_date, "%Y-%m-%d")
+    kline_start = (today - timedelta(days=KLINE_LOOKBACK_DAYS)).strftime("%Y-%m-%d")
+    valuation_start = (today - timedelta(days=VALUATION_LOOKBACK_DAYS)).strftime("%Y-%m-%d")
+
+    requests = [
+        (("basic_info",), "get_stock_basic_info", {"code": stock_code}),
+        (("kline",), "get_historical_k_data", {
+            "code": stock_code, "start_date": kline_start, "end_date": current_date,
+            "frequency": "d", "adjust_flag": "2"}),
+        (("valuation",), "get_historical_k_data", {
+            "code": stock_code, "start_date": valuation_start, "end_date": current_date,
+            "frequency": "d", "adjust_flag": "3", "fields": VALUATION_FIELDS}),
+    ]
+    for year, quarter in recent_quarters(current_date):
+        for section, tool_name in FINANCIAL_TOOLS.items():
+            requests.append((("financials", section, f"{year}Q{quarter}"), tool_name, {
+                "code": stock_code, "year": str(year), "quarter": quarter}))
+    for year in range(today.year - DIVIDEND_YEARS + 1, today.year + 1):
+        requests.append((("dividends", str(year)), "get_dividend_data", {
+            "code": stock_code, "year": str(year), "year_type": "report"}))
+    return requests
+
+
+async def prefetch_from_store(store: KlineStore, stock_code: str, current_date: str,
+                              call_tool) -> Dict[str, Dict[str, Any]]:
+    """
+    增量同步本地K线存储，并从中生成K线和估值数据块
+
+    存储只向MCP请求上次同步之后的新K线；同步失败时返回空字典，调用方照常通过MCP获取。
+
+    Returns:
+        Dict[str, Dict[str, Any]]: 数据块名称 -> {"text": 格式化的表格, "source": 读取参数}
+    """
+    today = datetime.strptime(current_date, "%Y-%m-%d")
+    kline_start = (today - timedelta(days=KLINE_LOOKBACK_DAYS)).strftime("%Y-%m-%d")
+    valuation_start = (today - timedelta(days=VALUATION_LOOKBACK_DAYS)).strftime("%Y-%m-%d")
+    try:
+        appended = await store.sync(stock_code, valuation_start, current_date, call_tool)
+    except Exception as e:
+        logger.warning(f"{ERROR_ICON} PrefetchAgent: K-line store sync failed, falling back to MCP: {e}")
+        return {}
+    if not store.covers(stock_code, valuation_start):
+        return {}
+    logger.info(f"{SUCCESS_ICON} PrefetchAgent: K-line store synced ({appended} new bars).")
+
+    sources = {
+        "kline": {"start_date": kline_start, "end_date": current_date,
+                  "fields": KLINE_STORE_FIELDS, "adjust": "forward"},
+        "valuation": {"start_date": valuation_start, "end_date": current_date,
+                      "fields": VALUATION_FIELDS[2:], "adjust": "none"},
+    }
+    sections = {}
+    for section, source in sources.items():
+        columns = store.read(stock_code, source["start_date"], source["end_date"],
+                             source["fields"], source["adjust"])
+        sections[section] = {"text": format_markdown(stock_code, columns, source["fields"]),
+                             "source": {"store": "kline_store", **source}}
+    return sections
+
+
+def format_prefetched_data(prefetched: Dict[str, Any], sections: List[str]) -> str:
+    """
+    把预取的数据格式化为可以直接放入提示词的文本
+
+    Args:
+        prefetched: state.data["prefetched"]
+        sections: 需要包含的数据块，如 ["basic_info", "kline"]
+
+    Returns:
+        str: 格式化后的文本；没有可用数据时返回空字符串
+    """
+    parts = []
+    for section in sections:
+        value = prefetched.get(section)
+        if not value:
+            continue
+        parts.append(f"### {SECTION_TITLES.get(section, section)}")
+        if isinstance(value, dict):
+            for name, sub_value in value.items():
+                if isinstance(sub_value, dict):
+                    for period, text in sub_value.items():
+                        parts.append(f"#### {name} {period}\n{text}")
+                else:
+                    parts.append(f"#### {name}\n{sub_value}")
+        else:
+            parts.append(str(value))
+    return "\n\n".join(parts)
+
+
+async def prefetch_agent(state: AgentState) -> AgentState:
+    """
+    Fetches basic info, K-line, valuation history, financials and dividends
+    concurrently and stores them in state.data["prefetched"].
+
+    Args:
+        state: The current agent state containing the extracted stock code
+
+    Returns:
+        Updated AgentState with prefetched data (or unchanged data if no stock code)
+    """
+    logger.info(f"{WAIT_ICON} PrefetchAgent: Prefetching standard data bundle.")
+
+    execution_logger = get_execution_logger()
+    agent_name = "prefetch_agent"
+
+    current_data = state.get("data", {})
+    stock_code = current_data.get("stock_code")
+    current_date = current_data.get(
+        "current_date") or datetime.now().strftime("%Y-%m-%d")
+
+    execution_logger.log_agent_start(agent_name, {
+        "stock_code": stock_code,
+        "current_date": current_date
+    })
+    agent_start_time = time.time()
+
+    if not stock_code:
+        # 没有股票代码时无法预取，分析师会通过工具自行获取数据
+        logger.warning(
+            f"{ERROR_ICON} PrefetchAgent: No stock code in state, skipping prefetch.")
+        execution_logger.log_agent_complete(
+            agent_name, {"skipped": True}, 0, True)
+        return {"data": current_data}
+
+    requests = build_prefetch_requests(stock_code, current_date)
+
+    async def fetch(tool_name, tool_args):
+        start_time = time.time()
+        try:
+            result = await call_mcp_tool(tool_name, tool_args)
+            execution_logger.log_tool_usage(
+                agent_name, tool_name, tool_args, result, time.time() - start_time)
+            return result
+        except Exception as e:
+            execution_logger.log_tool_usage(
+                agent_name, tool_name, tool_args, None, time.time() - start_time, False, str(e))
+            raise
+
+    # 已完成的请求结果（按路径），超时后据此保留已获取的数据块
+    stored: Dict[str, Any] = {}
+    results: Dict[Tuple[str, ...], Any] = {}
+
+    async def fetch_into(path, tool_name, tool_args):
+        try:
+            results[path] = await fetch(tool_name, tool_args)
+        except Exception as e:
+            results[path] = e
+
+    async def fetch_all():
+        # K线和估值优先从本地K线存储读取（只增量同步新的K线），对应的MCP请求不再发出
+        store = get_kline_store()
+        if store is not None:
+            stored.update(await prefetch_from_store(store, stock_code, current_date, fetch))
+        await asyncio.gather(*(fetch_into(path, tool_name, tool_args)
+                               for path, tool_name, tool_args in requests if path[0] not in stored))
+
+    deadline = get_node_deadline("data_prefetch")
+    timed_out = False
+    try:
+        await asyncio.wait_for(fetch_all(), timeout=deadline)
+    except asyncio.TimeoutError:
+        timed_out = True
+    requests = [request for request in requests if request[0][0] not in stored]
+
+    prefetched: Dict[str, Any] = {section: value["text"] for section, value in stored.items()}
+    errors = {}
+    for path, tool_name, _ in requests:
+        if path not in results:
+            errors["/".join(path)] = f"{tool_name}: timed out after {deadline:g}s"
+            continue
+        result = results[path]
+        if isinstance(result, BaseException):
+            errors["/".join(path)] = f"{tool_name}: {result}"
+            continue
+        target = prefetched
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = result
+
+    execution_time = time.time() - agent_start_time
+    if timed_out:
+        unfinished = len(requests) - len(results)
+        logger.warning(
+            f"{ERROR_ICON} PrefetchAgent: exceeded its {deadline:g}s deadline, "
+            f"{unfinished} request(s) cancelled; analysts will fetch the missing data with tools.")
+        execution_logger.log_timeout("data_prefetch", deadline, execution_time, bool(prefetched),
+                                     {"fetched": len(prefetched), "cancelled": unfinished})
+    logger.info(
+        f"{SUCCESS_ICON} PrefetchAgent: Fetched {len(requests) - len(errors)}/{len(requests)} "
+        f"items in {execution_time:.2f} seconds.")
+    if errors:
+        logger.warning(
+            f"{ERROR_ICON} PrefetchAgent: {len(errors)} item(s) failed: {list(errors.keys())}")
+
+    current_data["prefetched"] = prefetched
+    current_data["prefetch_errors"] = errors
+    current_data["prefetch_sources"] = {section: value["source"] for section, value in stored.items()}
+
+    execution_logger.log_agent_complete(agent_name, {
+        "requested": len(requests),
+        "fetched": len(requests) - len(errors),
+        "errors": errors,
+        "sections": list(prefetched.keys()),
+        "from_kline_store": list(stored.keys())
+    }, execution_time, True)
+
+    return {"data": current_data}
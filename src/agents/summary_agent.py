@@ -2,13 +2,15 @@
 Summary Agent: Consolidates analyses from other agents into a final report.
 """
 import os
+import sys
 import time
 from typing import Dict, Any
-from langchain_openai import ChatOpenAI
 
 from src.utils.state_definition import AgentState
 from src.utils.logging_config import setup_logger, ERROR_ICON, SUCCESS_ICON, WAIT_ICON
 from src.utils.execution_logger import get_execution_logger
+from src.utils.llm_registry import get_chat_model
+from src.utils.usage_tracker import UsageCallbackHandler
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -16,6 +18,92 @@ load_dotenv(override=True)
 
 logger = setup_logger(__name__)
 
+# 流式生成报告：模型输出边生成边写入报告文件并打印到终端（命令行 --stream 或 SUMMARY_STREAMING=true）
+_summary_streaming = os.getenv(
+    "SUMMARY_STREAMING", "false").lower() in ("1", "true", "yes")
+
+
+def set_summary_streaming(enabled: bool):
+    """设置总结报告是否流式生成"""
+    global _summary_streaming
+    _summary_streaming = enabled
+
+
+class _FenceFilter:
+    """
+    流式输出到终端时去掉```代码块标记所在的行，与最终保存的报告一致
+
+    一行的开头可能是代码块标记时先缓存，确定不是标记后立即输出，其余内容不延迟。
+    """
+
+    FENCE = "```"
+
+    def __init__(self):
+        self._pending = ""      # 当前行中尚不能确定是否为代码块标记的部分
+        self._in_text = False   # 当前行已确定不是代码块标记
+
+    def feed(self, text: str) -> str:
+        out = []
+        for segment in text.splitlines(keepends=True):
+            if self._in_text:
+                out.append(segment)
+            else:
+                self._pending += segment
+                head = self._pending.lstrip()
+                if head.startswith(self.FENCE):
+                    if segment.endswith("\n"):
+                        self._pending = ""
+                elif not self.FENCE.startswith(head) or segment.endswith("\n"):
+                    out.append(self._pending)
+                    self._pending = ""
+                    self._in_text = True
+            if segment.endswith("\n"):
+                self._in_text = False
+        return "".join(out)
+
+    def flush(self) -> str:
+        pending, self._pending = self._pending, ""
+        return "" if pending.lstrip().startswith(self.FENCE) else pending
+
+
+async def _stream_report(llm, messages, report_path: str, usage_handler):
+    """
+    流式生成报告：每个chunk到达时追加写入报告文件并输出到终端（终端输出去掉代码块标记行）
+
+    Returns:
+        (完整的模型输出, 首个token的延迟秒数)
+    """
+    start_time = time.time()
+    first_token_latency = None
+    parts = []
+    fence_filter = _FenceFilter()
+
+    print("\n--- 最终分析报告 (Final Analysis Report) ---\n", flush=True)
+    try:
+        with open(report_path, "w", encoding="utf-8") as f:
+            async for chunk in llm.astream(messages, config={"callbacks": [usage_handler]}):
+                text = chunk.content if isinstance(chunk.content, str) else ""
+                if not text:
+                    continue
+                if first_token_latency is None:
+                    first_token_latency = time.time() - start_time
+                    logger.info(
+                        f"{SUCCESS_ICON} SummaryAgent: First token after {first_token_latency:.2f}s")
+                parts.append(text)
+                f.write(text)
+                f.flush()
+                sys.stdout.write(fence_filter.feed(text))
+                sys.stdout.flush()
+    except BaseException:
+        # 中途失败时删除不完整的报告文件，由调用方写入错误报告
+        if os.path.exists(report_path):
+            os.remove(report_path)
+        raise
+    sys.stdout.write(fence_filter.flush() + "\n")
+    sys.stdout.flush()
+
+    return "".join(parts), first_token_latency
+
 
 async def summary_agent(state: AgentState) -> Dict[str, Any]:
     """
@@ -54,13 +142,13 @@ async def summary_agent(state: AgentState) -> Dict[str, Any]:
 
     # Error handling for individual analyses
     errors = []
-    if "fundamental_analysis_error" in current_data:
+    if current_data.get("fundamental_analysis_error"):
         errors.append(
             f"Fundamental Analysis Error: {current_data['fundamental_analysis_error']}")
-    if "technical_analysis_error" in current_data:
+    if current_data.get("technical_analysis_error"):
         errors.append(
             f"Technical Analysis Error: {current_data['technical_analysis_error']}")
-    if "value_analysis_error" in current_data:
+    if current_data.get("value_analysis_error"):
         errors.append(
             f"Value Analysis Error: {current_data['value_analysis_error']}")
 
@@ -191,50 +279,18 @@ async def summary_agent(state: AgentState) -> Dict[str, Any]:
             "model": model_name,
             "temperature": 0.5,
             "max_tokens": 10000,
-            "api_base": base_url
+            "api_base": base_url,
+            "streaming": _summary_streaming
         }
 
         # Use either the ChatOpenAI model or the existing get_chat_completion utility
-        # Option 1: Using ChatOpenAI
-        llm = ChatOpenAI(
-            model=model_name,
-            api_key=api_key,
-            base_url=base_url,
+        # Option 1: Using ChatOpenAI (shared client from the LLM registry)
+        llm = get_chat_model(
             temperature=0.5,  # 提高温度以增加创造性和更自然的表达
             max_tokens=10000   # 增大输出长度以生成更详细的综合报告
         )
 
-        # 记录LLM交互开始时间
-        llm_start_time = time.time()
-
-        llm_message = await llm.ainvoke(summary_prompt_messages)
-        final_report = llm_message.content
-
-        # 记录LLM交互执行时间
-        llm_execution_time = time.time() - llm_start_time
-
-        # 记录LLM交互详情
-        execution_logger.log_llm_interaction(
-            agent_name=agent_name,
-            interaction_type="summary_generation",
-            input_messages=summary_prompt_messages,
-            output_content=final_report,
-            model_config=model_config,
-            execution_time=llm_execution_time
-        )
-
-        # Remove any markdown code block markers if they still appear
-        final_report = final_report.replace(
-            "```markdown", "").replace("```", "").strip()
-
-        # Option 2: Using existing get_chat_completion (alternative approach)
-        # final_report = await get_chat_completion(messages=summary_prompt_messages)
-
-        logger.info(
-            f"{SUCCESS_ICON} SummaryAgent: Final report generated for {company_name} ({stock_code}).")
-        logger.debug(f"Final report preview: {final_report[:300]}...")
-
-        # Save the report to a Markdown file
+        # 报告文件路径（流式生成时边生成边写入）
         timestamp = time.strftime("%Y%m%d_%H%M%S")
 
         # 处理公司名称和股票代码，确保文件名有意义
@@ -267,6 +323,45 @@ async def summary_agent(state: AgentState) -> Dict[str, Any]:
 
         report_path = os.path.join(reports_dir, report_filename)
 
+        # 记录LLM交互开始时间
+        llm_start_time = time.time()
+        first_token_latency = None
+
+        usage_handler = UsageCallbackHandler(agent_name)
+        if _summary_streaming:
+            final_report, first_token_latency = await _stream_report(
+                llm, summary_prompt_messages, report_path, usage_handler)
+        else:
+            llm_message = await llm.ainvoke(
+                summary_prompt_messages, config={"callbacks": [usage_handler]})
+            final_report = llm_message.content
+
+        # 记录LLM交互执行时间
+        llm_execution_time = time.time() - llm_start_time
+
+        # 记录LLM交互详情
+        execution_logger.log_llm_interaction(
+            agent_name=agent_name,
+            interaction_type="summary_generation",
+            input_messages=summary_prompt_messages,
+            output_content=final_report,
+            model_config=model_config,
+            execution_time=llm_execution_time,
+            token_usage=usage_handler.totals
+        )
+
+        # Remove any markdown code block markers if they still appear
+        final_report = final_report.replace(
+            "```markdown", "").replace("```", "").strip()
+
+        # Option 2: Using the async get_chat_completion (alternative approach)
+        # final_report = await aget_chat_completion(messages=summary_prompt_messages)
+
+        logger.info(
+            f"{SUCCESS_ICON} SummaryAgent: Final report generated for {company_name} ({stock_code}).")
+        logger.debug(f"Final report preview: {final_report[:300]}...")
+
+        # Save the report to a Markdown file (流式生成时用清理后的内容覆盖增量写入的原始输出)
         with open(report_path, "w", encoding="utf-8") as f:
             f.write(final_report)
 
@@ -284,6 +379,7 @@ async def summary_agent(state: AgentState) -> Dict[str, Any]:
             "report_path": report_path,
             "report_preview": final_report,
             "llm_execution_time": llm_execution_time,
+            "first_token_latency": first_token_latency,
             "total_execution_time": total_execution_time
         }, total_execution_time, True)
 
@@ -5,13 +5,18 @@ import os
 import json
 from typing import Dict, Any
 from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
-from langgraph.prebuilt import create_react_agent
 import time
 
 from src.utils.state_definition import AgentState
 from src.tools.mcp_client import get_mcp_tools
+from src.tools.tool_selection import select_tools_for_agent
+from src.utils.llm_registry import get_react_agent, react_recursion_limit
+from src.utils.usage_tracker import UsageCallbackHandler
+from src.agents.prefetch_agent import format_prefetched_data, ANALYST_SECTIONS
+from src.analytics.indicators import technical_indicator_section
+from src.analytics.levels import support_resistance_section
+from src.analytics.kline_store import read_prefetched
 from src.utils.logging_config import setup_logger, ERROR_ICON, SUCCESS_ICON, WAIT_ICON
 from src.utils.execution_logger import get_execution_logger
 from dotenv import load_dotenv
@@ -60,7 +65,7 @@ async def technical_agent(state: AgentState) -> AgentState:
     agent_start_time = time.time()
 
     try:
-        # 1. Create ChatOpenAI model using environment variables
+        # 1. Check OpenAI environment variables (clients come from the shared registry)
         api_key = os.getenv("OPENAI_COMPATIBLE_API_KEY")
         base_url = os.getenv("OPENAI_COMPATIBLE_BASE_URL")
         model_name = os.getenv("OPENAI_COMPATIBLE_MODEL")
@@ -71,15 +76,6 @@ async def technical_agent(state: AgentState) -> AgentState:
             execution_logger.log_agent_complete(agent_name, current_data, time.time() - agent_start_time, False, "Missing OpenAI environment variables")
             return {"data": current_data, "messages": current_messages, "metadata": current_metadata}
 
-        logger.info(f"{WAIT_ICON} TechnicalAgent: Creating ChatOpenAI with model {model_name}")
-        llm = ChatOpenAI(
-            model=model_name,
-            api_key=api_key,
-            base_url=base_url,
-            temperature=0.3,
-            max_tokens=3000
-        )
-
         # 2. 获取MCP工具
         logger.info(f"{WAIT_ICON} TechnicalAgent: Fetching MCP tools...")
         try:
@@ -96,9 +92,10 @@ async def technical_agent(state: AgentState) -> AgentState:
             tool_names = [tool.name for tool in mcp_tools]
             logger.info(f"Available tools: {tool_names}")
 
-            # 3. 创建ReAct agent - 只传入LLM和工具
+            # 3. 获取ReAct agent - 同一模型配置和工具集的agent只编译一次
             logger.info(f"{WAIT_ICON} TechnicalAgent: Creating ReAct agent...")
-            agent = create_react_agent(llm, mcp_tools)
+            agent = get_react_agent(
+                select_tools_for_agent(agent_name, mcp_tools), temperature=0.3, max_tokens=3000)
 
             # 4. 准备输入数据
             stock_code = current_data.get('stock_code', 'Unknown')
@@ -123,6 +120,37 @@ async def technical_agent(state: AgentState) -> AgentState:
 
 请使用可用的工具获取实际数据进行分析，而不是基于假设。"""
 
+            # 由data_prefetch节点预先获取的数据，只有缺失的部分才需要调用工具
+            prefetched_text = format_prefetched_data(
+                current_data.get("prefetched", {}), ANALYST_SECTIONS[agent_name])
+            if prefetched_text:
+                agent_input += f"""
+
+以下数据已预先获取，请直接基于这些数据进行分析，只有在数据缺失或不足时才调用工具补充：
+
+{prefetched_text}"""
+
+            # 技术指标、支撑/阻力位和趋势状态在本地根据预取的日K线计算，LLM只需解读，不必自行计算
+            # 预取时K线来自本地K线存储的，直接读取存储中的数组，不再解析文本
+            kline = read_prefetched(current_data, "kline")
+            if kline.empty:
+                kline = current_data.get("prefetched", {}).get("kline")
+            indicator_text = technical_indicator_section(kline)
+            if indicator_text:
+                agent_input += f"""
+
+以下技术指标已根据上面的日K线在本地精确计算（MA、MACD(12,26,9)、RSI、KDJ(9,3,3)、布林线(20,2)、ATR(14)、OBV、量比），请直接引用这些数值进行分析，不要自行重新计算：
+
+{indicator_text}"""
+
+            levels_text = support_resistance_section(kline)
+            if levels_text:
+                agent_input += f"""
+
+以下支撑位、阻力位和趋势状态已根据日K线在本地识别（综合波段高低点、成交密集区和20日通道，置信度0~1），第6步请直接引用这些价位及其置信度：
+
+{levels_text}"""
+
             logger.info(f"Agent input: {agent_input}")
 
             # 5. 调用ReAct agent - 使用正确的messages格式
@@ -134,8 +162,11 @@ async def technical_agent(state: AgentState) -> AgentState:
                 "messages": [HumanMessage(content=agent_input)]
             }
 
-            # 调用agent
-            response = await agent.ainvoke(input_data)
+            # 调用agent，回调收集ReAct循环中每一步的token用量
+            usage_handler = UsageCallbackHandler(agent_name)
+            response = await agent.ainvoke(
+                input_data, config={"callbacks": [usage_handler],
+                                    "recursion_limit": react_recursion_limit()})
 
             end_time = time.time()
             execution_time = end_time - start_time
@@ -180,7 +211,8 @@ async def technical_agent(state: AgentState) -> AgentState:
                     "max_tokens": 3000,
                     "api_base": base_url
                 },
-                execution_time=execution_time
+                execution_time=execution_time,
+                token_usage=usage_handler.totals
             )
 
             logger.info(f"{SUCCESS_ICON} TechnicalAgent: Successfully completed technical analysis.")
@@ -0,0 +1,263 @@
+"""
+财务比率计算 - 把预取的多个季度财务数据整理为一张比率表，给基本面分析师直接引用
+输入是data_prefetch预取的financials：{数据块: {"2024Q3": 工具结果, ...}}，数据块为
+profit/operation/growth/balance/cash_flow/dupont（对应get_profit_data等工具，比率字段为小数）。
+
+A股定期报告的利润和收入是年初至今的累计值：单季值由相邻季度累计值相减得到（Q1即累计值），
+同比对比上年同期的累计值，环比对比上一季度的单季值。
+所有指标按季度序列整列计算（一次向量化），季度不连续时对应的单季和增长指标为NaN。
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.analytics.kline import parse_markdown_table
+
+# 应计比率超过该值，或经营现金流/净利润低于CASH_CONVERSION_WARNING时提示盈利质量
+ACCRUAL_WARNING = 0.05
+CASH_CONVERSION_WARNING = 0.5
+
+# 杜邦ROE = 归母净利润/净利润 × 净利率 × 总资产周转率 × 权益乘数
+DUPONT_FACTORS = {"归母净利润占比": "dupont_parent_share", "净利率": "dupont_net_margin",
+                  "总资产周转率": "asset_turnover", "权益乘数": "equity_multiplier"}
+# 各因子对数变化之和与ROE对数变化的差超过该值时单独列出（工具数据四舍五入等原因）
+DUPONT_RESIDUAL_TOLERANCE = 0.005
+
+# 比率表的行：(列名, 显示名称, 格式)；格式 pct=百分比、x=倍数、yi=亿元、d=天
+TABLE_ROWS: List[Tuple[str, str, str]] = [
+    ("revenue", "营业收入（累计）", "yi"),
+    ("net_profit", "净利润（累计）", "yi"),
+    ("revenue_q", "单季营业收入", "yi"),
+    ("net_profit_q", "单季净利润", "yi"),
+    ("revenue_yoy", "营收同比", "pct"),
+    ("net_profit_yoy", "净利润同比", "pct"),
+    ("revenue_qoq", "单季营收环比", "pct"),
+    ("net_profit_qoq", "单季净利润环比", "pct"),
+    ("gross_margin", "毛利率", "pct"),
+    ("net_margin", "净利率", "pct"),
+    ("net_margin_q", "单季净利率", "pct"),
+    ("roe", "ROE（累计）", "pct"),
+    ("roa", "ROA（累计）", "pct"),
+    ("dupont_parent_share", "杜邦：归母净利润/净利润", "pct"),
+    ("dupont_net_margin", "杜邦：净利率（净利润/营业总收入）", "pct"),
+    ("asset_turnover", "杜邦：总资产周转率", "x"),
+    ("equity_multiplier", "杜邦：权益乘数", "x"),
+    ("liability_to_asset", "资产负债率", "pct"),
+    ("current_ratio", "流动比率", "x"),
+    ("quick_ratio", "速动比率", "x"),
+    ("interest_coverage", "利息保障倍数", "x"),
+    ("receivable_days", "应收账款周转天数", "d"),
+    ("inventory_days", "存货周转天数", "d"),
+    ("cfo_to_net_profit", "经营现金流/净利润", "x"),
+    ("cfo_to_revenue", "经营现金流/营业收入", "pct"),
+    ("accrual_ratio", "应计比率（年化）", "pct"),
+]
+
+
+def financial_frame(financials: Dict[str, Dict[str, Any]]) -> pd.DataFrame:
+    """
+    合并各数据块、各季度的工具结果为一张宽表
+
+    Args:
+        financials: state.data["prefetched"]["financials"]
+
+    Returns:
+        pd.DataFrame: 以季度（如"2024Q3"）为索引、按时间升序排列，列为各工具返回的字段；
+            没有可解析的数据时返回空DataFrame
+    """
+    records: Dict[str, Dict[str, Any]] = {}
+    for section in (financials or {}).values():
+        if not isinstance(section, dict):
+            continue
+        for period, text in section.items():
+            df = parse_markdown_table(text)
+            if df.empty:
+                continue
+            record = records.setdefault(period, {})
+            for column, value in df.iloc[0].items():
+                record.setdefault(column, value)
+    if not records:
+        return pd.DataFrame()
+    return pd.DataFrame.from_dict(records, orient="index").sort_index()
+
+
+def _column(frame: pd.DataFrame, name: str) -> np.ndarray:
+    """数值列，缺失时为全NaN"""
+    if name not in frame.columns:
+        return np.full(len(frame), np.nan)
+    return pd.to_numeric(frame[name], errors="coerce").to_numpy(dtype=np.float64)
+
+
+def _lag(values: np.ndarray, quarter_index: np.ndarray, quarters: int) -> np.ndarray:
+    """quarters个季度之前的值（按季度编号对齐，缺少的季度为NaN）"""
+    series = pd.Series(values, index=quarter_index)
+    return series.reindex(quarter_index - quarters).to_numpy(dtype=np.float64)
+
+
+def compute_ratios(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    计算各季度的财务比率
+
+    Args:
+        frame: financial_frame的结果
+
+    Returns:
+        pd.DataFrame: 以季度为索引，列为TABLE_ROWS中的指标（比率为小数，金额为元）
+    """
+    periods = frame.index.to_series()
+    year = periods.str[:4].astype(int).to_numpy()
+    quarter = periods.str[-1].astype(int).to_numpy()
+    quarter_index = year * 4 + quarter - 1
+
+    net_profit = _column(frame, "netProfit")
+    net_margin = _column(frame, "npMargin")
+    revenue = _column(frame, "MBRevenue")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # 主营业务收入缺失时由 净利润/净利率 推算营业收入
+        revenue = np.where(np.isnan(revenue), net_profit / net_margin, revenue)
+
+    def single_quarter(ytd: np.ndarray) -> np.ndarray:
+        return np.where(quarter == 1, ytd, ytd - _lag(ytd, quarter_index, 1))
+
+    def growth(current: np.ndarray, base: np.ndarray) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(base != 0, (current - base) / np.abs(base), np.nan)
+
+    revenue_q = single_quarter(revenue)
+    net_profit_q = single_quarter(net_profit)
+
+    # 净利润同比优先使用工具给出的YOYNI，缺少上年同期数据时仍可用
+    net_profit_yoy = _column(frame, "YOYNI")
+    net_profit_yoy = np.where(np.isnan(net_profit_yoy),
+                              growth(net_profit, _lag(net_profit, quarter_index, 4)), net_profit_yoy)
+
+    roe = _column(frame, "roeAvg")
+    dupont_roe = _column(frame, "dupontROE")
+    equity_multiplier = _column(frame, "dupontAssetStoEquity")
+    cfo_to_net_profit = _column(frame, "CFOToNP")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # ROA = ROE / 权益乘数；应计比率 = (净利润 - 经营现金流) / 总资产 = ROA × (1 - 经营现金流/净利润)，
+        # 累计值按 4/季度 年化，各季度之间可比
+        roa = np.where(np.isnan(dupont_roe), roe, dupont_roe) / equity_multiplier
+        net_margin_q = net_profit_q / revenue_q
+    accrual_ratio = roa * 4 / quarter * (1 - cfo_to_net_profit)
+
+    return pd.DataFrame({
+        "revenue": revenue,
+        "net_profit": net_profit,
+        "revenue_q": revenue_q,
+        "net_profit_q": net_profit_q,
+        "revenue_yoy": growth(revenue, _lag(revenue, quarter_index, 4)),
+        "net_profit_yoy": net_profit_yoy,
+        "revenue_qoq": growth(revenue_q, _lag(revenue_q, quarter_index, 1)),
+        "net_profit_qoq": growth(net_profit_q, _lag(net_profit_q, quarter_index, 1)),
+        "gross_margin": _column(frame, "gpMargin"),
+        "net_margin": net_margin,
+        "net_margin_q": net_margin_q,
+        "roe": roe,
+        "roa": roa,
+        "dupont_roe": dupont_roe,
+        "dupont_parent_share": _column(frame, "dupontPnitoni"),
+        "dupont_net_margin": _column(frame, "dupontNitogr"),
+        "asset_turnover": _column(frame, "dupontAssetTurn"),
+        "equity_multiplier": equity_multiplier,
+        "liability_to_asset": _column(frame, "liabilityToAsset"),
+        "current_ratio": _column(frame, "currentRatio"),
+        "quick_ratio": _column(frame, "quickRatio"),
+        "interest_coverage": _column(frame, "ebitToInterest"),
+        "receivable_days": _column(frame, "NRTurnDays"),
+        "inventory_days": _column(frame, "INVTurnDays"),
+        "cfo_to_net_profit": cfo_to_net_profit,
+        "cfo_to_revenue": _column(frame, "CFOToOR"),
+        "accrual_ratio": accrual_ratio,
+    }, index=frame.index)
+
+
+def _format_value(value: float, kind: str) -> str:
+    if np.isnan(value):
+        return "-"
+    if kind == "pct":
+        # 加0.0避免四舍五入后显示为-0.0%
+        return f"{round(value * 100, 1) + 0.0:.1f}%"
+    if kind == "yi":
+        return f"{value / 1e8:.2f}"
+    if kind == "d":
+        return f"{value:.0f}"
+    return f"{value:.2f}"
+
+
+def format_ratio_table(ratios: pd.DataFrame) -> str:
+    """比率表（Markdown，行为指标、列为季度），全为空的指标不输出"""
+    periods = ratios.index.tolist()
+    lines = ["| 指标（金额单位：亿元） | " + " | ".join(periods) + " |",
+             "|" + "---|" * (len(periods) + 1)]
+    for column, label, kind in TABLE_ROWS:
+        values = ratios[column].to_numpy(dtype=np.float64)
+        if np.isnan(values).all():
+            continue
+        lines.append(f"| {label} | " + " | ".join(_format_value(value, kind) for value in values) + " |")
+    if not np.isnan(ratios["accrual_ratio"].to_numpy(dtype=np.float64)).all():
+        lines.append("")
+        lines.append("注：应计比率 = (净利润 - 经营现金流) / 总资产，由累计期数据年化。")
+    return "\n".join(lines)
+
+
+def _latest(ratios: pd.DataFrame, column: str) -> Tuple[Optional[str], float]:
+    """某指标最近一个非空值及其季度"""
+    values = ratios[column].dropna()
+    return (values.index[-1], float(values.iloc[-1])) if len(values) else (None, np.nan)
+
+
+def ratio_signals(ratios: pd.DataFrame) -> List[str]:
+    """最近一期相对上年同期的ROE杜邦归因、利润率变化、现金转化和应计质量提示"""
+    signals = []
+    periods = ratios.index.tolist()
+    latest = periods[-1]
+    year_ago = f"{int(latest[:4]) - 1}{latest[4:]}"
+
+    if year_ago in ratios.index:
+        now, before = ratios.loc[latest], ratios.loc[year_ago]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # ROE是四个因子的乘积，取对数后各因子的变化之和等于ROE的对数变化
+            contributions = {name: np.log(now[column] / before[column])
+                             for name, column in DUPONT_FACTORS.items()}
+            roe_change = np.log(now["dupont_roe"] / before["dupont_roe"])
+        if all(np.isfinite(value) for value in contributions.values()):
+            driver = max(contributions, key=lambda name: abs(contributions[name]))
+            residual = roe_change - sum(contributions.values())
+            if np.isfinite(residual) and abs(residual) > DUPONT_RESIDUAL_TOLERANCE:
+                contributions["其他（未解释部分）"] = residual
+            parts = "、".join(f"{name} {value * 100:+.1f}%" for name, value in contributions.items())
+            total = f"ROE对数变化 {roe_change * 100:+.1f}%，" if np.isfinite(roe_change) else ""
+            signals.append(f"{latest} 杜邦ROE相对 {year_ago} 的对数变化分解：{total}{parts}，主要驱动因素为{driver}")
+        for column, label in (("gross_margin", "毛利率"), ("net_margin", "净利率")):
+            change = (now[column] - before[column]) * 100
+            if np.isfinite(change):
+                signals.append(f"{label}较上年同期 {change:+.1f} 个百分点")
+
+    period, cash = _latest(ratios, "cfo_to_net_profit")
+    if period and cash < CASH_CONVERSION_WARNING:
+        signals.append(f"{period} 经营现金流/净利润仅 {cash:.2f}，利润的现金含量偏低")
+    period, accrual = _latest(ratios, "accrual_ratio")
+    if period and accrual > ACCRUAL_WARNING:
+        signals.append(f"{period} 应计比率 {accrual * 100:.1f}%，利润中应计部分较高，需关注盈利质量")
+    return signals
+
+
+def financial_ratio_section(financials: Dict[str, Dict[str, Any]]) -> str:
+    """
+    从预取的财务数据计算多季度比率，生成放入提示词的文本
+
+    Returns:
+        str: 比率表和提示；没有可解析的财务数据时返回空字符串
+    """
+    frame = financial_frame(financials)
+    if frame.empty:
+        return ""
+    ratios = compute_ratios(frame)
+    text = format_ratio_table(ratios)
+    signals = ratio_signals(ratios)
+    if signals:
+        text += "\n\n主要变化：\n" + "\n".join(f"- {signal}" for signal in signals)
+    return text
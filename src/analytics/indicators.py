@@ -0,0 +1,316 @@
+"""
+技术指标引擎 - 用NumPy一次性计算整段K线的常用技术指标
+技术分析师不再让LLM从K线文本里手算均线、MACD、RSI等指标（耗输出token且经常算错），
+而是把本地算好的指标表放进提示词，LLM只负责解读。
+
+所有函数都沿最后一个轴（时间）计算，输入可以是单只股票的一维数组，
+也可以是 (股票数, 交易日数) 的二维数组，一次调用完成整个股票池的计算。
+数据不足的前若干个交易日为NaN。递推类指标（EMA、RSI、KDJ、ATR）沿时间轴循环，
+每一步对所有股票做向量运算；滑动窗口类指标用累加和或错位比较计算，不逐行循环。
+"""
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from src.analytics.kline import as_kline_frame, ohlcv_arrays
+
+# 指标参数（与常用行情软件的默认参数一致）
+MA_WINDOWS = (5, 10, 20, 60)
+MACD_PARAMS = (12, 26, 9)
+RSI_WINDOWS = (6, 12, 24)
+KDJ_PARAMS = (9, 3, 3)
+BOLL_PARAMS = (20, 2.0)
+ATR_WINDOW = 14
+VOLUME_MA_WINDOWS = (5, 10)
+
+# 提示词中指标表的列：(指标名, 表头, 小数位数)
+TABLE_COLUMNS = [
+    ("close", "收盘", 2), ("MA5", "MA5", 2), ("MA20", "MA20", 2), ("MA60", "MA60", 2),
+    ("DIF", "DIF", 3), ("DEA", "DEA", 3), ("MACD", "MACD", 3),
+    ("RSI6", "RSI6", 1), ("RSI12", "RSI12", 1),
+    ("K", "K", 1), ("D", "D", 1), ("J", "J", 1),
+    ("BOLL_UPPER", "布林上轨", 2), ("BOLL_LOWER", "布林下轨", 2),
+    ("ATR14", "ATR14", 2), ("VOLUME_RATIO", "量比", 2),
+]
+
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    """简单移动平均；窗口内有NaN（如上市前的填充）时结果为NaN"""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] < window:
+        return out
+
+    valid = ~np.isnan(values)
+    if valid.all():
+        csum = np.cumsum(values, axis=-1)
+        out[..., window - 1] = csum[..., window - 1]
+        out[..., window:] = csum[..., window:] - csum[..., :-window]
+        out[..., window - 1:] /= window
+        return out
+
+    csum = np.cumsum(np.where(valid, values, 0.0), axis=-1)
+    ccount = np.cumsum(valid, axis=-1)
+    window_sum = csum[..., window - 1:].copy()
+    window_sum[..., 1:] -= csum[..., :-window]
+    window_count = ccount[..., window - 1:].copy()
+    window_count[..., 1:] -= ccount[..., :-window]
+    out[..., window - 1:] = np.where(window_count == window, window_sum / window, np.nan)
+    return out
+
+
+def rolling_std(values: np.ndarray, window: int) -> np.ndarray:
+    """滑动样本标准差（ddof=1）"""
+    values = np.asarray(values, dtype=np.float64)
+    mean = sma(values, window)
+    mean_sq = sma(values * values, window)
+    variance = np.clip(mean_sq - mean * mean, 0.0, None) * window / (window - 1)
+    return np.sqrt(variance)
+
+
+def rolling_max(values: np.ndarray, window: int) -> np.ndarray:
+    return _rolling_extreme(values, window, np.maximum)
+
+
+def rolling_min(values: np.ndarray, window: int) -> np.ndarray:
+    return _rolling_extreme(values, window, np.minimum)
+
+
+def _rolling_extreme(values: np.ndarray, window: int, combine) -> np.ndarray:
+    """滑动窗口极值：窗口较短时逐个错位比较，比sliding_window_view归约更快"""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    length = values.shape[-1]
+    if length < window:
+        return out
+    result = values[..., window - 1:].copy()
+    for lag in range(1, window):
+        # np.maximum/np.minimum会传播NaN，窗口内有NaN时结果为NaN
+        combine(result, values[..., window - 1 - lag:length - lag], out=result)
+    out[..., window - 1:] = result
+    return out
+
+
+def ema(values: np.ndarray, alpha: float, initial: Optional[float] = None) -> np.ndarray:
+    """
+    指数移动平均：y[t] = y[t-1] + alpha * (x[t] - y[t-1])
+
+    Args:
+        values: 输入数组，沿最后一个轴递推
+        alpha: 平滑系数（EMA(N)为2/(N+1)，通达信SMA(X,N,1)和Wilder平滑为1/N）
+        initial: 递推初值；为None时以第一个有效值作为初值（与pandas ewm(adjust=False)一致）
+
+    Returns:
+        np.ndarray: 与输入形状相同，第一个有效值之前为NaN；中间的NaN沿用上一个值
+    """
+    values = np.asarray(values, dtype=np.float64)
+    # 转为 (时间, 股票) 的连续数组，循环时每一步读取连续内存
+    series = np.ascontiguousarray(np.moveaxis(values, -1, 0))
+    out = np.full_like(series, np.nan)
+    valid = ~np.isnan(series)
+
+    # 常见情况：只有所有股票共同的前若干天是NaN（指标预热期），之后逐步原地递推
+    leading = int(np.argmax(valid.reshape(len(series), -1).any(axis=1))) if valid.any() else len(series)
+    if valid[leading:].all():
+        if leading == len(series):
+            return np.moveaxis(out, 0, -1)
+        state = series[leading].copy() if initial is None else \
+            initial + alpha * (series[leading] - initial)
+        out[leading] = state
+        for t in range(leading + 1, len(series)):
+            state += alpha * (series[t] - state)
+            out[t] = state
+        return np.ascontiguousarray(np.moveaxis(out, 0, -1))
+
+    state = np.full(series.shape[1:], np.nan if initial is None else float(initial))
+    started = np.zeros(series.shape[1:], dtype=bool)
+    for t in range(series.shape[0]):
+        x = series[t]
+        if initial is None:
+            state = np.where(valid[t] & ~started, x, state)
+        updated = state + alpha * (x - state)
+        state = np.where(valid[t] & (started | (initial is not None)), updated, state)
+        started |= valid[t]
+        out[t] = np.where(started, state, np.nan)
+    return np.ascontiguousarray(np.moveaxis(out, 0, -1))
+
+
+def previous(values: np.ndarray) -> np.ndarray:
+    """上一个交易日的值（第一天为NaN）"""
+    prev = np.empty_like(values)
+    prev[..., 0] = np.nan
+    prev[..., 1:] = values[..., :-1]
+    return prev
+
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> Dict[str, np.ndarray]:
+    """MACD：DIF = EMA(fast) - EMA(slow)，DEA = EMA(DIF, signal)，柱 = 2 * (DIF - DEA)"""
+    ema_fast = ema(close, 2 / (fast + 1))
+    ema_slow = ema(close, 2 / (slow + 1))
+    dif = ema_fast - ema_slow
+    dea = ema(dif, 2 / (signal + 1))
+    return {f"EMA{fast}": ema_fast, f"EMA{slow}": ema_slow,
+            "DIF": dif, "DEA": dea, "MACD": 2 * (dif - dea)}
+
+
+def rsi(close: np.ndarray, window: int) -> np.ndarray:
+    """RSI（Wilder平滑），第一天没有涨跌幅为NaN"""
+    change = np.asarray(close, dtype=np.float64) - previous(np.asarray(close, dtype=np.float64))
+    gain = ema(np.where(np.isnan(change), np.nan, np.clip(change, 0, None)), 1 / window)
+    loss = ema(np.abs(change), 1 / window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(loss > 0, 100 * gain / loss, np.where(np.isnan(loss), np.nan, 50.0))
+
+
+def kdj(high: np.ndarray, low: np.ndarray, close: np.ndarray,
+        n: int = 9, m1: int = 3, m2: int = 3) -> Dict[str, np.ndarray]:
+    """KDJ：RSV为n日内的位置，K、D以50为初值做SMA(·, m, 1)平滑，J = 3K - 2D"""
+    highest = rolling_max(high, n)
+    lowest = rolling_min(low, n)
+    span = highest - lowest
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rsv = np.where(span > 0, (close - lowest) / span * 100, 50.0)
+    rsv = np.where(np.isnan(span), np.nan, rsv)
+    k = ema(rsv, 1 / m1, initial=50.0)
+    d = ema(k, 1 / m2, initial=50.0)
+    return {"K": k, "D": d, "J": 3 * k - 2 * d}
+
+
+def bollinger(close: np.ndarray, window: int = 20, width: float = 2.0) -> Dict[str, np.ndarray]:
+    mid = sma(close, window)
+    std = rolling_std(close, window)
+    return {"BOLL_MID": mid, "BOLL_UPPER": mid + width * std, "BOLL_LOWER": mid - width * std}
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int = 14) -> np.ndarray:
+    """平均真实波幅（Wilder平滑），第一天的真实波幅为最高价减最低价"""
+    prev_close = previous(np.asarray(close, dtype=np.float64))
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return ema(true_range, 1 / window)
+
+
+def obv(close: np.ndarray, volume: np.ndarray) -> np.ndarray:
+    """能量潮：以第一天为0，上涨日加成交量，下跌日减成交量"""
+    direction = np.sign(np.nan_to_num(np.asarray(close, dtype=np.float64)
+                                      - previous(np.asarray(close, dtype=np.float64))))
+    return np.cumsum(direction * np.nan_to_num(volume), axis=-1)
+
+
+def compute_indicators(ohlcv: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    计算全部技术指标
+
+    Args:
+        ohlcv: open/high/low/close/volume数组，形状为 (交易日数,) 或 (股票数, 交易日数)
+
+    Returns:
+        Dict[str, np.ndarray]: 指标名到数组的映射，形状与输入相同
+    """
+    high = np.asarray(ohlcv["high"], dtype=np.float64)
+    low = np.asarray(ohlcv["low"], dtype=np.float64)
+    close = np.asarray(ohlcv["close"], dtype=np.float64)
+    volume = np.asarray(ohlcv["volume"], dtype=np.float64)
+
+    indicators = {f"MA{window}": sma(close, window) for window in MA_WINDOWS}
+    indicators.update(macd(close, *MACD_PARAMS))
+    for window in RSI_WINDOWS:
+        indicators[f"RSI{window}"] = rsi(close, window)
+    indicators.update(kdj(high, low, close, *KDJ_PARAMS))
+    indicators.update(bollinger(close, *BOLL_PARAMS))
+    indicators[f"ATR{ATR_WINDOW}"] = atr(high, low, close, ATR_WINDOW)
+    indicators["OBV"] = obv(close, volume)
+    for window in VOLUME_MA_WINDOWS:
+        indicators[f"VOL_MA{window}"] = sma(volume, window)
+    # 量比：当日成交量与前5日平均成交量之比
+    with np.errstate(invalid="ignore", divide="ignore"):
+        indicators["VOLUME_RATIO"] = volume / previous(indicators["VOL_MA5"])
+    return indicators
+
+
+def _signals(close: np.ndarray, indicators: Dict[str, np.ndarray]) -> List[str]:
+    """根据最新一天的指标生成几条确定性的信号描述"""
+    signals = []
+    latest = {name: values[-1] for name, values in indicators.items()}
+
+    mas = [latest[f"MA{window}"] for window in MA_WINDOWS]
+    if not np.isnan(mas).any():
+        if all(a > b for a, b in zip(mas, mas[1:])):
+            signals.append("均线多头排列（MA5 > MA10 > MA20 > MA60）")
+        elif all(a < b for a, b in zip(mas, mas[1:])):
+            signals.append("均线空头排列（MA5 < MA10 < MA20 < MA60）")
+        else:
+            signals.append("均线交织，趋势不明确")
+
+    diff = indicators["DIF"] - indicators["DEA"]
+    crossed = np.nonzero(np.diff(np.sign(diff[-6:])) != 0)[0]
+    if len(crossed) and not np.isnan(diff[-6:]).any():
+        days_ago = 5 - crossed[-1] - 1
+        kind = "金叉" if diff[-1] > 0 else "死叉"
+        signals.append(f"MACD {days_ago} 个交易日前出现{kind}" if days_ago else f"MACD 今日{kind}")
+
+    rsi6 = latest["RSI6"]
+    if rsi6 >= 80:
+        signals.append(f"RSI6 = {rsi6:.1f}，处于超买区")
+    elif rsi6 <= 20:
+        signals.append(f"RSI6 = {rsi6:.1f}，处于超卖区")
+
+    if latest["J"] > 100:
+        signals.append(f"KDJ的J值 {latest['J']:.1f} > 100，短线超买")
+    elif latest["J"] < 0:
+        signals.append(f"KDJ的J值 {latest['J']:.1f} < 0，短线超卖")
+
+    if close[-1] > latest["BOLL_UPPER"]:
+        signals.append("收盘价位于布林上轨之上")
+    elif close[-1] < latest["BOLL_LOWER"]:
+        signals.append("收盘价位于布林下轨之下")
+
+    if latest["VOLUME_RATIO"] >= 2:
+        signals.append(f"量比 {latest['VOLUME_RATIO']:.2f}，明显放量")
+    elif latest["VOLUME_RATIO"] <= 0.5:
+        signals.append(f"量比 {latest['VOLUME_RATIO']:.2f}，明显缩量")
+    return signals
+
+
+def format_indicator_table(dates: List[str], close: np.ndarray,
+                           indicators: Dict[str, np.ndarray], rows: int = 10) -> str:
+    """最近rows个交易日的指标表（Markdown）和最新信号"""
+    columns = {"close": close, **indicators}
+    lines = ["| 日期 | " + " | ".join(header for _, header, _ in TABLE_COLUMNS) + " |",
+             "|" + "---|" * (len(TABLE_COLUMNS) + 1)]
+    for i in range(max(0, len(dates) - rows), len(dates)):
+        cells = []
+        for name, _, digits in TABLE_COLUMNS:
+            value = columns[name][i]
+            cells.append("-" if np.isnan(value) else f"{value:.{digits}f}")
+        lines.append(f"| {dates[i]} | " + " | ".join(cells) + " |")
+
+    signals = _signals(close, indicators)
+    if signals:
+        lines.append("")
+        lines.append("最新信号：")
+        lines.extend(f"- {signal}" for signal in signals)
+    return "\n".join(lines)
+
+
+def technical_indicator_section(kline: Union[str, pd.DataFrame, None], rows: int = 10) -> str:
+    """
+    从get_historical_k_data的结果计算技术指标，生成放入提示词的文本
+
+    Args:
+        kline: 日K线工具结果（Markdown表格），或从K线存储读取的DataFrame
+        rows: 指标表包含的最近交易日数
+
+    Returns:
+        str: 指标表和信号；K线无法解析或少于2个交易日时返回空字符串
+    """
+    df = as_kline_frame(kline)
+    if len(df) < 2:
+        return ""
+    arrays = ohlcv_arrays(df)
+    indicators = compute_indicators(arrays)
+    lookback = min(rows, len(df) - 1)
+    obv_change = indicators["OBV"][-1] - indicators["OBV"][-1 - lookback]
+    return (f"{format_indicator_table(df['date'].tolist(), arrays['close'], indicators, rows)}\n"
+            f"- OBV（能量潮）近{lookback}个交易日变化 {obv_change:+.0f}"
+            f"（{'资金流入' if obv_change > 0 else '资金流出' if obv_change < 0 else '持平'}）")
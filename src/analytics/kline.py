@@ -0,0 +1,95 @@
+"""
+K线数据解析 - 把MCP工具返回的Markdown表格转换为DataFrame和NumPy数组
+A股MCP服务器的查询结果都是Markdown表格文本（表头、分隔行、数据行），
+本地分析模块从这里拿到数值数组后再做向量化计算。
+"""
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+# 保持字符串类型的列（以及statDate、dividOperateDate等以Date结尾的日期列），其余列按数值解析
+TEXT_COLUMNS = ("date", "code", "code_name", "time")
+
+# K线数组的标准字段
+OHLCV_FIELDS = ("open", "high", "low", "close", "volume")
+
+
+def _split_row(line: str) -> List[str]:
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+
+def parse_markdown_table(text: Optional[str]) -> pd.DataFrame:
+    """
+    解析文本中的第一个Markdown表格
+
+    表格前后的说明文字（如"数据已截断"的提示）会被忽略；数值列中无法解析的单元格为NaN。
+
+    Args:
+        text: 工具返回的文本
+
+    Returns:
+        pd.DataFrame: 解析结果，没有表格时返回空DataFrame
+    """
+    if not text:
+        return pd.DataFrame()
+
+    lines = [line for line in str(text).splitlines() if line.strip().startswith("|")]
+    # 表头之后必须是 |---|:---:| 形式的分隔行
+    if len(lines) < 2 or set(lines[1].replace("|", "").strip()) - set("-: "):
+        return pd.DataFrame()
+
+    header = _split_row(lines[0])
+    rows = [cells for cells in map(_split_row, lines[2:]) if len(cells) == len(header)]
+    df = pd.DataFrame(rows, columns=header)
+    for column in df.columns:
+        if column not in TEXT_COLUMNS and not column.endswith("Date"):
+            df[column] = pd.to_numeric(df[column].replace("", np.nan), errors="coerce")
+    return df
+
+
+def kline_frame(text: Optional[str]) -> pd.DataFrame:
+    """
+    解析get_historical_k_data的结果，只保留正常交易日，按日期升序排列
+
+    Returns:
+        pd.DataFrame: 包含date和OHLCV列的K线，缺少必要字段时返回空DataFrame
+    """
+    df = parse_markdown_table(text)
+    if df.empty or "date" not in df.columns or not set(OHLCV_FIELDS) <= set(df.columns):
+        return pd.DataFrame()
+    if "tradestatus" in df.columns:
+        # 停牌日的成交量为0，价格沿用前收盘，不参与指标计算
+        df = df[df["tradestatus"].fillna(1) == 1]
+    df = df.dropna(subset=["close"]).sort_values("date", kind="stable")
+    return df.reset_index(drop=True)
+
+
+def as_kline_frame(kline: Union[str, pd.DataFrame, None]) -> pd.DataFrame:
+    """K线参数统一为DataFrame：已经是DataFrame（如从K线存储读取）时原样返回，文本按kline_frame解析"""
+    return kline if isinstance(kline, pd.DataFrame) else kline_frame(kline)
+
+
+def ohlcv_arrays(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """K线DataFrame转换为float64数组字典（open/high/low/close/volume）"""
+    return {field: df[field].to_numpy(dtype=np.float64) for field in OHLCV_FIELDS}
+
+
+def stack_frames(frames: List[pd.DataFrame]) -> Dict[str, np.ndarray]:
+    """
+    把多只股票的K线按各自最近的交易日右对齐为 (股票数, 交易日数) 的二维数组
+
+    最后一列是每只股票最新的一根K线（停牌的股票即停牌前最后一个交易日），
+    历史较短的股票前面用NaN填充，空DataFrame对应整行NaN。
+
+    Returns:
+        Dict[str, np.ndarray]: OHLCV二维数组
+    """
+    days = max((len(df) for df in frames), default=0)
+    arrays = {field: np.full((len(frames), days), np.nan) for field in OHLCV_FIELDS}
+    for row, df in enumerate(frames):
+        if df.empty:
+            continue
+        for field in OHLCV_FIELDS:
+            arrays[field][row, days - len(df):] = df[field].to_numpy(dtype=np.float64)
+    return arrays
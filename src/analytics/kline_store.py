@@ -0,0 +1,345 @@
+"""
+本地日K线列式存储 - 每只股票的日线按列保存为内存映射的NumPy文件，增量追加
+每次分析都通过MCP（stdio、Markdown文本）重新拉取几个月到几年的日线，
+存储只保存不复权的日线（含估值字段）和复权因子，更新时只请求最后一根K线之后的数据；
+读取时按日期二分定位，返回内存映射数组的切片（不复制），前复权价格由复权因子实时计算。
+
+目录结构（每只股票一个目录）：
+    <store_dir>/<code>/meta.json          行数、起始日期、最近同步时间
+    <store_dir>/<code>/<字段>.bin          各列的原始数组（日期为datetime64[D]，其余为float64）
+    <store_dir>/<code>/factor_*.bin        复权因子（除权除息日、后复权因子）
+
+写入时先追加各列文件，再原子替换meta.json；读取只使用meta.json记录的行数，
+写入中断时多出的尾部数据不可见，下次追加前会被截断。
+"""
+import asyncio
+import json
+import os
+import re
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.analytics.kline import parse_markdown_table
+from src.tools.tool_cache import CHINA_TZ, TradingCalendar
+from src.utils.logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+project_root = os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_STORE_DIR = os.path.join(project_root, "cache", "kline_store")
+
+# 存储的日线字段（不复权），一次请求同时覆盖K线和估值指标
+STORE_FIELDS = ["date", "code", "open", "high", "low", "close", "volume", "amount", "turn",
+                "tradestatus", "pctChg", "peTTM", "pbMRQ", "psTTM", "pcfNcfTTM"]
+NUMERIC_FIELDS = [field for field in STORE_FIELDS if field not in ("date", "code")]
+
+# 前复权时需要乘以复权因子的价格字段
+PRICE_FIELDS = ("open", "high", "low", "close")
+
+# 首次同步时复权因子的起始日期（覆盖全部历史，前复权需要最早以来的全部除权除息）
+FACTOR_HISTORY_START = "1990-01-01"
+
+DATE_DTYPE = np.dtype("datetime64[D]")
+VALUE_DTYPE = np.dtype("<f8")
+
+ToolCaller = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+
+
+class KlineStore:
+    """按股票保存的日线列式存储"""
+
+    def __init__(self, store_dir: str = DEFAULT_STORE_DIR, calendar: Optional[TradingCalendar] = None):
+        self.store_dir = Path(store_dir)
+        self.calendar = calendar or TradingCalendar.from_env()
+
+    def _dir(self, code: str) -> Path:
+        return self.store_dir / re.sub(r"[^0-9A-Za-z._-]", "_", code)
+
+    def meta(self, code: str) -> Optional[Dict[str, Any]]:
+        """股票的元数据，尚未保存时返回None"""
+        path = self._dir(code) / "meta.json"
+        if not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Failed to read K-line store metadata {path}: {e}")
+            return None
+
+    def _write_meta(self, code: str, meta: Dict[str, Any]):
+        path = self._dir(code) / "meta.json"
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _column(self, code: str, name: str, dtype: np.dtype, rows: int) -> np.ndarray:
+        """只读内存映射的列（rows为meta.json记录的行数）"""
+        if rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._dir(code) / f"{name}.bin", dtype=dtype, mode="r", shape=(rows,))
+
+    def _append_columns(self, code: str, columns: Dict[str, np.ndarray], rows: int):
+        """在已提交的rows行之后追加各列（先截断写入中断遗留的尾部数据）"""
+        directory = self._dir(code)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, values in columns.items():
+            path = directory / f"{name}.bin"
+            with open(path, "ab") as f:
+                f.truncate(rows * values.dtype.itemsize)
+                f.write(np.ascontiguousarray(values).tobytes())
+
+    def clear(self, code: str):
+        """删除股票的全部数据"""
+        directory = self._dir(code)
+        if directory.exists():
+            for path in directory.iterdir():
+                path.unlink()
+            directory.rmdir()
+
+    def last_date(self, code: str) -> Optional[str]:
+        """最后一根K线的日期"""
+        meta = self.meta(code)
+        return meta.get("last_date") if meta and meta["rows"] else None
+
+    def covers(self, code: str, start_date: str) -> bool:
+        """存储中是否有从start_date起的数据（上市晚于start_date的股票以首次同步的起始日期为准）"""
+        meta = self.meta(code)
+        return bool(meta and meta["rows"] and meta["start_date"] <= start_date)
+
+    def append(self, code: str, bars: pd.DataFrame, factors: Optional[pd.DataFrame] = None,
+               start_date: Optional[str] = None, synced_at: Optional[str] = None) -> int:
+        """
+        追加日线和复权因子，只保留比已保存的最后日期更新的行
+
+        Args:
+            bars: date和STORE_FIELDS中数值列的DataFrame（parse_markdown_table的结果）
+            factors: date和back（后复权因子）两列
+            start_date: 首次写入时记录的起始日期
+            synced_at: 同步时间（ISO格式）
+
+        Returns:
+            int: 追加的K线行数
+        """
+        meta = self.meta(code) or {"rows": 0, "factor_rows": 0, "start_date": start_date,
+                                   "last_date": None, "last_factor_date": None}
+        appended = 0
+
+        if bars is not None and not bars.empty:
+            bars = bars.sort_values("date", kind="stable").drop_duplicates("date", keep="last")
+            if meta["last_date"]:
+                bars = bars[bars["date"] > meta["last_date"]]
+            if not bars.empty:
+                columns = {"date": bars["date"].to_numpy().astype(DATE_DTYPE)}
+                for field in NUMERIC_FIELDS:
+                    columns[field] = (pd.to_numeric(bars[field], errors="coerce").to_numpy(dtype=VALUE_DTYPE)
+                                      if field in bars.columns else np.full(len(bars), np.nan))
+                self._append_columns(code, columns, meta["rows"])
+                meta["rows"] += len(bars)
+                meta["last_date"] = bars["date"].iloc[-1]
+                appended = len(bars)
+
+        if factors is not None and not factors.empty:
+            factors = factors.sort_values("date", kind="stable").drop_duplicates("date", keep="last")
+            if meta["last_factor_date"]:
+                factors = factors[factors["date"] > meta["last_factor_date"]]
+            if not factors.empty:
+                self._append_columns(code, {
+                    "factor_date": factors["date"].to_numpy().astype(DATE_DTYPE),
+                    "factor_back": factors["back"].to_numpy(dtype=VALUE_DTYPE),
+                }, meta["factor_rows"])
+                meta["factor_rows"] += len(factors)
+                meta["last_factor_date"] = factors["date"].iloc[-1]
+
+        if meta["rows"] == 0:
+            # 没有任何K线时不建立目录，调用方会回退到MCP
+            return 0
+        if synced_at:
+            meta["synced_at"] = synced_at
+        self._write_meta(code, meta)
+        return appended
+
+    def read(self, code: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+             fields: Optional[Sequence[str]] = None, adjust: str = "none") -> Dict[str, np.ndarray]:
+        """
+        读取 [start_date, end_date] 内的日线
+
+        Args:
+            fields: 需要的字段（不含date），默认全部
+            adjust: "none" 不复权，返回内存映射的切片（不复制）；"forward" 前复权，价格字段为新数组
+
+        Returns:
+            Dict[str, np.ndarray]: date（datetime64[D]）和各字段数组；没有数据时为空数组
+        """
+        meta = self.meta(code)
+        rows = meta["rows"] if meta else 0
+        dates = self._column(code, "date", DATE_DTYPE, rows)
+        lo = np.searchsorted(dates, np.datetime64(start_date, "D"), "left") if start_date else 0
+        hi = np.searchsorted(dates, np.datetime64(end_date, "D"), "right") if end_date else rows
+
+        result = {"date": dates[lo:hi]}
+        for field in fields or NUMERIC_FIELDS:
+            result[field] = self._column(code, field, VALUE_DTYPE, rows)[lo:hi]
+
+        if adjust == "forward":
+            factor = self.forward_factors(code, result["date"])
+            for field in PRICE_FIELDS:
+                if field in result:
+                    result[field] = result[field] * factor
+        elif adjust != "none":
+            raise ValueError(f"Unsupported adjust mode: {adjust}")
+        return result
+
+    def forward_factors(self, code: str, dates: np.ndarray) -> np.ndarray:
+        """
+        各交易日的前复权因子：当日适用的后复权因子 / 最新的后复权因子
+
+        与baostock的前复权价（adjust_flag=2）一致：最近一次除权除息之后的价格不变，之前的价格按比例调整。
+        """
+        meta = self.meta(code)
+        rows = meta.get("factor_rows", 0) if meta else 0
+        if rows == 0:
+            return np.ones(len(dates))
+        factor_dates = self._column(code, "factor_date", DATE_DTYPE, rows)
+        back = self._column(code, "factor_back", VALUE_DTYPE, rows)
+        # 第一次除权除息之前的后复权因子为1
+        applicable = np.concatenate([[1.0], back])[np.searchsorted(factor_dates, dates, "right")]
+        return applicable / back[-1]
+
+    def is_fresh(self, code: str, now: Optional[datetime] = None) -> bool:
+        """上次同步之后是否还没有新的日线数据就绪（下一个交易日17:30之前）"""
+        meta = self.meta(code)
+        if not meta or not meta.get("synced_at"):
+            return False
+        now = now or datetime.now(CHINA_TZ)
+        synced_at = datetime.fromisoformat(meta["synced_at"])
+        return now < self.calendar.next_daily_data_ready(synced_at)
+
+    async def sync(self, code: str, start_date: str, end_date: str, call_tool: ToolCaller,
+                   now: Optional[datetime] = None) -> int:
+        """
+        从MCP增量更新一只股票：只请求最后一根K线之后的日线和最后一次除权除息之后的复权因子
+
+        已保存的数据晚于start_date开始时（回看期变长）重新完整同步。
+        日线或复权因子任一请求失败（抛出异常或返回以"Error"开头的错误文本）、
+        或日线结果中没有K线表格时抛出异常，不写入任何数据，也不更新同步时间。
+
+        Args:
+            call_tool: 调用MCP工具的协程函数，如 call_mcp_tool
+            now: 当前时间（默认为北京时间的当前时刻）
+
+        Returns:
+            int: 新增的K线行数
+        """
+        now = now or datetime.now(CHINA_TZ)
+        meta = self.meta(code)
+        if meta and meta["start_date"] > start_date:
+            self.clear(code)
+            meta = None
+        if meta and self.is_fresh(code, now):
+            return 0
+
+        def next_day(day: Optional[str], default: str) -> str:
+            if not day:
+                return default
+            return (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+        bars_start = next_day(meta and meta["last_date"], start_date)
+        factors_start = next_day(meta and meta["last_factor_date"], FACTOR_HISTORY_START)
+        if bars_start > end_date:
+            return 0
+
+        bars_text, factors_text = await asyncio.gather(
+            call_tool("get_historical_k_data", {
+                "code": code, "start_date": bars_start, "end_date": end_date,
+                "frequency": "d", "adjust_flag": "3", "fields": STORE_FIELDS}),
+            call_tool("get_adjust_factor_data", {
+                "code": code, "start_date": factors_start, "end_date": end_date}))
+
+        # MCP服务器以文本报告失败，与mcp_client中判断是否缓存结果的方式一致
+        for tool_name, text in (("get_historical_k_data", bars_text), ("get_adjust_factor_data", factors_text)):
+            if str(text).lstrip().startswith("Error"):
+                raise RuntimeError(f"{tool_name} failed for {code}: {str(text)[:200]}")
+        bars = parse_markdown_table(bars_text)
+        if "date" not in bars.columns:
+            raise RuntimeError(f"get_historical_k_data returned no K-line table for {code}")
+        factors = parse_markdown_table(factors_text)
+        if {"dividOperateDate", "backAdjustFactor"} <= set(factors.columns):
+            factors = pd.DataFrame({"date": factors["dividOperateDate"].astype(str),
+                                    "back": factors["backAdjustFactor"]}).dropna()
+        else:
+            factors = None
+        return self.append(code, bars, factors, start_date=start_date, synced_at=now.isoformat())
+
+
+def frame_from_columns(columns: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """read()的结果转换为与kline_frame相同形式的DataFrame（只保留正常交易日）"""
+    df = pd.DataFrame({name: np.asarray(values) for name, values in columns.items()})
+    if df.empty:
+        return df
+    df["date"] = df["date"].dt.strftime("%Y-%m-%d")
+    if "tradestatus" in df.columns:
+        df = df[df["tradestatus"].fillna(1) == 1]
+    return df.dropna(subset=["close"]).reset_index(drop=True)
+
+
+def format_markdown(code: str, columns: Dict[str, np.ndarray], fields: List[str]) -> str:
+    """read()的结果格式化为与MCP工具结果相同的Markdown表格，放入预取数据"""
+    dates = np.datetime_as_string(columns["date"], unit="D")
+    lines = ["| date | code | " + " | ".join(fields) + " |",
+             "|" + "---|" * (len(fields) + 2)]
+    values = [columns[field] for field in fields]
+    for i, date in enumerate(dates):
+        cells = ["" if np.isnan(column[i]) else f"{column[i]:.4f}".rstrip("0").rstrip(".")
+                 for column in values]
+        lines.append(f"| {date} | {code} | " + " | ".join(cells) + " |")
+    return "\n".join(lines)
+
+
+def read_prefetched(data: Dict[str, Any], section: str) -> pd.DataFrame:
+    """
+    预取时来自K线存储的数据块（见prefetch_agent），直接从存储读取为DataFrame，不再解析文本
+
+    Args:
+        data: state.data，prefetch_sources记录了数据块的读取参数
+        section: "kline" 或 "valuation"
+
+    Returns:
+        pd.DataFrame: 与kline_frame形式相同的DataFrame；数据块不是来自存储或存储已关闭时为空DataFrame
+    """
+    source = (data.get("prefetch_sources") or {}).get(section)
+    store = get_kline_store()
+    if not source or store is None or not data.get("stock_code"):
+        return pd.DataFrame()
+    try:
+        columns = store.read(data["stock_code"], source["start_date"], source["end_date"],
+                             source["fields"], source["adjust"])
+    except Exception as e:
+        logger.warning(f"Failed to read {section} from K-line store: {e}")
+        return pd.DataFrame()
+    return frame_from_columns(columns)
+
+
+# 全局存储实例
+_kline_store: Optional[KlineStore] = None
+
+
+def get_kline_store() -> Optional[KlineStore]:
+    """
+    获取全局K线存储，KLINE_STORE_ENABLED=false时返回None
+
+    存储目录由KLINE_STORE_DIR配置，默认为cache/kline_store
+    """
+    global _kline_store
+    if os.getenv("KLINE_STORE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    if _kline_store is None:
+        _kline_store = KlineStore(os.getenv("KLINE_STORE_DIR", DEFAULT_STORE_DIR))
+    return _kline_store
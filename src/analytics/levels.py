@@ -0,0 +1,407 @@
+"""
+支撑/阻力位与趋势状态识别 - 从K线数组中找出价格关键位，给技术分析师直接引用
+识别的依据：
+    - 波段高低点：在前后pivot_window个交易日内最高（最低）的K线
+    - 成交密集区：按价格分箱的成交量分布（volume profile）中的高成交量节点
+    - 突破位：前breakout_window个交易日的最高价/最低价（唐奇安通道）
+    - 趋势状态：对数收盘价的滑动线性回归斜率和ADX趋势强度
+
+全部计算沿时间轴向量化，输入可以是单只股票，也可以是 (股票数, 交易日数) 的整个股票池；
+scan_universe对股票池一次性给出每只股票最近的支撑/阻力、突破信号和趋势状态，不逐行循环。
+find_levels对单只股票把候选价位聚类为带置信度的支撑/阻力位，用于分析师的提示词。
+"""
+import warnings
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from src.analytics.indicators import ema, rolling_max, rolling_min, sma, previous
+from src.analytics.kline import as_kline_frame, kline_frame, ohlcv_arrays, stack_frames
+
+# 默认参数
+LOOKBACK_DAYS = 120         # 寻找关键位的回看交易日数
+PIVOT_WINDOW = 5            # 波段高低点两侧的确认交易日数
+BREAKOUT_WINDOW = 20        # 突破位使用的通道长度
+TREND_WINDOW = 20           # 趋势回归的窗口
+ADX_WINDOW = 14
+PROFILE_BINS = 24           # 成交量分布的价格分箱数
+
+# ADX达到该值视为有明确趋势，否则视为震荡
+TREND_STRONG_ADX = 25.0
+
+# 趋势状态编码
+REGIME_UP, REGIME_RANGE, REGIME_DOWN = 1, 0, -1
+REGIME_LABELS = {REGIME_UP: "上升趋势", REGIME_RANGE: "震荡", REGIME_DOWN: "下降趋势"}
+
+
+def pivot_points(high: np.ndarray, low: np.ndarray, window: int = PIVOT_WINDOW) -> Dict[str, np.ndarray]:
+    """
+    波段高低点：前后各window个交易日内的最高价（最低价）所在的K线
+
+    最后window个交易日右侧数据不足，不会被确认为波段点。
+
+    Returns:
+        Dict[str, np.ndarray]: pivot_high / pivot_low 布尔数组，形状与输入相同
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    span = 2 * window + 1
+    centered_max = np.full(high.shape, np.nan)
+    centered_min = np.full(low.shape, np.nan)
+    if high.shape[-1] >= span:
+        # 截至t+window的滑动极值即以t为中心的窗口极值
+        centered_max[..., :-window] = rolling_max(high, span)[..., window:]
+        centered_min[..., :-window] = rolling_min(low, span)[..., window:]
+    return {"pivot_high": high == centered_max, "pivot_low": low == centered_min}
+
+
+def adx(high: np.ndarray, low: np.ndarray, close: np.ndarray,
+        window: int = ADX_WINDOW) -> Dict[str, np.ndarray]:
+    """平均趋向指数（Wilder平滑）：+DI、-DI和ADX"""
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    prev_high, prev_low = previous(high), previous(low)
+    prev_close = previous(np.asarray(close, dtype=np.float64))
+
+    up_move = high - prev_high
+    down_move = prev_low - low
+    first = np.isnan(up_move)
+    plus_dm = np.where(first, np.nan, np.where((up_move > down_move) & (up_move > 0), up_move, 0.0))
+    minus_dm = np.where(first, np.nan, np.where((down_move > up_move) & (down_move > 0), down_move, 0.0))
+    true_range = np.where(first, np.nan, np.fmax(
+        high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close))))
+
+    smoothed_tr = ema(true_range, 1 / window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        plus_di = 100 * ema(plus_dm, 1 / window) / smoothed_tr
+        minus_di = 100 * ema(minus_dm, 1 / window) / smoothed_tr
+        di_sum = plus_di + minus_di
+        dx = np.where(di_sum > 0, 100 * np.abs(plus_di - minus_di) / di_sum,
+                      np.where(np.isnan(di_sum), np.nan, 0.0))
+    return {"PLUS_DI": plus_di, "MINUS_DI": minus_di, "ADX": ema(dx, 1 / window)}
+
+
+def trend_slope(close: np.ndarray, window: int = TREND_WINDOW) -> Dict[str, np.ndarray]:
+    """
+    对数收盘价在滑动窗口内的线性回归
+
+    Returns:
+        Dict[str, np.ndarray]: slope（每个交易日的平均涨跌幅，%）和r2（拟合优度）
+    """
+    y = np.log(np.asarray(close, dtype=np.float64))
+    t = np.arange(y.shape[-1], dtype=np.float64)
+    n = float(window)
+    sum_y = sma(y, window) * n
+    sum_yy = sma(y * y, window) * n
+    # Σ x·y，x为窗口内的位置0..n-1：Σ t·y - 窗口起点 · Σ y
+    sum_xy = sma(t * y, window) * n - (t - (window - 1)) * sum_y
+    sum_x = n * (n - 1) / 2
+    sum_xx = (n - 1) * n * (2 * n - 1) / 6
+
+    covariance = n * sum_xy - sum_x * sum_y
+    variance_x = n * sum_xx - sum_x ** 2
+    variance_y = n * sum_yy - sum_y ** 2
+    slope = covariance / variance_x
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r2 = np.where(variance_y > 0, covariance ** 2 / (variance_x * variance_y), 0.0)
+    r2 = np.where(np.isnan(slope), np.nan, np.clip(r2, 0.0, 1.0))
+    return {"slope": (np.exp(slope) - 1) * 100, "r2": r2}
+
+
+def classify_regime(adx_values: np.ndarray, slope: np.ndarray) -> np.ndarray:
+    """ADX足够强时按回归斜率的方向判断趋势，否则为震荡"""
+    trending = adx_values >= TREND_STRONG_ADX
+    return np.where(trending & (slope > 0), REGIME_UP,
+                    np.where(trending & (slope < 0), REGIME_DOWN, REGIME_RANGE))
+
+
+def volume_profile(ohlcv: Dict[str, np.ndarray], bins: int = PROFILE_BINS,
+                   lookback: int = LOOKBACK_DAYS) -> Dict[str, np.ndarray]:
+    """
+    最近lookback个交易日按价格分箱的成交量分布
+
+    每根K线的成交量记在其典型价格 (高+低+收)/3 所在的分箱中；
+    多只股票用一次bincount完成（分箱编号加上股票偏移）。
+
+    Returns:
+        Dict[str, np.ndarray]: edges (..., bins+1) 分箱边界，volume (..., bins) 各分箱成交量
+    """
+    high = np.atleast_2d(np.asarray(ohlcv["high"], dtype=np.float64)[..., -lookback:])
+    low = np.atleast_2d(np.asarray(ohlcv["low"], dtype=np.float64)[..., -lookback:])
+    close = np.atleast_2d(np.asarray(ohlcv["close"], dtype=np.float64)[..., -lookback:])
+    volume = np.atleast_2d(np.asarray(ohlcv["volume"], dtype=np.float64)[..., -lookback:])
+    stocks = high.shape[0]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        price_min = np.nanmin(low, axis=-1, keepdims=True)
+        price_max = np.nanmax(high, axis=-1, keepdims=True)
+    width = np.where(price_max > price_min, price_max - price_min, 1.0)
+    typical = (high + low + close) / 3
+    # 回看期内没有数据的股票price_min为NaN，其成交量分布全为0
+    valid = ~np.isnan(typical) & ~np.isnan(volume) & ~np.isnan(price_min)
+    position = np.where(valid, (typical - price_min) / width * bins, 0.0)
+    index = np.clip(np.floor(position), 0, bins - 1).astype(np.int64)
+    flat_index = index + np.arange(stocks)[:, None] * bins
+    profile = np.bincount(flat_index.ravel(), weights=np.where(valid, volume, 0.0).ravel(),
+                          minlength=stocks * bins).reshape(stocks, bins)
+    edges = price_min + width * np.linspace(0, 1, bins + 1)
+
+    if np.ndim(ohlcv["high"]) == 1:
+        return {"edges": edges[0], "volume": profile[0]}
+    return {"edges": edges, "volume": profile}
+
+
+def scan_universe(ohlcv: Dict[str, np.ndarray], lookback: int = LOOKBACK_DAYS,
+                  pivot_window: int = PIVOT_WINDOW, breakout_window: int = BREAKOUT_WINDOW,
+                  trend_window: int = TREND_WINDOW) -> Dict[str, np.ndarray]:
+    """
+    对整个股票池计算最新一个交易日的关键位和趋势状态
+
+    Args:
+        ohlcv: open/high/low/close/volume数组，形状为 (股票数, 交易日数)，上市较晚的股票前面用NaN填充
+
+    Returns:
+        Dict[str, np.ndarray]: 每只股票一个值（形状为 (股票数,)）：
+            close                最新收盘价
+            support/resistance   回看期内现价下方最近的波段低点/上方最近的波段高点（没有时为NaN）
+            support_distance     现价到支撑位的距离（%，负数）；resistance_distance同理（正数）
+            volume_node          成交量最大的价格分箱中心（point of control）
+            breakout             1=收盘突破前breakout_window日高点，-1=跌破前低点，0=无
+            breakout_level       被突破的价位
+            adx/slope/r2         趋势强度、回归斜率（%/日）和拟合优度
+            regime               趋势状态编码（REGIME_UP/REGIME_RANGE/REGIME_DOWN）
+    """
+    high, low, close, volume = (np.atleast_2d(np.asarray(ohlcv[field], dtype=np.float64))
+                                for field in ("high", "low", "close", "volume"))
+    last_close = close[:, -1]
+
+    pivots = pivot_points(high[:, -lookback:], low[:, -lookback:], pivot_window)
+    pivot_highs = np.where(pivots["pivot_high"], high[:, -lookback:], np.nan)
+    pivot_lows = np.where(pivots["pivot_low"], low[:, -lookback:], np.nan)
+    with warnings.catch_warnings():
+        # 没有候选波段点的股票结果为NaN（All-NaN slice）
+        warnings.simplefilter("ignore", RuntimeWarning)
+        support = np.nanmax(np.where(pivot_lows < last_close[:, None], pivot_lows, np.nan), axis=1)
+        resistance = np.nanmin(np.where(pivot_highs > last_close[:, None], pivot_highs, np.nan), axis=1)
+
+    prior_high = previous(rolling_max(high, breakout_window))[:, -1]
+    prior_low = previous(rolling_min(low, breakout_window))[:, -1]
+    breakout = np.where(last_close > prior_high, 1, np.where(last_close < prior_low, -1, 0))
+
+    profile = volume_profile({"high": high, "low": low, "close": close, "volume": volume},
+                             lookback=lookback)
+    poc = np.argmax(profile["volume"], axis=1)
+    rows = np.arange(len(poc))
+    volume_node = (profile["edges"][rows, poc] + profile["edges"][rows, poc + 1]) / 2
+
+    strength = adx(high, low, close)["ADX"][:, -1]
+    trend = trend_slope(close, trend_window)
+    slope, r2 = trend["slope"][:, -1], trend["r2"][:, -1]
+
+    return {
+        "close": last_close,
+        "support": support,
+        "resistance": resistance,
+        "support_distance": (support / last_close - 1) * 100,
+        "resistance_distance": (resistance / last_close - 1) * 100,
+        "volume_node": volume_node,
+        "breakout": breakout,
+        "breakout_level": np.where(breakout > 0, prior_high, np.where(breakout < 0, prior_low, np.nan)),
+        "adx": strength,
+        "slope": slope,
+        "r2": r2,
+        "regime": classify_regime(strength, slope),
+    }
+
+
+def find_levels(ohlcv: Dict[str, np.ndarray], dates: Optional[List[str]] = None,
+                lookback: int = LOOKBACK_DAYS, pivot_window: int = PIVOT_WINDOW,
+                max_levels: int = 3) -> Dict[str, Any]:
+    """
+    单只股票的支撑/阻力位（带置信度）、突破信号和趋势状态
+
+    波段高低点、成交密集区和突破位作为候选价位，在容差（0.5倍ATR与1%现价中较大者）内聚类；
+    置信度综合波段点次数、该价位附近的成交量占比、最近一次触及的时间和依据的种类数，取值0~1。
+
+    Args:
+        ohlcv: 单只股票的open/high/low/close/volume一维数组
+        dates: 与K线对应的日期，提供时结果中包含最近一次触及的日期
+
+    Returns:
+        Dict[str, Any]: supports/resistances（按距现价由近到远）、breakout、regime，均为可JSON序列化的值
+    """
+    high = np.asarray(ohlcv["high"], dtype=np.float64)[-lookback:]
+    low = np.asarray(ohlcv["low"], dtype=np.float64)[-lookback:]
+    close = np.asarray(ohlcv["close"], dtype=np.float64)[-lookback:]
+    volume = np.asarray(ohlcv["volume"], dtype=np.float64)[-lookback:]
+    dates = list(dates[-lookback:]) if dates is not None else None
+    window = {"high": high, "low": low, "close": close, "volume": volume}
+    last_close = float(close[-1])
+
+    # 候选价位：(价格, 依据)
+    pivots = pivot_points(high, low, pivot_window)
+    candidates = [(price, "pivot_high") for price in high[pivots["pivot_high"]]]
+    candidates += [(price, "pivot_low") for price in low[pivots["pivot_low"]]]
+    profile = volume_profile(window, lookback=lookback)
+    centers = (profile["edges"][:-1] + profile["edges"][1:]) / 2
+    node_volume = profile["volume"]
+    padded = np.concatenate([[-np.inf], node_volume, [-np.inf]])
+    is_node = (node_volume >= padded[:-2]) & (node_volume >= padded[2:]) & \
+              (node_volume > 1.5 * node_volume.mean())
+    candidates += [(price, "volume_node") for price in centers[is_node]]
+    if len(close) > BREAKOUT_WINDOW:
+        candidates.append((float(np.max(high[-BREAKOUT_WINDOW - 1:-1])), "breakout"))
+        candidates.append((float(np.min(low[-BREAKOUT_WINDOW - 1:-1])), "breakout"))
+
+    atr_values = ema(np.fmax(high - low, np.abs(high - previous(close))), 1 / ADX_WINDOW)
+    tolerance = max(0.5 * float(atr_values[-1]), 0.01 * last_close)
+
+    # 按价格排序后贪心聚类（候选价位只有几十个）
+    clusters: List[List[Any]] = []
+    for price, source in sorted(candidates):
+        if clusters and price - clusters[-1][-1][0] <= tolerance:
+            clusters[-1].append((price, source))
+        else:
+            clusters.append([(price, source)])
+
+    total_volume = float(np.nansum(volume)) or 1.0
+    levels = []
+    for cluster in clusters:
+        price = float(np.mean([p for p, _ in cluster]))
+        sources = sorted({source for _, source in cluster})
+        pivot_count = sum(1 for _, source in cluster if source.startswith("pivot"))
+        touched = (low <= price + tolerance) & (high >= price - tolerance)
+        near = np.abs((high + low + close) / 3 - price) <= tolerance
+        volume_share = float(np.nansum(volume[near])) / total_volume
+        last_touch = int(np.nonzero(touched)[0][-1]) if touched.any() else None
+        days_since = len(close) - 1 - last_touch if last_touch is not None else len(close)
+
+        confidence = (0.4 * min(pivot_count / 3, 1.0)
+                      + 0.3 * min(volume_share / 0.15, 1.0)
+                      + 0.2 * float(np.exp(-days_since / 60))
+                      + 0.1 * min((len(sources) - 1) / 2, 1.0))
+        level = {
+            "price": round(price, 3),
+            "confidence": round(confidence, 2),
+            "sources": sources,
+            "pivots": pivot_count,
+            "touches": int(touched.sum()),
+            "volume_share": round(volume_share, 3),
+            "distance_pct": round((price / last_close - 1) * 100, 2),
+            "days_since_touch": days_since,
+        }
+        if dates is not None and last_touch is not None:
+            level["last_touch_date"] = dates[last_touch]
+        levels.append(level)
+
+    supports = sorted((level for level in levels if level["price"] < last_close),
+                      key=lambda level: -level["price"])[:max_levels]
+    resistances = sorted((level for level in levels if level["price"] >= last_close),
+                         key=lambda level: level["price"])[:max_levels]
+
+    scan = scan_universe(ohlcv, lookback=lookback, pivot_window=pivot_window)
+    breakout = int(scan["breakout"][0])
+    return {
+        "close": last_close,
+        "tolerance": round(tolerance, 3),
+        "supports": supports,
+        "resistances": resistances,
+        "breakout": {"direction": breakout,
+                     "level": round(float(scan["breakout_level"][0]), 3) if breakout else None},
+        "regime": {
+            "label": REGIME_LABELS[int(scan["regime"][0])],
+            "adx": round(float(scan["adx"][0]), 1),
+            "slope_pct_per_day": round(float(scan["slope"][0]), 3),
+            "r2": round(float(scan["r2"][0]), 2),
+        },
+    }
+
+
+SOURCE_LABELS = {
+    "pivot_high": "波段高点",
+    "pivot_low": "波段低点",
+    "volume_node": "成交密集区",
+    "breakout": f"{BREAKOUT_WINDOW}日通道边界",
+}
+
+
+def format_levels(result: Dict[str, Any]) -> str:
+    """把find_levels的结果整理为提示词中的文本"""
+    lines = []
+    for key, title in (("supports", "支撑位"), ("resistances", "阻力位")):
+        lines.append(f"{title}：")
+        if not result[key]:
+            lines.append("- 回看期内没有明确的价位")
+        for level in result[key]:
+            sources = "、".join(SOURCE_LABELS.get(source, source) for source in level["sources"])
+            touch = f"，最近触及 {level['last_touch_date']}" if level.get("last_touch_date") else ""
+            lines.append(f"- {level['price']:.2f}（置信度 {level['confidence']:.2f}；依据：{sources}；"
+                         f"触及 {level['touches']} 次{touch}；距现价 {level['distance_pct']:+.2f}%）")
+
+    breakout = result["breakout"]
+    if breakout["direction"] > 0:
+        lines.append(f"突破：收盘价突破前{BREAKOUT_WINDOW}个交易日高点 {breakout['level']:.2f}")
+    elif breakout["direction"] < 0:
+        lines.append(f"突破：收盘价跌破前{BREAKOUT_WINDOW}个交易日低点 {breakout['level']:.2f}")
+    else:
+        lines.append(f"突破：收盘价位于前{BREAKOUT_WINDOW}个交易日的高低点之间")
+
+    regime = result["regime"]
+    lines.append(f"趋势状态：{regime['label']}（ADX {regime['adx']:.1f}，"
+                 f"{TREND_WINDOW}日回归斜率 {regime['slope_pct_per_day']:+.3f}%/日，R² {regime['r2']:.2f}）")
+    return "\n".join(lines)
+
+
+def support_resistance_section(kline: Union[str, pd.DataFrame, None]) -> str:
+    """
+    从get_historical_k_data的结果（或从K线存储读取的DataFrame）识别关键位和趋势状态，生成放入提示词的文本
+
+    Returns:
+        str: 关键位文本；K线不足以确认波段点时返回空字符串
+    """
+    df = as_kline_frame(kline)
+    if len(df) < 2 * PIVOT_WINDOW + 2:
+        return ""
+    return format_levels(find_levels(ohlcv_arrays(df), df["date"].tolist()))
+
+
+def scan_klines(kline_texts: List[Optional[str]]) -> List[Optional[Dict[str, Any]]]:
+    """
+    批量模式：对多只股票预取的日K线做一次向量化扫描
+
+    Args:
+        kline_texts: 每只股票的get_historical_k_data结果，缺失时为None
+
+    Returns:
+        List[Optional[Dict[str, Any]]]: 与输入一一对应的扫描结果（可JSON序列化），K线缺失的股票为None
+    """
+    frames = [kline_frame(text) for text in kline_texts]
+    if not any(len(df) > 2 * PIVOT_WINDOW + 1 for df in frames):
+        return [None] * len(frames)
+    scan = scan_universe(stack_frames(frames))
+
+    def value(name, i, digits):
+        number = float(scan[name][i])
+        return None if np.isnan(number) else round(number, digits)
+
+    results = []
+    for i, df in enumerate(frames):
+        if len(df) <= 2 * PIVOT_WINDOW + 1 or np.isnan(scan["close"][i]):
+            results.append(None)
+            continue
+        results.append({
+            "close": value("close", i, 3),
+            "support": value("support", i, 3),
+            "resistance": value("resistance", i, 3),
+            "support_distance_pct": value("support_distance", i, 2),
+            "resistance_distance_pct": value("resistance_distance", i, 2),
+            "volume_node": value("volume_node", i, 3),
+            "breakout": int(scan["breakout"][i]),
+            "breakout_level": value("breakout_level", i, 3),
+            "regime": REGIME_LABELS[int(scan["regime"][i])],
+            "adx": value("adx", i, 1),
+            "slope_pct_per_day": value("slope", i, 3),
+        })
+    return results
@@ -0,0 +1,316 @@
+"""
+估值计算 - 历史估值分位带、DCF/DDM敏感性矩阵和股息率，给估值分析师直接引用
+输入是data_prefetch预取的数据：
+    - valuation：近3年的日度估值指标（不复权收盘价、peTTM、pbMRQ、psTTM、pcfNcfTTM）
+    - dividends：近几年的分红数据（按年份）
+
+估值倍数的分位数沿时间轴向量化（单只股票或 (股票数, 交易日数) 的数组都可以），
+DCF和DDM对折现率×增长率的整个网格一次广播计算。全部计算是确定性的，
+同样的输入每次得到同样的数值，LLM只负责解读而不再自己做算术。
+"""
+import warnings
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.analytics.kline import parse_markdown_table
+
+# 估值倍数字段和显示名称
+MULTIPLES = {
+    "peTTM": "市盈率PE(TTM)",
+    "pbMRQ": "市净率PB(MRQ)",
+    "psTTM": "市销率PS(TTM)",
+    "pcfNcfTTM": "市现率PCF(TTM)",
+}
+
+# 估值带的分位数（%）
+BAND_PERCENTILES = (10, 25, 50, 75, 90)
+
+# DCF/DDM敏感性矩阵的默认参数
+DISCOUNT_RATES = (0.08, 0.09, 0.10, 0.11, 0.12)
+GROWTH_RATES = (0.0, 0.025, 0.05, 0.075, 0.10)      # DCF：预测期内的年增长率
+DIVIDEND_GROWTH_RATES = (0.0, 0.01, 0.02, 0.03, 0.04)  # DDM：股息的永续增长率
+TERMINAL_GROWTH = 0.025     # DCF的永续增长率
+FORECAST_YEARS = 5          # DCF的预测期（年）
+
+# 计算股息率时回看的天数
+DIVIDEND_LOOKBACK_DAYS = 365
+
+
+def valuation_frame(text: Optional[str]) -> pd.DataFrame:
+    """
+    解析预取的估值指标（get_historical_k_data，fields含peTTM等），按日期升序排列
+
+    Returns:
+        pd.DataFrame: 包含date、close和估值倍数列，缺少date或close时返回空DataFrame
+    """
+    df = parse_markdown_table(text)
+    if df.empty or not {"date", "close"} <= set(df.columns):
+        return pd.DataFrame()
+    df = df.dropna(subset=["close"]).sort_values("date", kind="stable")
+    return df.reset_index(drop=True)
+
+
+def percentile_bands(values: np.ndarray,
+                     percentiles: Sequence[float] = BAND_PERCENTILES) -> Dict[str, np.ndarray]:
+    """
+    估值倍数的历史分位带
+
+    非正数（亏损时的PE、净现金流为负时的PCF）和NaN不参与统计。
+
+    Args:
+        values: 估值倍数序列，形状为 (..., 交易日数)，最后一个值为当前值
+
+    Returns:
+        Dict[str, np.ndarray]: 形状为 (...,) 的current（当前值）、rank（当前值的历史分位，0~100）、
+            samples（有效样本数），以及形状为 (..., len(percentiles)) 的bands
+    """
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(invalid="ignore"):
+        valid = values > 0
+    history = np.where(valid, values, np.nan)
+    current = history[..., -1]
+    samples = valid.sum(axis=-1)
+    with warnings.catch_warnings():
+        # 没有有效样本的序列结果为NaN（All-NaN slice）
+        warnings.simplefilter("ignore", RuntimeWarning)
+        bands = np.moveaxis(np.nanpercentile(history, percentiles, axis=-1), 0, -1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rank = (valid & (history <= current[..., None])).sum(axis=-1) / samples * 100
+    rank = np.where(np.isnan(current), np.nan, rank)
+    return {"current": current, "rank": rank, "samples": samples, "bands": bands}
+
+
+def dcf_grid(base_cash_flow: float, discount_rates: Sequence[float] = DISCOUNT_RATES,
+             growth_rates: Sequence[float] = GROWTH_RATES,
+             terminal_growth: float = TERMINAL_GROWTH,
+             years: int = FORECAST_YEARS) -> np.ndarray:
+    """
+    两阶段DCF的每股价值敏感性矩阵
+
+    预测期内现金流按growth逐年增长，之后按terminal_growth永续增长（Gordon终值），
+    全部按discount折现。整个网格一次广播计算。
+
+    Args:
+        base_cash_flow: 基期每股现金流
+        discount_rates: 折现率（行）
+        growth_rates: 预测期增长率（列）
+
+    Returns:
+        np.ndarray: (len(discount_rates), len(growth_rates)) 的每股价值；折现率不高于永续增长率时为NaN
+    """
+    r = np.asarray(discount_rates, dtype=np.float64)[:, None, None]
+    g = np.asarray(growth_rates, dtype=np.float64)[None, :, None]
+    t = np.arange(1, years + 1, dtype=np.float64)[None, None, :]
+
+    discount = (1 + r) ** -t
+    cash_flows = base_cash_flow * (1 + g) ** t
+    explicit = (cash_flows * discount).sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        terminal = cash_flows[..., -1] * (1 + terminal_growth) / (r[..., 0] - terminal_growth)
+    value = explicit + terminal * discount[..., -1]
+    return np.where(r[..., 0] > terminal_growth, value, np.nan)
+
+
+def ddm_grid(dividend: float, discount_rates: Sequence[float] = DISCOUNT_RATES,
+             growth_rates: Sequence[float] = DIVIDEND_GROWTH_RATES) -> np.ndarray:
+    """
+    Gordon股利增长模型的每股价值敏感性矩阵：D × (1+g) / (r-g)
+
+    Returns:
+        np.ndarray: (len(discount_rates), len(growth_rates)) 的每股价值；r不高于g时为NaN
+    """
+    r = np.asarray(discount_rates, dtype=np.float64)[:, None]
+    g = np.asarray(growth_rates, dtype=np.float64)[None, :]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        value = dividend * (1 + g) / (r - g)
+    return np.where(r > g, value, np.nan)
+
+
+def dividend_events(dividend_texts: Dict[str, Any]) -> pd.DataFrame:
+    """
+    合并各年份的get_dividend_data结果
+
+    Returns:
+        pd.DataFrame: date（除权除息日）和cash（每股税前现金分红）两列，按日期升序去重
+    """
+    frames = []
+    for text in (dividend_texts or {}).values():
+        df = parse_markdown_table(text)
+        if {"dividOperateDate", "dividCashPsBeforeTax"} <= set(df.columns):
+            frames.append(pd.DataFrame({"date": df["dividOperateDate"].astype(str),
+                                        "cash": df["dividCashPsBeforeTax"]}))
+    if not frames:
+        return pd.DataFrame(columns=["date", "cash"])
+    events = pd.concat(frames, ignore_index=True)
+    events = events[(events["date"].str.len() > 0) & (events["cash"] > 0)]
+    return events.drop_duplicates().sort_values("date", kind="stable").reset_index(drop=True)
+
+
+def trailing_dividend(events: pd.DataFrame, as_of: str,
+                      lookback_days: int = DIVIDEND_LOOKBACK_DAYS) -> Dict[str, Any]:
+    """as_of之前lookback_days天内已除息的每股现金分红合计"""
+    start = (datetime.strptime(as_of, "%Y-%m-%d") - timedelta(days=lookback_days)).strftime("%Y-%m-%d")
+    window = events[(events["date"] > start) & (events["date"] <= as_of)]
+    return {"per_share": float(window["cash"].sum()), "events": window["date"].tolist()}
+
+
+def _round(value, digits: int = 2) -> Optional[float]:
+    value = float(value)
+    return None if np.isnan(value) else round(value, digits)
+
+
+def _grid(values: np.ndarray, digits: int = 2) -> List[List[Optional[float]]]:
+    return [[_round(value, digits) for value in row] for row in values]
+
+
+def analyze_valuation(prefetched: Dict[str, Any],
+                      discount_rates: Sequence[float] = DISCOUNT_RATES,
+                      growth_rates: Sequence[float] = GROWTH_RATES,
+                      dividend_growth_rates: Sequence[float] = DIVIDEND_GROWTH_RATES,
+                      valuation: Optional[pd.DataFrame] = None) -> Optional[Dict[str, Any]]:
+    """
+    根据预取的数据计算估值分位带、DCF/DDM敏感性矩阵和股息率
+
+    DCF以每股收益(TTM) = 收盘价 / peTTM 作为基期现金流，DDM以近12个月的每股现金分红为基期股息。
+
+    Args:
+        prefetched: state.data["prefetched"]
+        valuation: 从K线存储读取的估值指标；为空时解析prefetched["valuation"]
+
+    Returns:
+        Optional[Dict[str, Any]]: 可JSON序列化的估值结果；没有可解析的估值数据时返回None
+    """
+    df = valuation if valuation is not None and not valuation.empty \
+        else valuation_frame(prefetched.get("valuation"))
+    if df.empty:
+        return None
+
+    as_of = df["date"].iloc[-1]
+    close = float(df["close"].iloc[-1])
+    result: Dict[str, Any] = {
+        "as_of": as_of,
+        "close": close,
+        "history_start": df["date"].iloc[0],
+        "percentiles": list(BAND_PERCENTILES),
+        "multiples": {},
+    }
+
+    fields = [field for field in MULTIPLES if field in df.columns]
+    if fields:
+        stats = percentile_bands(df[fields].to_numpy(dtype=np.float64).T)
+        for i, field in enumerate(fields):
+            current = stats["current"][i]
+            result["multiples"][field] = {
+                "current": _round(current),
+                "rank": _round(stats["rank"][i], 1),
+                "samples": int(stats["samples"][i]),
+                "bands": [_round(value) for value in stats["bands"][i]],
+                # 当前收盘价按各分位倍数折算的价格（基本面数据不变的假设下）
+                "implied_prices": [_round(close * value / current) for value in stats["bands"][i]]
+                if not np.isnan(current) else None,
+            }
+
+    pe = result["multiples"].get("peTTM", {}).get("current")
+    if pe:
+        eps = close / pe
+        result["dcf"] = {
+            "base_eps": round(eps, 4),
+            "terminal_growth": TERMINAL_GROWTH,
+            "years": FORECAST_YEARS,
+            "discount_rates": list(discount_rates),
+            "growth_rates": list(growth_rates),
+            "values": _grid(dcf_grid(eps, discount_rates, growth_rates)),
+        }
+
+    events = dividend_events(prefetched.get("dividends"))
+    if prefetched.get("dividends"):
+        trailing = trailing_dividend(events, as_of)
+        result["dividend"] = {
+            "ttm_per_share": round(trailing["per_share"], 4),
+            "yield_pct": round(trailing["per_share"] / close * 100, 2),
+            "ex_dates": trailing["events"],
+            "history": [{"date": date, "cash": round(float(cash), 4)}
+                        for date, cash in zip(events["date"], events["cash"])],
+        }
+        if trailing["per_share"] > 0:
+            result["ddm"] = {
+                "base_dividend": round(trailing["per_share"], 4),
+                "discount_rates": list(discount_rates),
+                "growth_rates": list(dividend_growth_rates),
+                "values": _grid(ddm_grid(trailing["per_share"], discount_rates, dividend_growth_rates)),
+            }
+    return result
+
+
+def _format_grid(title: str, grid: Dict[str, Any], close: float) -> List[str]:
+    lines = [title,
+             "| 折现率 \\ 增长率 | " + " | ".join(f"{g:.1%}" for g in grid["growth_rates"]) + " |",
+             "|" + "---|" * (len(grid["growth_rates"]) + 1)]
+    for r, row in zip(grid["discount_rates"], grid["values"]):
+        cells = ["-" if value is None else f"{value:.2f}" for value in row]
+        lines.append(f"| {r:.1%} | " + " | ".join(cells) + " |")
+    center = grid["values"][len(grid["values"]) // 2][len(grid["growth_rates"]) // 2]
+    if center is not None:
+        lines.append(f"中间情景每股价值 {center:.2f}，相对现价 {(center / close - 1) * 100:+.1f}%")
+    return lines
+
+
+def format_valuation(result: Dict[str, Any]) -> str:
+    """把analyze_valuation的结果整理为提示词中的文本"""
+    close = result["close"]
+    lines = [f"估值日期：{result['as_of']}，收盘价（不复权）：{close:.2f}，历史区间自 {result['history_start']}", ""]
+
+    if result["multiples"]:
+        headers = " | ".join(f"P{p}" for p in result["percentiles"])
+        lines += ["历史估值分位带：",
+                  f"| 指标 | 当前值 | 历史分位 | {headers} |",
+                  "|" + "---|" * (len(result["percentiles"]) + 3)]
+        for field, stats in result["multiples"].items():
+            if stats["current"] is None:
+                lines.append(f"| {MULTIPLES[field]} | 为负或缺失，不适用 | - | "
+                             + " | ".join("-" if v is None else f"{v:.2f}" for v in stats["bands"]) + " |")
+                continue
+            bands = " | ".join("-" if v is None else f"{v:.2f}" for v in stats["bands"])
+            lines.append(f"| {MULTIPLES[field]} | {stats['current']:.2f} | {stats['rank']:.1f}% | {bands} |")
+        pe = result["multiples"].get("peTTM")
+        if pe and pe["implied_prices"]:
+            prices = "、".join(f"P{p} {'-' if v is None else f'{v:.2f}'}"
+                              for p, v in zip(result["percentiles"], pe["implied_prices"]))
+            lines.append(f"按PE分位折算的股价：{prices}")
+        lines.append("")
+
+    if "dcf" in result:
+        dcf = result["dcf"]
+        lines += _format_grid(
+            f"DCF每股价值（基期每股收益 {dcf['base_eps']:.4f}，预测期 {dcf['years']} 年，"
+            f"永续增长率 {dcf['terminal_growth']:.1%}）：", dcf, close)
+        lines.append("")
+
+    if "dividend" in result:
+        dividend = result["dividend"]
+        if dividend["ttm_per_share"] > 0:
+            lines.append(f"近12个月每股现金分红（税前）{dividend['ttm_per_share']:.4f}，"
+                         f"股息率 {dividend['yield_pct']:.2f}%（除息日：{'、'.join(dividend['ex_dates'])}）")
+        else:
+            lines.append("近12个月没有现金分红")
+        if "ddm" in result:
+            lines += _format_grid(
+                f"DDM每股价值（基期股息 {result['ddm']['base_dividend']:.4f}）：", result["ddm"], close)
+    return "\n".join(lines).rstrip()
+
+
+def valuation_section(prefetched: Dict[str, Any], valuation: Optional[pd.DataFrame] = None) -> str:
+    """
+    从预取的数据计算估值结果，生成放入提示词的文本
+
+    Args:
+        valuation: 从K线存储读取的估值指标（可选）
+
+    Returns:
+        str: 估值文本；没有可解析的估值数据时返回空字符串
+    """
+    result = analyze_valuation(prefetched or {}, valuation=valuation)
+    return format_valuation(result) if result else ""
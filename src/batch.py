@@ -0,0 +1,173 @@
+"""
+批量分析 - 一次运行分析整个自选股列表
+工作流只编译一次，MCP会话池、LLM客户端和限流器在所有股票之间共享，
+同时进行的分析数由信号量限制（--concurrency 或 BATCH_CONCURRENCY），
+吞吐量由服务商的速率限制决定，而不是逐只串行。每只股票各自生成报告，
+批次结束后写入清单文件，记录每只股票的耗时、报告路径和失败原因。
+每只股票使用独立的执行日志记录器，日志写在批次日志目录的stocks/下。
+所有股票分析完成后，用各自预取的日K线做一次向量化的关键位和趋势扫描，结果写入清单。
+"""
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from src.utils.logging_config import setup_logger, SUCCESS_ICON, ERROR_ICON, WAIT_ICON
+from src.utils.execution_logger import (ExecutionLogger, get_execution_logger,
+                                        execution_logger_context)
+from src.workflow import run_analysis
+from src.analytics.levels import scan_klines
+
+logger = setup_logger(__name__)
+
+# 默认同时进行的分析数
+DEFAULT_BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MANIFEST_DIR = os.path.join(project_root, "reports")
+
+
+def load_watchlist(path: str) -> List[str]:
+    """
+    读取自选股列表文件
+
+    每行一条查询（股票代码或"分析XXX"等自然语言），忽略空行和#开头的注释行，
+    重复的查询只保留第一次出现。
+
+    Args:
+        path: 列表文件路径
+
+    Returns:
+        List[str]: 查询列表
+    """
+    queries = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            query = line.strip()
+            if not query or query.startswith("#") or query in seen:
+                continue
+            seen.add(query)
+            queries.append(query)
+    return queries
+
+
+async def _analyze_one(app, query: str, index: int, total: int,
+                       semaphore: asyncio.Semaphore, log_dir: str,
+                       klines: Dict[int, str]) -> Dict[str, Any]:
+    """
+    在信号量限制下分析一只股票，返回清单中的一条记录（异常不会向外传播）
+
+    预取到的日K线放入klines（按序号），供批次结束后的统一扫描使用。
+    """
+    async with semaphore:
+        entry = {"index": index, "query": query,
+                 "started_at": datetime.now().isoformat()}
+        start_time = time.time()
+        stock_logger = ExecutionLogger(log_dir)
+        entry["execution_id"] = stock_logger.execution_id
+        entry["log_dir"] = str(stock_logger.execution_dir)
+        with execution_logger_context(stock_logger):
+            stock_logger.log_agent_start("main", {"user_query": query, "batch_index": index})
+            try:
+                final_state = await run_analysis(app, query, thread_id=stock_logger.execution_id)
+                data = (final_state or {}).get("data", {})
+                klines[index] = (data.get("prefetched") or {}).get("kline")
+                error = data.get("summary_error")
+                if not error and "final_report" not in data:
+                    error = "No final report in workflow output"
+                entry.update({
+                    "status": "failed" if error else "success",
+                    "stock_code": data.get("stock_code"),
+                    "company_name": data.get("company_name"),
+                    "report_path": data.get("report_path"),
+                    "error": error,
+                    # 单个分析师失败时总结仍会生成，记录下来便于排查
+                    "agent_errors": {key: value for key, value in data.items()
+                                     if key.endswith("_error") and key != "summary_error" and value},
+                })
+                if data.get("final_report") and data.get("report_path"):
+                    stock_logger.log_final_report(data["final_report"], data["report_path"])
+            except Exception as e:
+                logger.error(f"{ERROR_ICON} Batch analysis failed for '{query}': {e}", exc_info=True)
+                entry.update({"status": "failed", "error": str(e)})
+            stock_logger.finalize_execution(success=entry["status"] == "success",
+                                            error=entry.get("error"))
+        entry["duration_seconds"] = round(time.time() - start_time, 3)
+        entry["token_usage"] = stock_logger.token_usage["run"]
+
+    icon = SUCCESS_ICON if entry["status"] == "success" else ERROR_ICON
+    print(f"{icon} [{index + 1}/{total}] {query} ({entry['duration_seconds']:.1f}s)")
+    return entry
+
+
+async def run_batch(app, queries: List[str], concurrency: Optional[int] = None,
+                    manifest_dir: Optional[str] = None,
+                    log_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    并发分析多只股票并写入批次清单
+
+    Args:
+        app: build_workflow()编译好的工作流
+        queries: 查询列表
+        concurrency: 同时进行的分析数，默认为BATCH_CONCURRENCY
+        manifest_dir: 清单文件目录，默认为reports/
+        log_dir: 每只股票执行日志的上级目录，默认为当前执行日志目录下的stocks/
+
+    Returns:
+        Dict[str, Any]: 批次清单（包含manifest_path）
+    """
+    concurrency = max(1, concurrency or DEFAULT_BATCH_CONCURRENCY)
+    batch_logger = get_execution_logger()
+    log_dir = log_dir or str(batch_logger.execution_dir / "stocks")
+    semaphore = asyncio.Semaphore(concurrency)
+    started_at = datetime.now()
+    start_time = time.time()
+
+    logger.info(
+        f"{WAIT_ICON} Starting batch analysis of {len(queries)} queries (concurrency {concurrency})")
+    klines: Dict[int, str] = {}
+    entries = await asyncio.gather(*[
+        _analyze_one(app, query, i, len(queries), semaphore, log_dir, klines)
+        for i, query in enumerate(queries)])
+    # 整个自选股列表一次向量化扫描，不逐只计算
+    for entry, scan in zip(entries, scan_klines([klines.get(i) for i in range(len(entries))])):
+        entry["technical_scan"] = scan
+
+    wall_time = time.time() - start_time
+    succeeded = sum(1 for entry in entries if entry["status"] == "success")
+    durations = [entry["duration_seconds"] for entry in entries]
+    costs = [entry["token_usage"]["cost"] for entry in entries
+             if entry["token_usage"]["cost"] is not None]
+    manifest = {
+        "started_at": started_at.isoformat(),
+        "finished_at": datetime.now().isoformat(),
+        "concurrency": concurrency,
+        "total": len(entries),
+        "succeeded": succeeded,
+        "failed": len(entries) - succeeded,
+        "wall_time_seconds": round(wall_time, 3),
+        # 串行执行所需时间与实际耗时之比
+        "speedup": round(sum(durations) / wall_time, 2) if wall_time > 0 else None,
+        "total_tokens": sum(entry["token_usage"]["total_tokens"] for entry in entries),
+        "cost": sum(costs) if costs else None,
+        "stocks": entries,
+    }
+
+    manifest_dir = manifest_dir or DEFAULT_MANIFEST_DIR
+    os.makedirs(manifest_dir, exist_ok=True)
+    manifest_path = os.path.join(
+        manifest_dir, f"batch_manifest_{started_at.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    manifest["manifest_path"] = manifest_path
+
+    batch_logger.log_component_stats("batch", {
+        key: manifest[key] for key in ("concurrency", "total", "succeeded", "failed",
+                                       "wall_time_seconds", "speedup", "total_tokens", "cost")})
+    logger.info(
+        f"{SUCCESS_ICON} Batch finished: {succeeded}/{len(entries)} succeeded in {wall_time:.1f}s, "
+        f"manifest saved to {manifest_path}")
+    return manifest
@@ -1,18 +1,24 @@
 from src.utils.logging_config import setup_logger, SUCCESS_ICON, ERROR_ICON, WAIT_ICON
 from src.utils.state_definition import AgentState
-from src.utils.execution_logger import initialize_execution_logger, finalize_execution_logger, get_execution_logger
-from src.agents.summary_agent import summary_agent
+from src.utils.execution_logger import initialize_execution_logger, finalize_execution_logger
+from src.agents.summary_agent import summary_agent, set_summary_streaming
 from src.agents.value_agent import value_agent
 from src.agents.technical_agent import technical_agent
 from src.agents.fundamental_agent import fundamental_agent
-from langgraph.graph import StateGraph, END
+from src.agents.prefetch_agent import prefetch_agent
+from src.tools.mcp_client import close_mcp_client_sessions, warmup_mcp_tools
+from src.utils.llm_registry import close_llm_registry
+from src.utils.llm_cache import set_llm_cache_bypass
+from src.utils.incremental import set_incremental_mode
+from src.workflow import build_workflow, build_initial_state, failed_nodes, resume_analysis, stream_analysis
+from src.utils.progress import ConsoleProgress
+from src.utils.checkpointing import get_checkpointer
+from src.batch import load_watchlist, run_batch
 from dotenv import load_dotenv
 import argparse
 import asyncio
 import os
 import sys
-import re
-from datetime import datetime
 
 
 logger = setup_logger(__name__)
@@ -45,41 +51,11 @@ async def main():
     execution_logger = initialize_execution_logger()
     logger.info(
         f"{SUCCESS_ICON} 执行日志系统已初始化，日志目录: {execution_logger.execution_dir}")
+    thread_id = None
+    checkpointer = None
 
     try:
-        # 1. Define the LangGraph workflow (Step 15)
-        workflow = StateGraph(AgentState)
-
-        # Add a simple pass-through node to act as a clear starting point for parallel branches
-        workflow.add_node("start_node", lambda state: state)
-
-        # Add agent nodes
-        workflow.add_node("fundamental_analyst", fundamental_agent)
-        workflow.add_node("technical_analyst", technical_agent)
-        workflow.add_node("value_analyst", value_agent)
-        workflow.add_node("summarizer", summary_agent)
-
-        # Set the entry point
-        workflow.set_entry_point("start_node")
-
-        # Edges for parallel execution of fundamental, technical, and value agents
-        workflow.add_edge("start_node", "fundamental_analyst")
-        workflow.add_edge("start_node", "technical_analyst")
-        workflow.add_edge("start_node", "value_analyst")
-
-        # Edges to converge the outputs into the summary agent
-        # LangGraph will ensure "summarizer" waits for all its direct predecessors.
-        workflow.add_edge("fundamental_analyst", "summarizer")
-        workflow.add_edge("technical_analyst", "summarizer")
-        workflow.add_edge("value_analyst", "summarizer")
-
-        # Edge from the summary agent to the end of the workflow
-        workflow.add_edge("summarizer", END)
-
-        # Compile the workflow
-        app = workflow.compile()
-
-        # 2. Implement the command-line interface (Step 16)
+        # 1. Implement the command-line interface (Step 16)
         parser = argparse.ArgumentParser(description="Financial Agent CLI")
         parser.add_argument(
             "--command",
@@ -87,12 +63,81 @@ async def main():
             required=False,  # 改为非必需
             help="The user query for financial analysis (e.g., '分析嘉友国际')"
         )
+        parser.add_argument(
+            "--no-llm-cache",
+            action="store_true",
+            help="Bypass the LLM response cache for this run (fresh responses still refresh the cache)"
+        )
+        parser.add_argument(
+            "--stream",
+            action="store_true",
+            help="Stream the final report to the terminal and report file while it is generated"
+        )
+        parser.add_argument(
+            "--batch",
+            type=str,
+            metavar="FILE",
+            help="Analyze every query in FILE (one stock per line) concurrently and write a batch manifest"
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=None,
+            help="Maximum number of stocks analyzed at the same time in batch mode (default: BATCH_CONCURRENCY or 4)"
+        )
+        parser.add_argument(
+            "--resume",
+            type=str,
+            metavar="EXECUTION_ID",
+            help="Resume a failed or interrupted run from its checkpoint, re-running only the nodes that did not complete"
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Reuse stored analyst results whose input data has not changed since the last run"
+        )
         args = parser.parse_args()
 
+        # 2. Define the LangGraph workflow (Step 15)
+        # 带检查点编译：每个节点的输出按执行ID持久化，失败后可以用 --resume 恢复；
+        # 批量模式不支持 --resume，不保存检查点
+        checkpointer = None if args.batch else get_checkpointer()
+        app = build_workflow(checkpointer=checkpointer)
+
+        set_llm_cache_bypass(args.no_llm_cache)
+        if args.incremental:
+            set_incremental_mode(True)
+        # 检查点的thread_id：新运行使用本次执行ID，恢复时沿用原来的执行ID
+        thread_id = args.resume or execution_logger.execution_id
+        # 批量模式下多份报告同时生成，不做流式输出
+        if args.stream and not args.batch:
+            set_summary_streaming(True)
+
+        if args.batch:
+            queries = load_watchlist(args.batch)
+            execution_logger.log_agent_start(
+                "main", {"batch_file": args.batch, "queries": queries})
+            print(f"\n{WAIT_ICON} 批量分析 {len(queries)} 只股票: {args.batch}")
+
+            # 所有股票共用同一个MCP会话池和已加载的工具
+            await warmup_mcp_tools()
+            manifest = await run_batch(app, queries, concurrency=args.concurrency)
+
+            print(f"\n{SUCCESS_ICON} 批量分析完成: 成功 {manifest['succeeded']}/{manifest['total']}，"
+                  f"耗时 {manifest['wall_time_seconds']:.1f}s")
+            for entry in manifest["stocks"]:
+                if entry["status"] != "success":
+                    print(f"{ERROR_ICON} {entry['query']}: {entry['error']}")
+            print(f"{SUCCESS_ICON} 批次清单已保存到: {manifest['manifest_path']}")
+
+            finalize_execution_logger(success=manifest["failed"] == 0)
+            print(f"{SUCCESS_ICON} 执行日志已保存到: {execution_logger.execution_dir}")
+            return
+
         # 如果未提供command参数，则提示用户输入查询
         if args.command:
             user_query = args.command
-        else:
+        elif not args.resume:
             # 显示ASCII艺术开屏图像
             print("\n")
             print(
@@ -163,101 +208,45 @@ async def main():
                 print(f"{ERROR_ICON} 输入不能为空，请重新输入！")
                 user_query = input("请输入您的分析需求: ")
 
-        # 记录用户查询
-        execution_logger.log_agent_start("main", {"user_query": user_query})
-
-        # 从查询中提取股票代码和公司名称
-        stock_code = None
-        company_name = None
-
-        # 简单的提取逻辑 - 假设查询格式为"分析[公司名称]"或包含股票代码
-        if "分析" in user_query:
-            # 尝试提取公司名称
-            parts = user_query.split("分析")
-            if len(parts) > 1 and parts[1].strip():
-                company_name = parts[1].strip()
-
-                # 如果公司名称包含股票代码（如括号内的数字），则提取
-                code_match = re.search(r'[（(](\d{6})[)）]', company_name)
-                if code_match:
-                    stock_code = code_match.group(1)
-                    # 从公司名称中移除股票代码部分
-                    company_name = re.sub(
-                        r'[（(]\d{6}[)）]', '', company_name).strip()
-
-        # 如果未提取到股票代码但查询中包含6位数字，则可能是股票代码
-        if not stock_code:
-            code_match = re.search(r'\b(\d{6})\b', user_query)
-            if code_match:
-                stock_code = code_match.group(1)
-
-        # 记录提取结果
-        logger.info(f"从查询中提取 - 公司名称: {company_name}, 股票代码: {stock_code}")
-
-        # 获取当前时间信息
-        current_datetime = datetime.now()
-        current_date_cn = current_datetime.strftime("%Y年%m月%d日")
-        current_date_en = current_datetime.strftime("%Y-%m-%d")
-        current_weekday_cn = ["星期一", "星期二", "星期三", "星期四",
-                              "星期五", "星期六", "星期日"][current_datetime.weekday()]
-        current_time = current_datetime.strftime("%H:%M:%S")
-
-        # 格式化完整的时间信息
-        current_time_info = f"{current_date_cn} ({current_date_en}) {current_weekday_cn} {current_time}"
-
-        logger.info(f"当前时间: {current_time_info}")
-
-        # 准备初始状态
-        initial_data = {
-            "query": user_query,
-            "current_date": current_date_en,
-            "current_date_cn": current_date_cn,
-            "current_time": current_time,
-            "current_weekday_cn": current_weekday_cn,
-            "current_time_info": current_time_info,
-            "analysis_timestamp": current_datetime.isoformat()
-        }
-        if company_name:
-            initial_data["company_name"] = company_name
-        if stock_code:
-            # 添加股票代码前缀（上交所或深交所）
-            if stock_code.startswith('6'):
-                initial_data["stock_code"] = f"sh.{stock_code}"
-            elif stock_code.startswith('0') or stock_code.startswith('3'):
-                initial_data["stock_code"] = f"sz.{stock_code}"
-            else:
-                initial_data["stock_code"] = stock_code
-
-        # Prepare the initial state for the workflow
-        initial_state = AgentState(
-            messages=[],  # Langchain convention
-            data=initial_data,  # Application-specific data with extracted info
-            metadata={}  # For any other run-specific info
-        )
+        if args.resume:
+            # 从检查点恢复：已完成的节点直接使用保存的结果，只重新运行失败或未完成的节点
+            execution_logger.log_agent_start("main", {"resume_execution_id": args.resume})
+            print(f"\n{WAIT_ICON} 正在从检查点恢复执行 {args.resume}...")
+            await warmup_mcp_tools()
+            final_state = await resume_analysis(app, thread_id, on_event=ConsoleProgress())
+        else:
+            # 记录用户查询
+            execution_logger.log_agent_start("main", {"user_query": user_query})
+
+            initial_state = build_initial_state(user_query)
+            company_name = initial_state["data"].get("company_name")
+            stock_code = initial_state["data"].get("stock_code")
 
-        print(f"\n{WAIT_ICON} 正在开始对 '{user_query}' 进行金融分析...")
-        if company_name:
-            print(f"{WAIT_ICON} 分析公司: {company_name}")
-        if stock_code:
-            print(f"{WAIT_ICON} 股票代码: {stock_code}")
-        logger.info(
-            f"Starting financial analysis workflow for query: '{user_query}'")
-
-        # 显示分析阶段提示
-        print(f"\n{WAIT_ICON} 正在执行基本面分析...")
-        print(f"{WAIT_ICON} 正在执行技术面分析...")
-        print(f"{WAIT_ICON} 正在执行估值分析...")
-        print(f"{WAIT_ICON} 这可能需要几分钟时间，请耐心等待...\n")
-
-        # Invoke the workflow. This is a blocking call.
-        final_state = await app.ainvoke(initial_state)
+            print(f"\n{WAIT_ICON} 正在开始对 '{user_query}' 进行金融分析...")
+            if company_name:
+                print(f"{WAIT_ICON} 分析公司: {company_name}")
+            if stock_code:
+                print(f"{WAIT_ICON} 股票代码: {stock_code}")
+            logger.info(
+                f"Starting financial analysis workflow for query: '{user_query}'")
+
+            print(f"{WAIT_ICON} 这可能需要几分钟时间，各节点的进度会实时显示\n")
+
+            # 在进入工作流之前完成MCP会话池的冷启动，各分析师直接复用已加载的工具
+            await warmup_mcp_tools()
+
+            # 通过astream_events驱动工作流，节点开始/结束和工具调用实时打印到终端
+            final_state = await stream_analysis(
+                app, initial_state, {"configurable": {"thread_id": thread_id}}, ConsoleProgress())
         print(f"{SUCCESS_ICON} 分析完成！")
         logger.info("Workflow execution completed successfully")
 
         # Extract and print the final report
         if final_state and final_state.get("data") and "final_report" in final_state["data"]:
-            print("\n--- 最终分析报告 (Final Analysis Report) ---\n")
-            print(final_state["data"]["final_report"])
+            # 流式模式下报告已在生成过程中输出到终端
+            if not (args.stream and not final_state["data"].get("summary_error")):
+                print("\n--- 最终分析报告 (Final Analysis Report) ---\n")
+                print(final_state["data"]["final_report"])
 
             # Display the report file path if available
             if "report_path" in final_state["data"]:
@@ -271,6 +260,11 @@ async def main():
                     final_state["data"]["final_report"],
                     final_state["data"]["report_path"]
                 )
+            if final_state["data"].get("summary_error") and checkpointer:
+                print(f"{WAIT_ICON} 报告生成失败，可使用 --resume {thread_id} 只重新运行总结")
+            elif checkpointer and not failed_nodes(final_state["data"]):
+                # 所有节点都已成功，不再需要恢复，删除本次执行的检查点
+                checkpointer.delete_thread(thread_id)
         else:
             print(f"\n{ERROR_ICON} 错误: 无法从工作流中检索最终报告。")
             logger.error(
@@ -287,7 +281,15 @@ async def main():
 
         # 记录错误并完成执行日志
         finalize_execution_logger(success=False, error=str(e))
-        print(f"{ERROR_ICON} 错误日志已保存到: {get_execution_logger().execution_dir}")
+        print(f"{ERROR_ICON} 错误日志已保存到: {execution_logger.execution_dir}")
+        if thread_id and checkpointer:
+            print(f"{WAIT_ICON} 可使用 --resume {thread_id} 从检查点恢复，已完成的节点不会重新运行")
+
+    finally:
+        # 关闭常驻的MCP会话，终止服务器子进程
+        await close_mcp_client_sessions()
+        # 关闭共享的LLM HTTP连接池
+        await close_llm_registry()
 
 
 async def test_chain_agents():
@@ -304,6 +306,15 @@ async def test_chain_agents():
         metadata={}
     )
 
+    # Prefetch the standard data bundle
+    print(f"{WAIT_ICON} Running data prefetch...")
+    prefetch_result = await prefetch_agent(initial_state)
+    initial_state = AgentState(
+        messages=[],
+        data={**initial_state.get("data", {}), **prefetch_result.get("data", {})},
+        metadata={}
+    )
+
     # Execute fundamental agent
     print(f"{WAIT_ICON} Running fundamental agent...")
     fund_result = await fundamental_agent(initial_state)
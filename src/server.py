@@ -0,0 +1,363 @@
+"""
+HTTP服务模式 - 常驻进程中复用编译好的工作流、MCP会话池和LLM客户端
+命令行每次分析都要重新启动Python、加载langchain/langgraph、拉起MCP子进程并解析.env，
+分析开始前就要花掉好几秒。服务模式只在启动时做一次这些工作，之后通过HTTP接口提交分析：
+
+    POST   /analyses               提交分析 {"query": "分析贵州茅台"}，返回任务ID
+    GET    /analyses               任务列表
+    GET    /analyses/{id}          查询任务状态和结果
+    GET    /analyses/{id}/stream   以server-sent events推送任务事件直到结束
+    DELETE /analyses/{id}          取消任务
+    GET    /health                 健康检查
+
+每个任务使用独立的执行日志记录器（通过contextvars绑定），并发的分析互不干扰。
+运行中的任务通过stream接口实时推送progress事件（节点开始/结束、工具调用、token流），
+token事件只推送给当前的订阅者，不计入补发给后来订阅者的历史事件。
+启动方式：python -m src.server --host 127.0.0.1 --port 8080
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+from src.utils.logging_config import setup_logger, SUCCESS_ICON, ERROR_ICON, WAIT_ICON
+from src.utils.execution_logger import (ExecutionLogger, bind_execution_logger,
+                                        unbind_execution_logger)
+from src.tools.mcp_client import close_mcp_client_sessions, warmup_mcp_tools, get_mcp_init_stats
+from src.utils.llm_registry import close_llm_registry
+from src.workflow import build_workflow, run_analysis
+
+load_dotenv(override=True)
+
+logger = setup_logger(__name__)
+
+# 同时执行的分析数上限，超出的任务排队等待
+SERVER_MAX_CONCURRENCY = int(os.getenv("SERVER_MAX_CONCURRENCY", "4"))
+
+# 内存中保留的任务数上限，超出时丢弃最早结束的任务
+SERVER_MAX_JOBS = int(os.getenv("SERVER_MAX_JOBS", "1000"))
+
+# 任务的执行日志目录
+SERVER_LOG_DIR = os.getenv("SERVER_LOG_DIR", "logs")
+
+# 任务结束状态
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+class AnalysisJob:
+    """一次分析任务：状态、结果和推送给订阅者的事件"""
+
+    def __init__(self, query: str):
+        self.id = uuid.uuid4().hex
+        self.query = query
+        self.status = "queued"
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.duration_seconds: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.log_dir: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self.events: List[Dict[str, Any]] = []
+        self._subscribers: List[asyncio.Queue] = []
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def publish(self, event: str, data: Dict[str, Any], record: bool = True):
+        """推送事件给所有订阅者，record为True时同时记入历史供后来的订阅者补发"""
+        message = {"event": event, "data": data}
+        if record:
+            self.events.append(message)
+        for queue in self._subscribers:
+            queue.put_nowait(message)
+
+    def subscribe(self) -> asyncio.Queue:
+        """订阅事件：先补发已有事件，再接收新事件"""
+        queue = asyncio.Queue()
+        for message in self.events:
+            queue.put_nowait(message)
+        self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        if queue in self._subscribers:
+            self._subscribers.remove(queue)
+
+    def publish_progress(self, progress: Dict[str, Any]):
+        """工作流进度事件回调（见workflow.stream_analysis）"""
+        self.publish("progress", progress, record=progress["type"] != "token")
+
+    def set_status(self, status: str, **data):
+        self.status = status
+        self.publish("status", {"status": status, **data})
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        info = {
+            "id": self.id,
+            "query": self.query,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_seconds": self.duration_seconds,
+            "error": self.error,
+            "log_dir": self.log_dir,
+        }
+        if include_result:
+            info["result"] = self.result
+        return info
+
+
+class AnalysisService:
+    """持有编译好的工作流，按并发上限执行分析任务"""
+
+    def __init__(self, workflow=None, max_concurrency: int = SERVER_MAX_CONCURRENCY,
+                 log_dir: str = SERVER_LOG_DIR, max_jobs: int = SERVER_MAX_JOBS):
+        self.workflow = workflow
+        self.max_concurrency = max(1, max_concurrency)
+        self.log_dir = log_dir
+        self.max_jobs = max_jobs
+        self.jobs: Dict[str, AnalysisJob] = {}
+        self.started_at = time.time()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def submit(self, query: str) -> AnalysisJob:
+        """创建任务并在后台开始执行"""
+        if self.workflow is None:
+            self.workflow = build_workflow()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        job = AnalysisJob(query)
+        self.jobs[job.id] = job
+        self._evict_finished_jobs()
+        job.publish("status", {"status": job.status})
+        job.task = asyncio.create_task(self._run(job), name=f"analysis-{job.id}")
+        return job
+
+    async def _run(self, job: AnalysisJob):
+        async with self._semaphore:
+            if job.done:
+                return
+            execution_logger = ExecutionLogger(self.log_dir)
+            # 任务内启动的工作流节点继承这里的上下文，日志写入本任务自己的目录
+            token = bind_execution_logger(execution_logger)
+            job.log_dir = str(execution_logger.execution_dir)
+            job.started_at = datetime.now().isoformat()
+            start_time = time.time()
+            job.set_status("running", log_dir=job.log_dir)
+            logger.info(f"{WAIT_ICON} Job {job.id}: analyzing '{job.query}'")
+            try:
+                execution_logger.log_agent_start("main", {"user_query": job.query, "job_id": job.id})
+                final_state = await run_analysis(self.workflow, job.query,
+                                                 on_event=job.publish_progress)
+                data = (final_state or {}).get("data", {})
+                job.result = {
+                    "final_report": data.get("final_report"),
+                    "report_path": data.get("report_path"),
+                    "stock_code": data.get("stock_code"),
+                    "company_name": data.get("company_name"),
+                    "errors": {key: value for key, value in data.items()
+                               if key.endswith("_error") and value},
+                }
+                if data.get("final_report") and data.get("report_path"):
+                    execution_logger.log_final_report(data["final_report"], data["report_path"])
+                job.error = data.get("summary_error")
+                if not job.error and not data.get("final_report"):
+                    job.error = "No final report in workflow output"
+                execution_logger.finalize_execution(success=job.error is None, error=job.error)
+                job.status = "failed" if job.error else "completed"
+            except asyncio.CancelledError:
+                job.error = "Cancelled by request"
+                execution_logger.finalize_execution(success=False, error=job.error)
+                job.status = "cancelled"
+                raise
+            except Exception as e:
+                logger.error(f"{ERROR_ICON} Job {job.id} failed: {e}", exc_info=True)
+                job.error = str(e)
+                execution_logger.finalize_execution(success=False, error=job.error)
+                job.status = "failed"
+            finally:
+                unbind_execution_logger(token)
+                job.finished_at = datetime.now().isoformat()
+                job.duration_seconds = round(time.time() - start_time, 3)
+                job.publish("result" if job.status == "completed" else "status", job.to_dict())
+                icon = SUCCESS_ICON if job.status == "completed" else ERROR_ICON
+                logger.info(f"{icon} Job {job.id} {job.status} in {job.duration_seconds:.1f}s")
+
+    def cancel(self, job: AnalysisJob) -> bool:
+        """取消排队中或执行中的任务，已结束的任务返回False"""
+        if job.done:
+            return False
+        if job.status == "queued":
+            # 还没拿到执行名额，直接标记取消，_run拿到名额后立即返回
+            job.error = "Cancelled by request"
+            job.finished_at = datetime.now().isoformat()
+            job.status = "cancelled"
+            job.publish("status", job.to_dict())
+        if job.task is not None:
+            job.task.cancel()
+        return True
+
+    def _evict_finished_jobs(self):
+        if len(self.jobs) <= self.max_jobs:
+            return
+        finished = sorted((job for job in self.jobs.values() if job.done),
+                          key=lambda job: job.finished_at or "")
+        for job in finished[:len(self.jobs) - self.max_jobs]:
+            del self.jobs[job.id]
+
+    def health(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "status": "ok",
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "max_concurrency": self.max_concurrency,
+            "jobs": counts,
+            "mcp": get_mcp_init_stats(),
+        }
+
+    async def shutdown(self):
+        """取消所有未结束的任务"""
+        tasks = [job.task for job in self.jobs.values() if job.task and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+SERVICE_KEY = web.AppKey("analysis_service", AnalysisService)
+
+
+def _get_job(request: web.Request) -> AnalysisJob:
+    job = request.app[SERVICE_KEY].jobs.get(request.match_info["job_id"])
+    if job is None:
+        raise web.HTTPNotFound(text=json.dumps({"error": "job not found"}),
+                               content_type="application/json")
+    return job
+
+
+async def handle_submit(request: web.Request) -> web.Response:
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        body = None
+    query = body.get("query", "").strip() if isinstance(body, dict) else ""
+    if not query:
+        return web.json_response({"error": "'query' is required"}, status=400)
+
+    job = request.app[SERVICE_KEY].submit(query)
+    return web.json_response({
+        "id": job.id,
+        "status": job.status,
+        "links": {
+            "self": f"/analyses/{job.id}",
+            "stream": f"/analyses/{job.id}/stream",
+        },
+    }, status=202)
+
+
+async def handle_list(request: web.Request) -> web.Response:
+    jobs = request.app[SERVICE_KEY].jobs.values()
+    return web.json_response({"jobs": [job.to_dict(include_result=False) for job in jobs]})
+
+
+async def handle_get(request: web.Request) -> web.Response:
+    return web.json_response(_get_job(request).to_dict())
+
+
+async def handle_stream(request: web.Request) -> web.StreamResponse:
+    job = _get_job(request)
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+    })
+    await response.prepare(request)
+
+    queue = job.subscribe()
+    try:
+        while True:
+            message = await queue.get()
+            payload = json.dumps(message["data"], ensure_ascii=False)
+            await response.write(f"event: {message['event']}\ndata: {payload}\n\n".encode("utf-8"))
+            if job.done and queue.empty():
+                break
+    finally:
+        job.unsubscribe(queue)
+    await response.write_eof()
+    return response
+
+
+async def handle_cancel(request: web.Request) -> web.Response:
+    job = _get_job(request)
+    if not request.app[SERVICE_KEY].cancel(job):
+        return web.json_response({"id": job.id, "status": job.status,
+                                  "error": "job already finished"}, status=409)
+    return web.json_response({"id": job.id, "status": "cancelling"}, status=202)
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    return web.json_response(request.app[SERVICE_KEY].health())
+
+
+def create_app(workflow=None, warmup: bool = True, **service_options) -> web.Application:
+    """
+    创建aiohttp应用
+
+    Args:
+        workflow: 编译好的工作流，默认在启动时调用build_workflow()
+        warmup: 启动时是否预热MCP会话池（测试中可以关闭）
+        **service_options: 传给AnalysisService的参数（max_concurrency、log_dir等）
+    """
+    app = web.Application()
+    service = AnalysisService(workflow=workflow, **service_options)
+    app[SERVICE_KEY] = service
+
+    async def on_startup(app: web.Application):
+        if service.workflow is None:
+            service.workflow = build_workflow()
+        if warmup:
+            await warmup_mcp_tools()
+        logger.info(f"{SUCCESS_ICON} Analysis service ready (max concurrency {service.max_concurrency})")
+
+    async def on_cleanup(app: web.Application):
+        await service.shutdown()
+        if warmup:
+            await close_mcp_client_sessions()
+            await close_llm_registry()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_post("/analyses", handle_submit)
+    app.router.add_get("/analyses", handle_list)
+    app.router.add_get("/analyses/{job_id}", handle_get)
+    app.router.add_get("/analyses/{job_id}/stream", handle_stream)
+    app.router.add_delete("/analyses/{job_id}", handle_cancel)
+    app.router.add_get("/health", handle_health)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Financial Agent HTTP service")
+    parser.add_argument("--host", type=str, default=os.getenv("SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "8080")))
+    parser.add_argument("--concurrency", type=int, default=SERVER_MAX_CONCURRENCY,
+                        help="Maximum number of analyses running at the same time")
+    args = parser.parse_args()
+
+    web.run_app(create_app(max_concurrency=args.concurrency), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
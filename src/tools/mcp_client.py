@@ -1,15 +1,64 @@
-from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_core.tools import StructuredTool, ToolException
+from mcp.types import TextContent
 from src.utils.logging_config import setup_logger, SUCCESS_ICON, ERROR_ICON, WAIT_ICON
-from src.tools.mcp_config import SERVER_CONFIGS
+from src.tools.mcp_config import (
+    SERVER_CONFIGS, MCP_SERVER_NAME, MCP_POOL_SIZE, MCP_SESSION_START_TIMEOUT,
+    DEFAULT_MCP_TOOL_CACHE_DIR, MCP_TOOLS_REFRESH_INTERVAL)
+from src.tools.mcp_session_pool import MCPSessionPool
+from src.tools.tool_cache import ToolResultCache, TradingCalendar, describe_call
+from src.tools.single_flight import SingleFlight
+from src.utils.execution_logger import get_execution_logger
 import asyncio  # Required for async operations like get_tools
 import json
+import os
+import time
+from typing import Optional
 
 logger = setup_logger(__name__)
 
-# Global client instance, initialized when tools are first requested.
-_mcp_client_instance = None
+# Global session pool, started when tools are first requested.
+_session_pool = None
 _mcp_tools = None
 
+# Initialization is serialized so concurrent callers share one pool.
+_init_lock = None
+_init_lock_loop = None
+_init_waiters = 0
+_refresh_task = None
+_init_stats = {
+    "init_seconds": None,
+    "max_concurrent_waiters": 0,
+    "initialized_at": None,
+    "tool_count": 0,
+    "refreshes": 0,
+}
+
+# Cache of tool results shared by all analysts, keyed on tool name + args.
+# Created on first use (see get_tool_cache).
+_tool_cache = None
+
+# In-flight request table: concurrent identical calls share one round-trip.
+_single_flight = SingleFlight()
+
+
+def get_tool_cache() -> Optional[ToolResultCache]:
+    """
+    获取全局工具结果缓存，首次使用时创建；MCP_TOOL_CACHE_ENABLED=false时返回None
+
+    内存LRU容量由MCP_TOOL_CACHE_MAX_ENTRIES配置（默认1024），
+    磁盘缓存目录由MCP_TOOL_CACHE_DIR配置，默认为cache/mcp_tools
+    """
+    global _tool_cache
+    if os.getenv("MCP_TOOL_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    if _tool_cache is None:
+        _tool_cache = ToolResultCache(
+            max_entries=int(os.getenv("MCP_TOOL_CACHE_MAX_ENTRIES", "1024")),
+            cache_dir=os.getenv("MCP_TOOL_CACHE_DIR", DEFAULT_MCP_TOOL_CACHE_DIR),
+            calendar=TradingCalendar.from_env(),
+        )
+    return _tool_cache
+
 
 def print_tool_details(tools):
     """打印工具的详细信息，用于调试"""
@@ -39,40 +88,163 @@ def print_tool_details(tools):
         logger.info("     " + "-" * 50)
 
 
+def _call_tool_result_to_text(call_tool_result):
+    """将MCP的CallToolResult转换为工具输出文本，工具报错时抛出ToolException"""
+    texts = [content.text for content in call_tool_result.content
+             if isinstance(content, TextContent)]
+    text = "\n".join(texts)
+    if call_tool_result.isError:
+        raise ToolException(text)
+    return text
+
+
+async def call_mcp_tool(tool_name, tool_args):
+    """
+    调用MCP工具并返回文本结果：先查结果缓存；未命中时，如果相同的调用
+    正在进行中则等待其结果，否则通过会话池发起调用。
+
+    Args:
+        tool_name: 工具名称
+        tool_args: 工具参数字典
+
+    Returns:
+        str: 工具返回的文本内容
+    """
+    execution_logger = get_execution_logger()
+    tool_cache = get_tool_cache()
+    if tool_cache is not None:
+        cached = tool_cache.get(tool_name, tool_args)
+        execution_logger.record_cache_access(
+            "mcp_tool_cache", cached is not None)
+        if cached is not None:
+            logger.info(f"{SUCCESS_ICON} Tool cache hit: {tool_name}")
+            return cached
+
+    call_key = describe_call(tool_name, tool_args)
+    shared = _single_flight.in_flight(call_key)
+    execution_logger.record_cache_access(
+        "mcp_single_flight", shared, key=call_key)
+    if shared:
+        logger.info(
+            f"{SUCCESS_ICON} Joining in-flight call instead of issuing a duplicate: {call_key}")
+
+    return await _single_flight.do(
+        call_key, lambda: _fetch_tool_result(tool_name, tool_args))
+
+
+async def _fetch_tool_result(tool_name, tool_args):
+    """通过会话池实际调用MCP工具，并把成功的结果写入缓存"""
+    if _session_pool is None or not _session_pool.started:
+        await get_mcp_tools()
+    if _session_pool is None:
+        raise RuntimeError("MCP session pool is not available")
+
+    call_tool_result = await _session_pool.call_tool(tool_name, tool_args or {})
+    text = _call_tool_result_to_text(call_tool_result)
+
+    # 服务器以文本形式返回的错误信息不写入缓存
+    tool_cache = get_tool_cache()
+    if tool_cache is not None and not text.lstrip().startswith("Error"):
+        tool_cache.set(tool_name, tool_args, text)
+    return text
+
+
+def _to_langchain_tool(mcp_tool):
+    """把MCP工具定义包装为LangChain工具，实际调用经由会话池完成"""
+    tool_name = mcp_tool.name
+
+    async def call_tool(**arguments):
+        return await call_mcp_tool(tool_name, arguments)
+
+    return StructuredTool(
+        name=tool_name,
+        description=mcp_tool.description or "",
+        args_schema=mcp_tool.inputSchema,
+        coroutine=call_tool,
+    )
+
+
+def _get_init_lock():
+    """返回绑定到当前事件循环的初始化锁（测试或多次asyncio.run时事件循环会变化）"""
+    global _init_lock, _init_lock_loop
+    loop = asyncio.get_running_loop()
+    if _init_lock is None or _init_lock_loop is not loop:
+        _init_lock = asyncio.Lock()
+        _init_lock_loop = loop
+    return _init_lock
+
+
+def get_mcp_init_stats():
+    """返回MCP初始化统计：冷启动耗时、最大并发等待者数量、工具数量、刷新次数"""
+    return dict(_init_stats)
+
+
 async def get_mcp_tools():
     """
-    Initializes the MultiServerMCPClient with the defined server configurations
-    and fetches the available tools from the a-share-mcp-v2 server.
+    Starts the MCP session pool (a configurable number of long-lived
+    a-share-mcp-v2 server processes) and fetches the available tools.
+
+    The returned tools route every call through the pool, so the stdio
+    subprocess and MCP handshake are paid once per process instead of once
+    per tool call. Initialization is guarded by a lock: when several
+    analysts ask for tools at the same time, exactly one pool is created
+    and the others wait for it.
 
     Returns:
         list: A list of LangChain-compatible tools loaded from the MCP server.
               Returns an empty list if initialization or tool loading fails.
     """
-    global _mcp_client_instance, _mcp_tools
+    global _init_waiters
 
     if _mcp_tools is not None:
         logger.info(f"{SUCCESS_ICON} Returning cached MCP tools.")
         return _mcp_tools
 
+    _init_waiters += 1
+    _init_stats["max_concurrent_waiters"] = max(
+        _init_stats["max_concurrent_waiters"], _init_waiters)
+    try:
+        async with _get_init_lock():
+            if _mcp_tools is not None:
+                logger.info(
+                    f"{SUCCESS_ICON} MCP tools initialized by a concurrent caller.")
+                return _mcp_tools
+            return await _initialize_mcp_tools()
+    finally:
+        _init_waiters -= 1
+
+
+async def _initialize_mcp_tools():
+    """启动会话池并加载工具，只能在持有初始化锁时调用"""
+    global _session_pool, _mcp_tools
+
+    init_start_time = time.time()
     logger.info(
-        f"{WAIT_ICON} Initializing MultiServerMCPClient with config: {SERVER_CONFIGS}")
+        f"{WAIT_ICON} Initializing MCP session pool (size={MCP_POOL_SIZE}) with config: {SERVER_CONFIGS}")
     try:
-        _mcp_client_instance = MultiServerMCPClient(SERVER_CONFIGS)
+        _session_pool = MCPSessionPool(
+            SERVER_CONFIGS,
+            MCP_SERVER_NAME,
+            size=MCP_POOL_SIZE,
+            start_timeout=MCP_SESSION_START_TIMEOUT,
+        )
+        await _session_pool.start()
 
         logger.info(
-            f"{WAIT_ICON} Fetching tools from MCP server 'a_share_mcp_v2'...")
-        # The get_tools() method is asynchronous.
-        loaded_tools = await _mcp_client_instance.get_tools()
+            f"{WAIT_ICON} Fetching tools from MCP server '{MCP_SERVER_NAME}'...")
+        mcp_tool_definitions = await _session_pool.list_tools()
+        loaded_tools = [_to_langchain_tool(tool)
+                        for tool in mcp_tool_definitions]
 
         if not loaded_tools:
             logger.warning(
-                f"{ERROR_ICON} No tools loaded from MCP server 'a_share_mcp_v2'. Check server logs and configuration.")
+                f"{ERROR_ICON} No tools loaded from MCP server '{MCP_SERVER_NAME}'. Check server logs and configuration.")
             _mcp_tools = []  # Cache empty list on failure to load
             return []
 
         _mcp_tools = loaded_tools
         logger.info(
-            f"{SUCCESS_ICON} Successfully loaded {len(_mcp_tools)} tools from 'a_share_mcp_v2'.")
+            f"{SUCCESS_ICON} Successfully loaded {len(_mcp_tools)} tools from '{MCP_SERVER_NAME}'.")
 
         # 打印工具名称列表
         tool_names = [tool.name for tool in _mcp_tools]
@@ -86,9 +258,74 @@ async def get_mcp_tools():
     except Exception as e:
         logger.error(
             f"{ERROR_ICON} Failed to initialize MCP client or load tools: {e}", exc_info=True)
+        if _session_pool is not None:
+            await _session_pool.close()
+            _session_pool = None
         _mcp_tools = []  # Cache empty list on failure
         return []
 
+    finally:
+        init_seconds = time.time() - init_start_time
+        _init_stats.update({
+            "init_seconds": init_seconds,
+            "initialized_at": time.time(),
+            "tool_count": len(_mcp_tools or []),
+        })
+        logger.info(
+            f"{SUCCESS_ICON} MCP cold start took {init_seconds:.2f}s "
+            f"(concurrent waiters: {_init_stats['max_concurrent_waiters']}).")
+        get_execution_logger().log_component_stats("mcp_init", get_mcp_init_stats())
+
+
+async def warmup_mcp_tools(refresh_interval=None):
+    """
+    在进程启动时显式预热：启动会话池并加载工具，可选地开启工具列表的后台刷新。
+
+    Args:
+        refresh_interval: 后台刷新工具列表的间隔（秒）；None表示使用
+            MCP_TOOLS_REFRESH_INTERVAL配置，0表示不刷新
+
+    Returns:
+        list: 加载的工具列表
+    """
+    tools = await get_mcp_tools()
+    if refresh_interval is None:
+        refresh_interval = MCP_TOOLS_REFRESH_INTERVAL
+    if tools and refresh_interval > 0:
+        start_tool_refresh(refresh_interval)
+    return tools
+
+
+def start_tool_refresh(interval):
+    """启动后台任务，按固定间隔重新拉取工具列表（服务器升级新增工具时无需重启进程）"""
+    global _refresh_task
+    if _refresh_task is not None and not _refresh_task.done():
+        return _refresh_task
+    _refresh_task = asyncio.create_task(
+        _refresh_tools_periodically(interval), name="mcp-tools-refresh")
+    return _refresh_task
+
+
+async def _refresh_tools_periodically(interval):
+    global _mcp_tools
+    while True:
+        await asyncio.sleep(interval)
+        if _session_pool is None or not _session_pool.started:
+            continue
+        try:
+            mcp_tool_definitions = await _session_pool.list_tools()
+            new_names = sorted(tool.name for tool in mcp_tool_definitions)
+            old_names = sorted(tool.name for tool in _mcp_tools or [])
+            _init_stats["refreshes"] += 1
+            if mcp_tool_definitions and new_names != old_names:
+                _mcp_tools = [_to_langchain_tool(tool)
+                              for tool in mcp_tool_definitions]
+                _init_stats["tool_count"] = len(_mcp_tools)
+                logger.info(
+                    f"{SUCCESS_ICON} MCP tool list refreshed: {len(_mcp_tools)} tools.")
+        except Exception as e:
+            logger.warning(f"{ERROR_ICON} Failed to refresh MCP tools: {e}")
+
 
 async def test_tool_call(tool_name, tool_args):
     """
@@ -132,21 +369,24 @@ async def test_tool_call(tool_name, tool_args):
 
 async def close_mcp_client_sessions():
     """
-    Closes any open sessions managed by the MultiServerMCPClient.
-    This should be called on application shutdown if necessary.
+    Closes the pooled MCP sessions and terminates their server processes.
+    This should be called on application shutdown.
     """
-    global _mcp_client_instance
-    if _mcp_client_instance:
+    global _session_pool, _mcp_tools, _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        _refresh_task = None
+    if _session_pool:
         logger.info(f"{WAIT_ICON} Closing MCP client sessions...")
         try:
-            logger.info(
-                f"{SUCCESS_ICON} MCP client sessions (if any were persistently open) assumed closed or managed by library.")
-            _mcp_client_instance = None  # Allow re-initialization
-            global _mcp_tools
-            _mcp_tools = None
+            await _session_pool.close()
+            logger.info(f"{SUCCESS_ICON} MCP client sessions closed.")
         except Exception as e:
             logger.error(
                 f"{ERROR_ICON} Error during MCP client session cleanup: {e}", exc_info=True)
+        finally:
+            _session_pool = None  # Allow re-initialization
+            _mcp_tools = None
     else:
         logger.info("MCP client was not initialized, no sessions to close.")
 
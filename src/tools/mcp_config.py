@@ -1,10 +1,14 @@
 """
 MCP服务器配置模块 - 包含连接A股MCP服务器的配置信息
 """
+import os
+
+# A股MCP服务器在SERVER_CONFIGS中的名称
+MCP_SERVER_NAME = "a_share_mcp_v2"
 
 # 服务器配置，用于初始化MCP客户端
 SERVER_CONFIGS = {
-    "a_share_mcp_v2": {  # 重命名以提高清晰度，原名为 "a-share-mcp-v2"
+    MCP_SERVER_NAME: {  # 重命名以提高清晰度，原名为 "a-share-mcp-v2"
         "command": "uv",  # 假设'uv'在PATH中或使用完整路径
         "args": [
             "run",  # uv run命令
@@ -16,3 +20,17 @@ SERVER_CONFIGS = {
         "transport": "stdio",
     }
 }
+
+# 会话池配置：常驻的MCP服务器进程数量，默认与并行的分析师数量一致
+MCP_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", "3"))
+
+# 单个会话启动（拉起进程并完成握手）的超时时间，单位秒
+MCP_SESSION_START_TIMEOUT = float(os.getenv("MCP_SESSION_START_TIMEOUT", "60"))
+
+# 工具结果缓存的默认磁盘目录；是否启用（MCP_TOOL_CACHE_ENABLED）、内存LRU容量
+# （MCP_TOOL_CACHE_MAX_ENTRIES）和目录（MCP_TOOL_CACHE_DIR）在首次使用缓存时读取环境变量
+DEFAULT_MCP_TOOL_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))), "cache", "mcp_tools")
+
+# 工具列表后台刷新间隔（秒），0表示不刷新
+MCP_TOOLS_REFRESH_INTERVAL = float(os.getenv("MCP_TOOLS_REFRESH_INTERVAL", "0"))
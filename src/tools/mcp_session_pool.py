@@ -0,0 +1,270 @@
+"""
+MCP会话池 - 维护常驻的MCP服务器进程及其会话
+启动时一次性拉起若干个stdio服务器进程并完成握手，之后工具调用从池中借用会话，
+避免每次调用都重新启动子进程；进程崩溃时自动重启对应会话。
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+import anyio
+import mcp.types
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from mcp.shared.exceptions import McpError
+
+from src.utils.logging_config import setup_logger, SUCCESS_ICON, ERROR_ICON, WAIT_ICON
+
+logger = setup_logger(__name__)
+
+# 连接关闭的JSON-RPC错误码；锁定的mcp版本（1.9）的mcp.types中还没有这个常量
+CONNECTION_CLOSED = getattr(mcp.types, "CONNECTION_CLOSED", -32000)
+
+# 这些异常说明底层子进程或传输通道已经失效，需要重启会话
+_TRANSPORT_ERRORS = (
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+    anyio.EndOfStream,
+    ConnectionError,
+    EOFError,
+)
+
+
+def is_transport_error(error: BaseException) -> bool:
+    """判断异常是否由MCP传输层失效（进程退出、管道断开等）引起"""
+    if isinstance(error, _TRANSPORT_ERRORS):
+        return True
+    if isinstance(error, McpError):
+        return getattr(error.error, "code", None) == CONNECTION_CLOSED
+    return False
+
+
+class _SessionSlot:
+    """
+    池中的单个常驻会话
+
+    会话的上下文管理器必须在同一个任务中进入和退出（anyio的cancel scope要求），
+    因此每个会话运行在独立的后台任务里，直到收到停止信号。
+    """
+
+    def __init__(self, client: MultiServerMCPClient, server_name: str, index: int):
+        self.client = client
+        self.server_name = server_name
+        self.index = index
+        self.session = None
+        self.restarts = 0
+        self._task: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Event] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._error: Optional[BaseException] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def start(self, timeout: float):
+        """启动服务器进程并等待MCP握手完成"""
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._error = None
+        self._task = asyncio.create_task(
+            self._run(), name=f"mcp-session-{self.server_name}-{self.index}")
+
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            await self.stop()
+            raise TimeoutError(
+                f"MCP session {self.server_name}#{self.index} did not start within {timeout}s")
+
+        if self.session is None:
+            raise RuntimeError(
+                f"MCP session {self.server_name}#{self.index} failed to start: {self._error}") from self._error
+
+    async def _run(self):
+        try:
+            async with self.client.session(self.server_name) as session:
+                self.session = session
+                self._ready.set()
+                await self._stop.wait()
+        except Exception as e:
+            self._error = e
+            logger.error(
+                f"{ERROR_ICON} MCP session {self.server_name}#{self.index} terminated: {e}")
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def stop(self, timeout: float = 10.0):
+        """通知会话任务退出并等待子进程关闭"""
+        if self._task is None:
+            return
+        self._stop.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        except Exception:
+            pass
+        self._task = None
+        self.session = None
+
+
+class MCPSessionPool:
+    """
+    常驻MCP会话池
+
+    并行运行的分析师从池中借用会话执行工具调用；池大小决定同时存活的服务器进程数量。
+    """
+
+    def __init__(self, server_configs: Dict[str, Any], server_name: str, size: int = 3,
+                 start_timeout: float = 60.0, client: Optional[MultiServerMCPClient] = None):
+        """
+        初始化会话池
+
+        Args:
+            server_configs: MultiServerMCPClient使用的服务器配置
+            server_name: 要连接的服务器名称
+            size: 常驻会话（服务器进程）数量
+            start_timeout: 单个会话启动和握手的超时时间（秒）
+            client: 可选的客户端实例，默认根据server_configs创建
+        """
+        self.server_name = server_name
+        self.size = max(1, int(size))
+        self.start_timeout = start_timeout
+        self.client = client or MultiServerMCPClient(server_configs)
+        self._slots = [_SessionSlot(self.client, server_name, i)
+                       for i in range(self.size)]
+        self._idle: Optional[asyncio.Queue] = None
+        self._started = False
+        self._closed = False
+        self.stats = {
+            "calls": 0,
+            "restarts": 0,
+            "failed_calls": 0,
+            "acquire_wait_seconds": 0.0,
+        }
+
+    @property
+    def started(self) -> bool:
+        return self._started and not self._closed
+
+    async def start(self):
+        """并发启动所有会话；部分失败时以可用会话继续，全部失败则抛出异常"""
+        if self._started:
+            return
+
+        logger.info(
+            f"{WAIT_ICON} Starting {self.size} MCP session(s) for '{self.server_name}'...")
+        start_time = time.time()
+        results = await asyncio.gather(
+            *(slot.start(self.start_timeout) for slot in self._slots),
+            return_exceptions=True)
+
+        failures = [r for r in results if isinstance(r, BaseException)]
+        if len(failures) == len(self._slots):
+            await self.close()
+            raise RuntimeError(
+                f"All MCP sessions for '{self.server_name}' failed to start: {failures[0]}") from failures[0]
+
+        for failure in failures:
+            logger.warning(
+                f"{ERROR_ICON} MCP session failed to start, will retry on demand: {failure}")
+
+        # 启动失败的会话同样放入队列，借出时会被重新拉起
+        self._idle = asyncio.Queue()
+        for slot in self._slots:
+            self._idle.put_nowait(slot)
+        self._started = True
+        self._closed = False
+
+        logger.info(
+            f"{SUCCESS_ICON} MCP session pool ready: {self.size - len(failures)}/{self.size} "
+            f"session(s) in {time.time() - start_time:.2f}s")
+
+    async def _restart(self, slot: _SessionSlot):
+        logger.warning(
+            f"{WAIT_ICON} Restarting MCP session {self.server_name}#{slot.index}...")
+        await slot.stop()
+        slot.restarts += 1
+        self.stats["restarts"] += 1
+        await slot.start(self.start_timeout)
+        logger.info(
+            f"{SUCCESS_ICON} MCP session {self.server_name}#{slot.index} restarted.")
+
+    @asynccontextmanager
+    async def acquire(self):
+        """
+        从池中借出一个会话，使用完毕后自动归还
+
+        如果会话已失效（进程退出等）会先重启；调用过程中出现传输层错误时，
+        归还前同样会重启该会话。
+        """
+        if not self.started:
+            raise RuntimeError("MCP session pool is not started")
+
+        wait_start = time.time()
+        slot = await self._idle.get()
+        self.stats["acquire_wait_seconds"] += time.time() - wait_start
+        try:
+            if not slot.alive:
+                await self._restart(slot)
+            yield slot.session
+        except BaseException as e:
+            if is_transport_error(e) and not self._closed:
+                try:
+                    await self._restart(slot)
+                except Exception as restart_error:
+                    logger.error(
+                        f"{ERROR_ICON} Failed to restart MCP session {self.server_name}#{slot.index}: {restart_error}")
+            raise
+        finally:
+            self._idle.put_nowait(slot)
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any]):
+        """
+        使用池中的会话调用MCP工具
+
+        遇到传输层错误时会在重启后的会话上重试一次。
+
+        Returns:
+            mcp.types.CallToolResult
+        """
+        self.stats["calls"] += 1
+        for attempt in range(2):
+            try:
+                async with self.acquire() as session:
+                    return await session.call_tool(name, arguments)
+            except Exception as e:
+                if attempt == 0 and is_transport_error(e) and not self._closed:
+                    logger.warning(
+                        f"{WAIT_ICON} MCP transport error on '{name}', retrying on a fresh session: {e}")
+                    continue
+                self.stats["failed_calls"] += 1
+                raise
+
+    async def list_tools(self) -> List[Any]:
+        """列出服务器提供的全部工具定义（mcp.types.Tool）"""
+        tools = []
+        cursor = None
+        async with self.acquire() as session:
+            while True:
+                result = await session.list_tools(cursor=cursor)
+                tools.extend(result.tools or [])
+                cursor = getattr(result, "nextCursor", None)
+                if not cursor:
+                    break
+        return tools
+
+    async def close(self):
+        """关闭所有会话并终止对应的服务器进程"""
+        self._closed = True
+        await asyncio.gather(*(slot.stop() for slot in self._slots),
+                             return_exceptions=True)
+        self._started = False
+        logger.info(
+            f"{SUCCESS_ICON} MCP session pool for '{self.server_name}' closed. Stats: {self.stats}")
@@ -1,11 +1,10 @@
 import os
-import time
 from google import genai
 from dotenv import load_dotenv
 from dataclasses import dataclass
-import backoff
 from src.utils.logging_config import setup_logger, SUCCESS_ICON, ERROR_ICON, WAIT_ICON
 from src.utils.llm_clients import LLMClientFactory
+from src.utils.retry_policy import get_llm_retry_policy
 
 # 设置日志记录
 logger = setup_logger('api_calls')
@@ -54,15 +53,8 @@ client = genai.Client(api_key=api_key)
 logger.info(f"{SUCCESS_ICON} Gemini 客户端初始化成功")
 
 
-@backoff.on_exception(
-    backoff.expo,
-    (Exception),
-    max_tries=5,
-    max_time=300,
-    giveup=lambda e: "AFC is enabled" not in str(e)
-)
-def generate_content_with_retry(model, contents, config=None):
-    """带重试机制的内容生成函数"""
+def generate_content(model, contents, config=None):
+    """单次内容生成调用，重试由RetryPolicy负责"""
     try:
         logger.info(f"{WAIT_ICON} 正在调用 Gemini API...")
         logger.debug(f"请求内容: {contents}")
@@ -85,13 +77,17 @@ def generate_content_with_retry(model, contents, config=None):
             logger.error(f"详细错误: {error_msg}")
         elif "AFC is enabled" in error_msg:
             logger.warning(f"{ERROR_ICON} 触发 API 限制，等待重试... 错误: {error_msg}")
-            time.sleep(5)
         else:
             logger.error(f"{ERROR_ICON} API 调用失败: {error_msg}")
         raise e
 
 
-def get_chat_completion(messages, model=None, max_retries=3, initial_retry_delay=1,
+def generate_content_with_retry(model, contents, config=None):
+    """按共享的LLM重试策略调用generate_content"""
+    return get_llm_retry_policy().call(generate_content, model, contents, config)
+
+
+def get_chat_completion(messages, model=None, max_retries=None, initial_retry_delay=None,
                         client_type="auto", api_key=None, base_url=None):
     """
     获取聊天完成结果，包含重试逻辑
@@ -99,8 +95,8 @@ def get_chat_completion(messages, model=None, max_retries=3, initial_retry_delay
     Args:
         messages: 消息列表，OpenAI 格式
         model: 模型名称（可选）
-        max_retries: 最大重试次数
-        initial_retry_delay: 初始重试延迟（秒）
+        max_retries: 最多尝试次数（可选，默认使用共享重试策略的配置）
+        initial_retry_delay: 初始重试延迟（秒，可选，默认使用共享重试策略的配置）
         client_type: 客户端类型 ("auto", "gemini", "openai_compatible")
         api_key: API 密钥（可选，仅用于 OpenAI Compatible API）
         base_url: API 基础 URL（可选，仅用于 OpenAI Compatible API）
@@ -124,31 +120,68 @@ def get_chat_completion(messages, model=None, max_retries=3, initial_retry_delay
             initial_retry_delay=initial_retry_delay
         )
 
-        # 检查响应格式，处理不同类型的返回值
-        if isinstance(response, dict):
-            # OpenAI 兼容 API 可能返回字典格式
-            if 'choices' in response and len(response['choices']) > 0:
-                if 'message' in response['choices'][0] and 'content' in response['choices'][0]['message']:
-                    return response['choices'][0]['message']['content']
-                elif 'text' in response['choices'][0]:
-                    return response['choices'][0]['text']
-
-        # 如果是字符串，直接返回
-        if isinstance(response, str):
-            return response
-
-        # 其他类型的响应，尝试提取文本
-        logger.warning(f"{WAIT_ICON} 未知响应格式，尝试提取文本: {type(response)}")
-        if hasattr(response, 'text'):
-            return response.text
-        elif hasattr(response, 'content'):
-            return response.content
-        elif hasattr(response, 'message') and hasattr(response.message, 'content'):
-            return response.message.content
-
-        # 无法处理的响应格式
-        logger.error(f"{ERROR_ICON} 无法从响应中提取文本: {response}")
-        return str(response)
+        return _response_to_text(response)
     except Exception as e:
         logger.error(f"{ERROR_ICON} get_chat_completion 发生错误: {str(e)}")
         return None
+
+
+async def aget_chat_completion(messages, model=None, max_retries=None, initial_retry_delay=None,
+                               client_type="auto", api_key=None, base_url=None):
+    """
+    get_chat_completion 的异步版本，在事件循环中调用时不会阻塞其他任务
+
+    参数与返回值同 get_chat_completion
+    """
+    try:
+        # 创建客户端
+        client = LLMClientFactory.create_client(
+            client_type=client_type,
+            api_key=api_key,
+            base_url=base_url,
+            model=model
+        )
+
+        # 获取回答
+        response = await client.aget_completion(
+            messages=messages,
+            max_retries=max_retries,
+            initial_retry_delay=initial_retry_delay
+        )
+
+        return _response_to_text(response)
+    except Exception as e:
+        logger.error(f"{ERROR_ICON} aget_chat_completion 发生错误: {str(e)}")
+        return None
+
+
+def _response_to_text(response):
+    """从客户端返回值中提取文本"""
+    if response is None:
+        return None
+
+    # 检查响应格式，处理不同类型的返回值
+    if isinstance(response, dict):
+        # OpenAI 兼容 API 可能返回字典格式
+        if 'choices' in response and len(response['choices']) > 0:
+            if 'message' in response['choices'][0] and 'content' in response['choices'][0]['message']:
+                return response['choices'][0]['message']['content']
+            elif 'text' in response['choices'][0]:
+                return response['choices'][0]['text']
+
+    # 如果是字符串，直接返回
+    if isinstance(response, str):
+        return response
+
+    # 其他类型的响应，尝试提取文本
+    logger.warning(f"{WAIT_ICON} 未知响应格式，尝试提取文本: {type(response)}")
+    if hasattr(response, 'text'):
+        return response.text
+    elif hasattr(response, 'content'):
+        return response.content
+    elif hasattr(response, 'message') and hasattr(response.message, 'content'):
+        return response.message.content
+
+    # 无法处理的响应格式
+    logger.error(f"{ERROR_ICON} 无法从响应中提取文本: {response}")
+    return str(response)
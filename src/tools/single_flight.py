@@ -0,0 +1,54 @@
+"""
+单飞（single-flight）请求合并 - 相同的并发工具调用只执行一次
+并行的分析师分支经常在几毫秒内请求同一份数据（例如同一只股票的基本信息），
+进行中的请求表让后到的调用者等待同一个底层调用的结果，而不是重复发起MCP请求。
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """进行中的请求表，按键合并并发调用"""
+
+    def __init__(self):
+        self._inflight: Dict[str, Dict[str, Any]] = {}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行func，如果相同key的调用正在进行则等待其结果
+
+        底层调用运行在独立任务中：某个等待者被取消不会影响其他等待者，
+        只有当所有等待者都取消后才会取消底层调用。
+
+        Args:
+            key: 请求键（相同键的调用被视为同一请求）
+            func: 无参数的协程函数
+
+        Returns:
+            底层调用的结果（异常同样共享给所有等待者）
+        """
+        flight = self._inflight.get(key)
+        if flight is None:
+            task = asyncio.ensure_future(func())
+            flight = {"task": task, "waiters": 0}
+            self._inflight[key] = flight
+            task.add_done_callback(lambda t: self._finish(key, t))
+
+        flight["waiters"] += 1
+        try:
+            return await asyncio.shield(flight["task"])
+        except asyncio.CancelledError:
+            flight["waiters"] -= 1
+            if flight["waiters"] <= 0 and not flight["task"].done():
+                flight["task"].cancel()
+            raise
+
+    def _finish(self, key: str, task: asyncio.Future):
+        if self._inflight.get(key, {}).get("task") is task:
+            del self._inflight[key]
+        # 取出异常，避免所有等待者都已取消时出现"exception was never retrieved"警告
+        if not task.cancelled():
+            task.exception()
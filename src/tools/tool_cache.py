@@ -0,0 +1,311 @@
+"""
+MCP工具结果缓存 - 内存LRU + 磁盘两级缓存
+按工具名称和规范化后的参数作为键，过期时间根据数据类型和A股交易日历确定：
+盘中行情几分钟过期，日线数据在下一个交易日收盘数据就绪后过期，
+季度财务数据在下一个财报披露期开始时过期。
+"""
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from src.utils.logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# A股使用北京时间，无夏令时
+CHINA_TZ = timezone(timedelta(hours=8))
+
+# 收盘后数据源（如baostock）通常在17:30前后完成当日数据更新
+DAILY_DATA_READY_TIME = dt_time(17, 30)
+
+# 盘中行情类数据的缓存时间（秒）
+INTRADAY_TTL_SECONDS = 5 * 60
+
+# 无法识别类型的工具结果的缓存时间（秒）
+DEFAULT_TTL_SECONDS = 10 * 60
+
+# 财报披露窗口（起始月日, 结束月日）：年报/一季报、半年报、三季报
+REPORTING_WINDOWS = [((1, 1), (4, 30)), ((7, 1), (8, 31)), ((10, 1), (10, 31))]
+
+# 按数据类型划分的工具名称
+INTRADAY_TOOLS = {"get_realtime_quotes", "get_intraday_data"}
+DAILY_TOOLS = {
+    "get_historical_k_data", "get_adjust_factor_data", "get_stock_basic_info",
+    "get_stock_industry", "get_trade_dates", "get_all_stock",
+    "get_latest_trading_date", "get_market_analysis_timeframe",
+    "get_sz50_stocks", "get_hs300_stocks", "get_zz500_stocks", "get_stock_analysis",
+}
+QUARTERLY_TOOLS = {
+    "get_profit_data", "get_operation_data", "get_growth_data", "get_balance_data",
+    "get_cash_flow_data", "get_dupont_data", "get_performance_express_report",
+    "get_forecast_report", "get_dividend_data",
+}
+
+# 分钟级K线按盘中数据处理
+INTRADAY_FREQUENCIES = {"5", "15", "30", "60"}
+
+
+class TradingCalendar:
+    """简化的A股交易日历：周一至周五为交易日，可额外配置节假日"""
+
+    def __init__(self, holidays: Optional[Iterable[str]] = None):
+        self.holidays = set()
+        for holiday in holidays or []:
+            holiday = holiday.strip()
+            if holiday:
+                self.holidays.add(date.fromisoformat(holiday))
+
+    @classmethod
+    def from_env(cls) -> "TradingCalendar":
+        """从TRADING_HOLIDAYS环境变量（逗号分隔的YYYY-MM-DD）加载节假日"""
+        return cls(os.getenv("TRADING_HOLIDAYS", "").split(","))
+
+    def is_trading_day(self, day: date) -> bool:
+        return day.weekday() < 5 and day not in self.holidays
+
+    def next_trading_day(self, day: date) -> date:
+        """返回day之后（不含当天）的第一个交易日"""
+        day += timedelta(days=1)
+        while not self.is_trading_day(day):
+            day += timedelta(days=1)
+        return day
+
+    def next_daily_data_ready(self, now: datetime) -> datetime:
+        """下一次日线数据就绪的时间点"""
+        today = now.date()
+        if self.is_trading_day(today) and now.time() < DAILY_DATA_READY_TIME:
+            ready_day = today
+        else:
+            ready_day = self.next_trading_day(today)
+        return datetime.combine(ready_day, DAILY_DATA_READY_TIME, tzinfo=CHINA_TZ)
+
+
+def _next_reporting_window_start(now: datetime) -> Optional[datetime]:
+    """如果当前处于披露窗口内返回None，否则返回下一个披露窗口的开始时间"""
+    today = now.date()
+    starts = []
+    for year in (today.year, today.year + 1):
+        for (start_month, start_day), (end_month, end_day) in REPORTING_WINDOWS:
+            start = date(year, start_month, start_day)
+            end = date(year, end_month, end_day)
+            if start <= today <= end:
+                return None
+            if start > today:
+                starts.append(start)
+    return datetime.combine(min(starts), dt_time(0, 0), tzinfo=CHINA_TZ)
+
+
+def compute_expiry(tool_name: str, tool_args: Dict[str, Any], now: Optional[datetime] = None,
+                   calendar: Optional[TradingCalendar] = None) -> float:
+    """
+    根据工具的数据类型计算缓存过期时间
+
+    Args:
+        tool_name: 工具名称
+        tool_args: 工具参数
+        now: 当前时间（默认为北京时间的当前时刻）
+        calendar: 交易日历
+
+    Returns:
+        float: 过期时间的Unix时间戳
+    """
+    now = now or datetime.now(CHINA_TZ)
+    calendar = calendar or TradingCalendar()
+    frequency = str((tool_args or {}).get("frequency", "d")).lower()
+
+    if tool_name in INTRADAY_TOOLS or (
+            tool_name == "get_historical_k_data" and frequency in INTRADAY_FREQUENCIES):
+        return now.timestamp() + INTRADAY_TTL_SECONDS
+
+    if tool_name in QUARTERLY_TOOLS:
+        window_start = _next_reporting_window_start(now)
+        if window_start is not None:
+            return window_start.timestamp()
+        # 披露期内每天都可能有新报告，按日线数据处理
+        return calendar.next_daily_data_ready(now).timestamp()
+
+    if tool_name in DAILY_TOOLS:
+        return calendar.next_daily_data_ready(now).timestamp()
+
+    return now.timestamp() + DEFAULT_TTL_SECONDS
+
+
+def _normalize_value(key: Optional[str], value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _normalize_value(k, v) for k, v in sorted(value.items()) if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_normalize_value(None, v) for v in value]
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, str):
+        value = value.strip()
+        return value.lower() if key == "code" else value
+    return value
+
+
+def normalize_args(tool_args: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """规范化工具参数：排序键、去掉None、统一数字与字符串、股票代码小写"""
+    return _normalize_value(None, tool_args or {})
+
+
+def describe_call(tool_name: str, tool_args: Optional[Dict[str, Any]]) -> str:
+    """工具调用的可读标识：工具名称 + 规范化参数，如 get_stock_basic_info({"code": "sh.600000"})"""
+    payload = json.dumps(normalize_args(tool_args),
+                         ensure_ascii=False, sort_keys=True)
+    return f"{tool_name}({payload})"
+
+
+def make_cache_key(tool_name: str, tool_args: Optional[Dict[str, Any]]) -> str:
+    """生成缓存键：工具名称 + 规范化参数的哈希"""
+    digest = hashlib.sha256(
+        describe_call(tool_name, tool_args).encode("utf-8")).hexdigest()
+    return f"{tool_name}_{digest[:32]}"
+
+
+class ToolResultCache:
+    """MCP工具结果的两级缓存（内存LRU + 磁盘）"""
+
+    def __init__(self, max_entries: int = 1024, cache_dir: Optional[str] = None,
+                 max_disk_entries: Optional[int] = None,
+                 calendar: Optional[TradingCalendar] = None):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 内存中最多保留的条目数，超出后按LRU淘汰
+            cache_dir: 磁盘缓存目录，为None时只使用内存缓存
+            max_disk_entries: 磁盘上最多保留的条目数，默认为max_entries的4倍
+            calendar: 计算过期时间使用的交易日历
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.max_disk_entries = max_disk_entries or self.max_entries * 4
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.calendar = calendar or TradingCalendar()
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # 磁盘条目的LRU索引，首次访问磁盘时扫描一次目录，之后随读写维护
+        self._disk_index: "Optional[OrderedDict[str, None]]" = None
+        self.stats = {"hits": 0, "memory_hits": 0,
+                      "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def get(self, tool_name: str, tool_args: Optional[Dict[str, Any]]) -> Optional[str]:
+        """读取未过期的缓存结果，未命中返回None"""
+        key = make_cache_key(tool_name, tool_args)
+        now = time.time()
+
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry["expires_at"] > now:
+                self._memory.move_to_end(key)
+                self.stats["hits"] += 1
+                self.stats["memory_hits"] += 1
+                return entry["value"]
+            del self._memory[key]
+
+        entry = self._read_disk(key)
+        if entry is not None:
+            if entry["expires_at"] > now:
+                self._remember(key, entry)
+                self.stats["hits"] += 1
+                self.stats["disk_hits"] += 1
+                return entry["value"]
+            self._remove_disk(key)
+
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, tool_name: str, tool_args: Optional[Dict[str, Any]], value: str,
+            expires_at: Optional[float] = None):
+        """写入缓存，默认按数据类型计算过期时间"""
+        if expires_at is None:
+            expires_at = compute_expiry(
+                tool_name, tool_args, calendar=self.calendar)
+        key = make_cache_key(tool_name, tool_args)
+        entry = {
+            "tool_name": tool_name,
+            "args": normalize_args(tool_args),
+            "value": value,
+            "created_at": time.time(),
+            "expires_at": expires_at,
+        }
+        self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def clear(self):
+        """清空内存和磁盘缓存"""
+        self._memory.clear()
+        if self.cache_dir and self.cache_dir.exists():
+            for path in self.cache_dir.glob("*.json"):
+                path.unlink(missing_ok=True)
+        self._disk_index = OrderedDict()
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _disk_path(self, key: str) -> Optional[Path]:
+        return self.cache_dir / f"{key}.json" if self.cache_dir else None
+
+    def _disk_keys(self) -> "OrderedDict[str, None]":
+        if self._disk_index is None:
+            files = sorted(self.cache_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)
+            self._disk_index = OrderedDict((p.stem, None) for p in files)
+        return self._disk_index
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._disk_path(key)
+        if path is None or not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            # 更新访问时间，磁盘淘汰按最近访问排序
+            os.utime(path, None)
+            if key in self._disk_keys():
+                self._disk_index.move_to_end(key)
+            return entry
+        except Exception as e:
+            logger.warning(f"Failed to read tool cache entry {path}: {e}")
+            return None
+
+    def _write_disk(self, key: str, entry: Dict[str, Any]):
+        path = self._disk_path(key)
+        if path is None:
+            return
+        try:
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            disk_keys = self._disk_keys()
+            disk_keys[key] = None
+            disk_keys.move_to_end(key)
+            self._prune_disk()
+        except Exception as e:
+            logger.warning(f"Failed to write tool cache entry {path}: {e}")
+
+    def _remove_disk(self, key: str):
+        path = self._disk_path(key)
+        if path is not None:
+            path.unlink(missing_ok=True)
+            self._disk_keys().pop(key, None)
+
+    def _prune_disk(self):
+        """磁盘条目数超过上限时按LRU索引淘汰最久未访问的条目，不重新扫描目录"""
+        disk_keys = self._disk_keys()
+        while len(disk_keys) > self.max_disk_entries:
+            key, _ = disk_keys.popitem(last=False)
+            self._disk_path(key).unlink(missing_ok=True)
+            self.stats["evictions"] += 1
@@ -0,0 +1,136 @@
+"""
+按分析师选择MCP工具子集 - 缩小ReAct提示词中的工具schema
+每一轮LLM调用都会携带全部工具的JSON schema，只给分析师提供与其任务相关的工具，
+可以减少每轮的输入token，也减少模型在无关工具上浪费的步骤。
+"""
+import json
+from fnmatch import fnmatch
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from src.utils.logging_config import setup_logger, SUCCESS_ICON, WAIT_ICON
+from src.utils.execution_logger import get_execution_logger
+
+logger = setup_logger(__name__)
+
+# 估算schema token数量时每个token对应的字符数
+CHARS_PER_TOKEN = 4
+
+# (分析师, 全部工具名称, 选中工具名称) -> (完整工具集token数, 子集token数)
+# 同一进程中工具集不变，schema只序列化和估算一次
+_schema_token_cache: Dict[Tuple[str, Tuple[str, ...], Tuple[str, ...]], Tuple[int, int]] = {}
+
+# 标签 -> 工具名称模式（fnmatch语法）
+TOOL_TAGS: Dict[str, List[str]] = {
+    "basic": ["get_stock_basic_info", "get_latest_trading_date", "get_market_analysis_timeframe"],
+    "kline": ["get_historical_k_data", "get_adjust_factor_data", "get_trade_dates"],
+    "financials": [
+        "get_profit_data", "get_operation_data", "get_growth_data", "get_balance_data",
+        "get_cash_flow_data", "get_dupont_data", "get_performance_express_report",
+        "get_forecast_report",
+    ],
+    "dividend": ["get_dividend_data"],
+    "industry": ["get_stock_industry", "get_*_stocks"],
+    "analysis": ["get_stock_analysis"],
+    "macro": ["get_*_rate_data", "get_required_reserve_ratio_data", "get_money_supply_data_*",
+              "get_shibor_data"],
+}
+
+# 分析师 -> 工具集声明
+# tags: 引用TOOL_TAGS中的标签；patterns: 额外的名称模式；
+# required: 必需的工具，任意一个缺失时回退到完整工具集
+AGENT_TOOLSETS: Dict[str, Dict[str, List[str]]] = {
+    "fundamental_agent": {
+        "tags": ["basic", "financials", "dividend", "industry", "analysis"],
+        "patterns": [],
+        "required": ["get_stock_basic_info", "get_profit_data"],
+    },
+    "technical_agent": {
+        "tags": ["basic", "kline", "analysis"],
+        "patterns": [],
+        "required": ["get_stock_basic_info", "get_historical_k_data"],
+    },
+    "value_agent": {
+        "tags": ["basic", "kline", "financials", "dividend", "industry", "macro"],
+        "patterns": [],
+        "required": ["get_stock_basic_info", "get_historical_k_data"],
+    },
+}
+
+
+def _toolset_patterns(toolset: Dict[str, List[str]]) -> List[str]:
+    patterns = []
+    for tag in toolset.get("tags", []):
+        patterns.extend(TOOL_TAGS.get(tag, []))
+    patterns.extend(toolset.get("patterns", []))
+    return patterns
+
+
+def estimate_schema_tokens(tools: List[Any]) -> int:
+    """估算工具schema在请求中占用的token数量（与模型请求中的function定义一致）"""
+    payload = json.dumps([convert_to_openai_tool(tool) for tool in tools],
+                         ensure_ascii=False)
+    # 按约4个字符一个token估算，不依赖分词器文件（离线环境中下载分词器可能卡住）
+    return len(payload) // CHARS_PER_TOKEN
+
+
+def select_tools_for_agent(agent_name: str, tools: List[Any],
+                           toolsets: Optional[Dict[str, Dict[str, List[str]]]] = None) -> List[Any]:
+    """
+    根据AGENT_TOOLSETS为分析师选择工具子集
+
+    Args:
+        agent_name: 分析师名称，如 "technical_agent"
+        tools: 完整的工具列表
+        toolsets: 工具集声明，默认为AGENT_TOOLSETS
+
+    Returns:
+        list: 选中的工具（保持原有顺序）；没有声明、必需工具缺失或没有匹配时返回完整工具集
+    """
+    toolsets = AGENT_TOOLSETS if toolsets is None else toolsets
+    toolset = toolsets.get(agent_name)
+    if toolset is None:
+        return tools
+
+    available = {tool.name for tool in tools}
+    missing = [name for name in toolset.get("required", []) if name not in available]
+    patterns = _toolset_patterns(toolset)
+    selected = [tool for tool in tools
+                if any(fnmatch(tool.name, pattern) for pattern in patterns)]
+
+    fallback = bool(missing or not selected)
+    if fallback:
+        logger.warning(
+            f"{WAIT_ICON} {agent_name}: toolset incomplete (missing: {missing}), "
+            f"falling back to all {len(tools)} tools.")
+        selected = tools
+
+    _report_savings(agent_name, tools, selected, fallback)
+    return selected
+
+
+def _report_savings(agent_name: str, all_tools: List[Any], selected: List[Any], fallback: bool):
+    """记录工具子集节省的schema token数量"""
+    key = (agent_name, tuple(tool.name for tool in all_tools), tuple(tool.name for tool in selected))
+    if key not in _schema_token_cache:
+        try:
+            _schema_token_cache[key] = (estimate_schema_tokens(all_tools),
+                                        estimate_schema_tokens(selected))
+        except Exception as e:
+            logger.warning(f"Failed to estimate tool schema tokens: {e}")
+            return
+    full_tokens, selected_tokens = _schema_token_cache[key]
+
+    saved = full_tokens - selected_tokens
+    logger.info(
+        f"{SUCCESS_ICON} {agent_name}: using {len(selected)}/{len(all_tools)} tools, "
+        f"schema tokens per turn {selected_tokens} (saved {saved}).")
+    get_execution_logger().log_component_stats(f"tool_selection.{agent_name}", {
+        "tools_selected": len(selected),
+        "tools_available": len(all_tools),
+        "schema_tokens_full": full_tokens,
+        "schema_tokens_selected": selected_tokens,
+        "schema_tokens_saved": saved,
+        "fallback": fallback,
+    })
@@ -0,0 +1,151 @@
+"""
+工作流检查点 - 每个节点完成后把图状态持久化到本地文件
+检查点以执行ID（ExecutionLogger.execution_id）作为LangGraph的thread_id，
+每个执行一个目录（cache/checkpoints/<执行ID>/），每次保存检查点或节点输出追加一个记录文件。
+总结阶段失败或进程中断后，用 --resume <执行ID> 从检查点恢复，已经完成的分析师不会重新运行；
+运行成功后检查点随即删除。
+"""
+import asyncio
+import os
+import pickle
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from src.utils.logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+project_root = os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_CHECKPOINT_DIR = os.path.join(project_root, "cache", "checkpoints")
+
+
+class FileCheckpointSaver(InMemorySaver):
+    """
+    持久化到文件的检查点存储
+
+    读写都在内存中进行（InMemorySaver）。每次写入检查点或节点输出后，只把这一次新增的数据
+    （检查点及其新版本的通道值，或一个任务的输出）写成thread目录下的一个新记录文件，
+    文件按序号命名；读取时按序号依次加载该thread的全部记录。
+    异步接口在线程中写文件，不阻塞事件循环。
+    """
+
+    def __init__(self, checkpoint_dir: str = DEFAULT_CHECKPOINT_DIR):
+        super().__init__()
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        # thread_id -> 已写入的记录数（也是下一个记录文件的序号）
+        self._sequence: Dict[str, int] = {}
+
+    def _thread_dir(self, thread_id: str) -> Path:
+        return self.checkpoint_dir / thread_id
+
+    def has_checkpoint(self, thread_id: str) -> bool:
+        return any(self._thread_dir(thread_id).glob("*.pkl")) or bool(self.storage.get(thread_id))
+
+    def _ensure_loaded(self, config: Optional[Dict[str, Any]]):
+        thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+        if thread_id is None or thread_id in self._sequence:
+            return
+        paths = sorted(self._thread_dir(thread_id).glob("*.pkl"))
+        self._sequence[thread_id] = len(paths)
+        for path in paths:
+            try:
+                with open(path, "rb") as f:
+                    record = pickle.load(f)
+            except Exception as e:
+                logger.warning(f"Failed to load checkpoint record {path}: {e}")
+                continue
+            for (checkpoint_ns, checkpoint_id), saved in record["storage"].items():
+                self.storage[thread_id][checkpoint_ns][checkpoint_id] = saved
+            self.blobs.update(record["blobs"])
+            for outer_key, writes in record["writes"].items():
+                self.writes[outer_key].update(writes)
+
+    def _next_path(self, thread_id: str) -> Path:
+        """分配下一个记录文件的路径（在调用方线程中分配，保证记录顺序）"""
+        sequence = self._sequence.get(thread_id, 0)
+        self._sequence[thread_id] = sequence + 1
+        return self._thread_dir(thread_id) / f"{sequence:06d}.pkl"
+
+    @staticmethod
+    def _write_record(path: Path, record: Dict[str, Any]):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def _put(self, config, checkpoint, metadata, new_versions):
+        """写入内存，返回 (下一个config, 记录文件路径, 本次新增的记录)"""
+        self._ensure_loaded(config)
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        record = {
+            "storage": {(checkpoint_ns, checkpoint["id"]):
+                        self.storage[thread_id][checkpoint_ns][checkpoint["id"]]},
+            "blobs": {key: self.blobs[key] for key in
+                      ((thread_id, checkpoint_ns, channel, version)
+                       for channel, version in new_versions.items())},
+            "writes": {},
+        }
+        return next_config, self._next_path(thread_id), record
+
+    def _put_writes(self, config, writes, task_id, task_path):
+        """写入内存，返回 (记录文件路径, 本次新增的记录)"""
+        self._ensure_loaded(config)
+        super().put_writes(config, writes, task_id, task_path)
+        thread_id = config["configurable"]["thread_id"]
+        outer_key = (thread_id, config["configurable"].get("checkpoint_ns", ""),
+                     config["configurable"]["checkpoint_id"])
+        task_writes = {key: value for key, value in self.writes[outer_key].items()
+                       if key[0] == task_id}
+        record = {"storage": {}, "blobs": {}, "writes": {outer_key: task_writes}}
+        return self._next_path(thread_id), record
+
+    def get_tuple(self, config):
+        self._ensure_loaded(config)
+        return super().get_tuple(config)
+
+    def list(self, config, **kwargs):
+        self._ensure_loaded(config)
+        return super().list(config, **kwargs)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        next_config, path, record = self._put(config, checkpoint, metadata, new_versions)
+        self._write_record(path, record)
+        return next_config
+
+    def put_writes(self, config, writes, task_id, task_path: str = ""):
+        path, record = self._put_writes(config, writes, task_id, task_path)
+        self._write_record(path, record)
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        next_config, path, record = self._put(config, checkpoint, metadata, new_versions)
+        await asyncio.to_thread(self._write_record, path, record)
+        return next_config
+
+    async def aput_writes(self, config, writes, task_id, task_path: str = ""):
+        path, record = self._put_writes(config, writes, task_id, task_path)
+        await asyncio.to_thread(self._write_record, path, record)
+
+    def delete_thread(self, thread_id: str):
+        super().delete_thread(thread_id)
+        self._sequence.pop(thread_id, None)
+        shutil.rmtree(self._thread_dir(thread_id), ignore_errors=True)
+
+
+def get_checkpointer() -> Optional[FileCheckpointSaver]:
+    """
+    根据环境变量创建检查点存储，WORKFLOW_CHECKPOINTS=false时返回None
+
+    检查点目录由WORKFLOW_CHECKPOINT_DIR配置，默认为cache/checkpoints
+    """
+    if os.getenv("WORKFLOW_CHECKPOINTS", "true").lower() not in ("1", "true", "yes"):
+        return None
+    return FileCheckpointSaver(os.getenv("WORKFLOW_CHECKPOINT_DIR", DEFAULT_CHECKPOINT_DIR))
@@ -0,0 +1,91 @@
+"""
+节点截止时间 - 单个慢分支不再拖住整个工作流
+总结节点要等三个分析师全部结束才会运行，某个ReAct分析师反复重试工具时整次分析都会被拖慢。
+每个分析师节点有独立的截止时间，超时后节点被取消（进行中的LLM请求和MCP调用随之取消），
+节点返回标记为部分结果或不可用的分析，总结照常生成报告。
+预取节点（data_prefetch）同样有截止时间，超时后保留已获取的数据块，其余由分析师通过工具获取。
+总结节点只有一次LLM调用（受LLM_HTTP_TIMEOUT限制），不设截止时间：取消它只会得到没有报告的结果。
+
+截止时间（秒）由环境变量配置，0表示不限制：
+    NODE_DEADLINE_SECONDS                分析师和预取节点的默认截止时间（默认300）
+    NODE_DEADLINE_<节点名>               单个节点的截止时间，如 NODE_DEADLINE_VALUE_ANALYST=180、
+                                         NODE_DEADLINE_DATA_PREFETCH=60
+"""
+import os
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+# 分析师和预取节点的默认截止时间（秒）
+DEFAULT_NODE_DEADLINE = float(os.getenv("NODE_DEADLINE_SECONDS", "300"))
+
+# 部分结果中每条工具输出和整体的最大长度（字符）
+MAX_TOOL_OUTPUT_CHARS = 800
+MAX_PARTIAL_CHARS = 6000
+
+
+def get_node_deadline(node_name: str) -> Optional[float]:
+    """节点的截止时间（秒），不限制时返回None"""
+    value = os.getenv(f"NODE_DEADLINE_{node_name.upper()}")
+    deadline = float(value) if value else DEFAULT_NODE_DEADLINE
+    return deadline if deadline > 0 else None
+
+
+class PartialResultCollector(BaseCallbackHandler):
+    """
+    收集节点运行过程中已完成的工具调用和模型输出，超时后用来拼出部分结果
+
+    通过contextvars注册为LangChain的全局回调（见partial_result_collector），
+    节点内所有LLM和工具调用都会自动带上它，不需要修改各分析师的代码。
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self._tool_inputs: Dict[Any, Dict[str, Any]] = {}
+        self.tool_results: List[Dict[str, Any]] = []
+        self.llm_texts: List[str] = []
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._tool_inputs[run_id] = {"tool": (serialized or {}).get("name") or kwargs.get("name"),
+                                     "input": input_str}
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        call = self._tool_inputs.pop(run_id, {"tool": kwargs.get("name"), "input": None})
+        content = getattr(output, "content", output)
+        self.tool_results.append({**call, "output": str(content)})
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                if generation.text and generation.text.strip():
+                    self.llm_texts.append(generation.text.strip())
+
+    @property
+    def has_partial(self) -> bool:
+        return bool(self.tool_results or self.llm_texts)
+
+    def render(self) -> str:
+        """把已收集的信息整理为Markdown文本，超出长度的部分截断"""
+        parts = []
+        if self.llm_texts:
+            parts.append("超时前的分析内容：\n\n" + self.llm_texts[-1])
+        if self.tool_results:
+            lines = ["超时前已获取的数据："]
+            for result in self.tool_results:
+                output = result["output"]
+                if len(output) > MAX_TOOL_OUTPUT_CHARS:
+                    output = output[:MAX_TOOL_OUTPUT_CHARS] + "..."
+                lines.append(f"- {result['tool']}({result['input']}):\n{output}")
+            parts.append("\n".join(lines))
+        text = "\n\n".join(parts)
+        return text[:MAX_PARTIAL_CHARS] + "..." if len(text) > MAX_PARTIAL_CHARS else text
+
+
+# 当前节点的部分结果收集器；注册为可继承的配置钩子后，
+# 上下文中设置了收集器时，所有LangChain运行都会自动加入这个回调
+partial_result_collector: ContextVar[Optional[PartialResultCollector]] = ContextVar(
+    "partial_result_collector", default=None)
+register_configure_hook(partial_result_collector, inheritable=True)
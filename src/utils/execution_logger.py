@@ -5,6 +5,8 @@
 import os
 import json
 import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 from pathlib import Path
@@ -26,6 +28,22 @@ class ExecutionLogger:
         self.execution_dir = self._create_execution_dir()
         self.start_time = time.time()
 
+        # 各类缓存的命中统计，如 {"mcp_tool_cache": {"hits": 3, "misses": 1}}
+        self.cache_stats: Dict[str, Dict[str, int]] = {}
+
+        # 各组件的运行统计，如 {"mcp_init": {"init_seconds": 2.1, ...}}
+        self.component_stats: Dict[str, Dict[str, Any]] = {}
+
+        # 重试统计，如 {"llm": {"retried_calls": 2, "retries": 3, "time_lost_seconds": 4.2, "gave_up": 0}}
+        self.retry_stats: Dict[str, Dict[str, Any]] = {}
+
+        # 超过截止时间被取消的节点，如 [{"node": "value_analyst", "deadline_seconds": 180, ...}]
+        self.timeouts: List[Dict[str, Any]] = []
+
+        # Token用量与成本，按整次运行、agent和模型汇总
+        self.token_usage: Dict[str, Any] = {
+            "run": self._new_usage_bucket(), "by_agent": {}, "by_model": {}}
+
         # 记录执行开始信息
         self._log_execution_start()
 
@@ -164,6 +182,112 @@ class ExecutionLogger:
 
         return tool_log
 
+    def record_cache_access(self, cache_name: str, hit: bool, key: Optional[str] = None):
+        """
+        记录一次缓存访问（命中或未命中），执行结束时汇总到摘要中
+
+        Args:
+            cache_name: 缓存名称
+            hit: 是否命中
+            key: 可选的访问键，提供时额外按键统计
+        """
+        stats = self.cache_stats.setdefault(
+            cache_name, {"hits": 0, "misses": 0})
+        stats["hits" if hit else "misses"] += 1
+        if key is not None:
+            key_stats = stats.setdefault("keys", {}).setdefault(
+                key, {"hits": 0, "misses": 0})
+            key_stats["hits" if hit else "misses"] += 1
+
+    @staticmethod
+    def _new_usage_bucket() -> Dict[str, Any]:
+        return {"calls": 0, "llm_cache_hits": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                "cached_tokens": 0, "total_tokens": 0, "latency_seconds": 0.0,
+                "first_token_seconds": 0.0, "max_first_token_seconds": 0.0, "cost": None}
+
+    def record_token_usage(self, agent_name: str, model: str, prompt_tokens: int,
+                           completion_tokens: int, cached_tokens: int, latency: float,
+                           first_token_latency: float, cost: Optional[float] = None,
+                           llm_cache_hit: bool = False):
+        """
+        记录一次模型调用的token用量，同时累加到整次运行、agent和模型三个维度
+
+        Args:
+            agent_name: 发起调用的agent
+            model: 模型名称
+            prompt_tokens: 提示词token数
+            completion_tokens: 输出token数
+            cached_tokens: 提示词中命中服务端缓存的token数
+            latency: 调用总耗时（秒）
+            first_token_latency: 首token时间（秒）
+            cost: 按价格表计算的费用，未配置价格时为None
+            llm_cache_hit: 是否由本地LLM响应缓存返回
+        """
+        buckets = [
+            self.token_usage["run"],
+            self.token_usage["by_agent"].setdefault(agent_name, self._new_usage_bucket()),
+            self.token_usage["by_model"].setdefault(model, self._new_usage_bucket()),
+        ]
+        for bucket in buckets:
+            bucket["calls"] += 1
+            bucket["llm_cache_hits"] += 1 if llm_cache_hit else 0
+            bucket["prompt_tokens"] += prompt_tokens
+            bucket["completion_tokens"] += completion_tokens
+            bucket["cached_tokens"] += cached_tokens
+            bucket["total_tokens"] += prompt_tokens + completion_tokens
+            bucket["latency_seconds"] += latency
+            bucket["first_token_seconds"] += first_token_latency
+            bucket["max_first_token_seconds"] = max(
+                bucket["max_first_token_seconds"], first_token_latency)
+            if cost is not None:
+                bucket["cost"] = (bucket["cost"] or 0.0) + cost
+
+    def record_retry(self, policy_name: str, retries: int, time_lost: float, success: bool):
+        """
+        记录一次经过重试（或最终放弃）的调用
+
+        Args:
+            policy_name: 重试策略名称
+            retries: 重试次数（不含第一次尝试）
+            time_lost: 失败尝试和等待所花费的时间（秒）
+            success: 最终是否成功
+        """
+        stats = self.retry_stats.setdefault(policy_name, {
+            "retried_calls": 0, "retries": 0, "time_lost_seconds": 0.0, "gave_up": 0})
+        if retries:
+            stats["retried_calls"] += 1
+        stats["retries"] += retries
+        stats["time_lost_seconds"] += time_lost
+        if not success:
+            stats["gave_up"] += 1
+
+    def log_timeout(self, node_name: str, deadline: float, elapsed: float, partial: bool,
+                    details: Optional[Dict[str, Any]] = None):
+        """
+        记录一次节点超时（节点被取消，结果标记为部分结果或不可用）
+
+        Args:
+            node_name: 超时的工作流节点
+            deadline: 截止时间（秒）
+            elapsed: 取消时已运行的时间（秒）
+            partial: 是否保留了超时前获取的部分结果
+            details: 其他信息（如超时前完成的工具调用）
+        """
+        event = {
+            "timestamp": datetime.now().isoformat(),
+            "node": node_name,
+            "deadline_seconds": deadline,
+            "elapsed_seconds": round(elapsed, 3),
+            "partial": partial,
+            **(details or {}),
+        }
+        self.timeouts.append(event)
+        self._append_jsonl(event, "timeouts.jsonl")
+
+    def log_component_stats(self, component_name: str, stats: Dict[str, Any]):
+        """记录组件的运行统计（如MCP冷启动耗时），执行结束时汇总到摘要中"""
+        self.component_stats[component_name] = dict(stats)
+
     def log_final_report(self, report_content: str, report_path: str):
         """记录最终生成的报告"""
         report_log = {
@@ -216,7 +340,12 @@ class ExecutionLogger:
             "agents_executed": [],
             "llm_interactions_count": 0,
             "tools_used_count": 0,
-            "total_files_created": 0
+            "total_files_created": 0,
+            "cache_stats": self.cache_stats,
+            "component_stats": self.component_stats,
+            "retry_stats": self.retry_stats,
+            "timeouts": self.timeouts,
+            "token_usage": self.token_usage
         }
 
         # 统计agent执行情况
@@ -279,6 +408,57 @@ class ExecutionLogger:
             status = '✅ 成功' if agent.get('success') else '❌ 失败'
             summary_text += f"- {agent.get('name', 'Unknown')}: {status} (耗时: {agent.get('execution_time', 0):.2f}s)\n"
 
+        cache_stats = execution_info.get('summary', {}).get('cache_stats', {})
+        if cache_stats:
+            summary_text += "\n## 缓存统计\n"
+            for cache_name, stats in cache_stats.items():
+                hits = stats.get('hits', 0)
+                misses = stats.get('misses', 0)
+                total = hits + misses
+                hit_rate = hits / total * 100 if total else 0
+                summary_text += f"- {cache_name}: 命中 {hits} / 未命中 {misses} (命中率: {hit_rate:.1f}%)\n"
+
+        token_usage = execution_info.get('summary', {}).get('token_usage', {})
+        if token_usage.get('run', {}).get('calls'):
+            summary_text += "\n## Token用量与成本\n"
+            rows = [("全部", token_usage['run'])]
+            rows += [(f"agent: {name}", bucket) for name, bucket in token_usage.get('by_agent', {}).items()]
+            rows += [(f"模型: {name}", bucket) for name, bucket in token_usage.get('by_model', {}).items()]
+            for label, bucket in rows:
+                cost = bucket.get('cost')
+                cost_text = f"{cost:.4f}" if cost is not None else "N/A"
+                calls = bucket.get('calls', 0)
+                avg_ttft = bucket.get('first_token_seconds', 0) / calls if calls else 0
+                summary_text += (f"- {label}: 调用 {calls} 次 (缓存命中 {bucket.get('llm_cache_hits', 0)}), "
+                                 f"提示词 {bucket.get('prompt_tokens', 0)} / 输出 {bucket.get('completion_tokens', 0)} / "
+                                 f"服务端缓存 {bucket.get('cached_tokens', 0)} tokens, "
+                                 f"平均首token {avg_ttft:.2f}s, 费用 {cost_text}\n")
+
+        retry_stats = execution_info.get('summary', {}).get('retry_stats', {})
+        if retry_stats:
+            summary_text += "\n## 重试统计\n"
+            for policy_name, stats in retry_stats.items():
+                summary_text += (f"- {policy_name}: 重试 {stats.get('retries', 0)} 次 "
+                                 f"(涉及 {stats.get('retried_calls', 0)} 次调用, 放弃 {stats.get('gave_up', 0)} 次), "
+                                 f"损失时间: {stats.get('time_lost_seconds', 0):.2f}s\n")
+
+        timeouts = execution_info.get('summary', {}).get('timeouts', [])
+        if timeouts:
+            summary_text += "\n## 节点超时\n"
+            for event in timeouts:
+                result = '部分结果' if event.get('partial') else '结果不可用'
+                summary_text += (f"- {event.get('node')}: 超过截止时间 {event.get('deadline_seconds')}s "
+                                 f"(运行 {event.get('elapsed_seconds', 0):.2f}s 后取消, {result})\n")
+
+        component_stats = execution_info.get('summary', {}).get('component_stats', {})
+        if component_stats:
+            summary_text += "\n## 组件统计\n"
+            for component_name, stats in component_stats.items():
+                details = ", ".join(
+                    f"{k}: {v:.2f}" if isinstance(v, float) else f"{k}: {v}"
+                    for k, v in stats.items())
+                summary_text += f"- {component_name}: {details}\n"
+
         if execution_info.get('error'):
             summary_text += f"\n## 错误信息\n{execution_info['error']}\n"
 
@@ -323,28 +503,66 @@ class ExecutionLogger:
             f.write(content)
 
 
-# 全局执行日志记录器实例
+# 未绑定上下文时使用的默认记录器（单独调用agent、测试等场景）
 _execution_logger: Optional[ExecutionLogger] = None
 
+# 当前上下文绑定的执行日志记录器。asyncio任务创建时复制上下文，
+# 一次分析启动的所有工作流节点都写入同一个记录器，同一事件循环中
+# 并发的多次分析（批量模式、服务模式）各自拥有独立的目录、计数和计时。
+_context_logger: ContextVar[Optional[ExecutionLogger]] = ContextVar(
+    "execution_logger", default=None)
+
 
 def get_execution_logger() -> ExecutionLogger:
-    """获取全局执行日志记录器"""
+    """获取当前上下文的执行日志记录器，未绑定时返回默认记录器"""
     global _execution_logger
+    bound = _context_logger.get()
+    if bound is not None:
+        return bound
     if _execution_logger is None:
         _execution_logger = ExecutionLogger()
     return _execution_logger
 
 
+def bind_execution_logger(execution_logger: ExecutionLogger) -> Token:
+    """
+    在当前上下文中绑定执行日志记录器
+
+    Returns:
+        Token: 传给unbind_execution_logger恢复之前的绑定
+    """
+    return _context_logger.set(execution_logger)
+
+
+def unbind_execution_logger(token: Token):
+    """恢复bind_execution_logger之前的绑定"""
+    _context_logger.reset(token)
+
+
+@contextmanager
+def execution_logger_context(execution_logger: ExecutionLogger):
+    """在with块内绑定执行日志记录器，块内创建的任务都写入这个记录器"""
+    token = bind_execution_logger(execution_logger)
+    try:
+        yield execution_logger
+    finally:
+        unbind_execution_logger(token)
+
+
 def initialize_execution_logger(base_log_dir: str = "logs") -> ExecutionLogger:
-    """初始化执行日志记录器"""
-    global _execution_logger
-    _execution_logger = ExecutionLogger(base_log_dir)
-    return _execution_logger
+    """初始化执行日志记录器并绑定到当前上下文"""
+    execution_logger = ExecutionLogger(base_log_dir)
+    _context_logger.set(execution_logger)
+    return execution_logger
 
 
 def finalize_execution_logger(success: bool = True, error: str = None):
-    """完成执行日志记录"""
+    """完成当前上下文的执行日志记录，不影响其他上下文中进行的分析"""
     global _execution_logger
-    if _execution_logger:
+    bound = _context_logger.get()
+    if bound is not None:
+        bound.finalize_execution(success, error)
+        _context_logger.set(None)
+    elif _execution_logger:
         _execution_logger.finalize_execution(success, error)
         _execution_logger = None
@@ -0,0 +1,119 @@
+"""
+增量分析 - 输入数据没有变化的分析师直接复用上次的分析结果
+每个分析师声明自己依赖的预取数据块（prefetch_agent.ANALYST_SECTIONS），
+分析完成后按 (股票, 分析师) 保存分析文本和输入数据的指纹。增量模式下再次分析同一只股票时，
+指纹相同的分析师（通常是基本面：季度财务数据和分红几天内不会变化）直接复用保存的结果，
+只有数据变化的分支（通常是技术面）和总结重新运行。
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from src.agents.prefetch_agent import ANALYST_SECTIONS
+from src.utils.logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+project_root = os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_STORE_DIR = os.path.join(project_root, "cache", "analyses")
+
+# 分析师提示词或输出格式变化时递增，使已保存的分析全部失效
+# 2: 提示词加入本地计算的技术指标、支撑/阻力位、估值区间和财务比率表
+ANALYSIS_VERSION = 2
+
+
+def section_fingerprint(value: Any) -> str:
+    """数据块内容的SHA-256（键顺序无关）"""
+    canonical = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def analysis_fingerprint(agent_name: str, data: Dict[str, Any]) -> Optional[str]:
+    """
+    分析师输入的指纹：依赖的各数据块指纹、股票、查询、模型和分析版本
+
+    依赖的数据块缺失或预取失败时返回None，这种情况下既不复用也不保存结果。
+    """
+    prefetched = data.get("prefetched") or {}
+    sections = ANALYST_SECTIONS[agent_name]
+    failed_sections = {key.split("/")[0] for key in (data.get("prefetch_errors") or {})}
+    if any(not prefetched.get(section) or section in failed_sections for section in sections):
+        return None
+
+    payload = {
+        "version": ANALYSIS_VERSION,
+        "agent": agent_name,
+        "stock_code": data.get("stock_code"),
+        "query": data.get("query"),
+        "model": os.getenv("OPENAI_COMPATIBLE_MODEL"),
+        "inputs": {section: section_fingerprint(prefetched[section]) for section in sections},
+    }
+    return section_fingerprint(payload)
+
+
+class AnalysisStore:
+    """按 (股票, 分析师) 保存最近一次成功的分析结果"""
+
+    def __init__(self, store_dir: str = DEFAULT_STORE_DIR):
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, stock_code: str, agent_name: str) -> Path:
+        safe_code = re.sub(r"[^0-9A-Za-z._-]", "_", stock_code)
+        return self.store_dir / safe_code / f"{agent_name}.json"
+
+    def load(self, stock_code: str, agent_name: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """读取保存的分析，指纹不一致（输入数据有变化）时返回None"""
+        path = self._path(stock_code, agent_name)
+        if not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except Exception as e:
+            logger.warning(f"Failed to read stored analysis {path}: {e}")
+            return None
+        return record if record.get("fingerprint") == fingerprint else None
+
+    def save(self, stock_code: str, agent_name: str, fingerprint: str, analysis: str):
+        path = self._path(stock_code, agent_name)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"fingerprint": fingerprint, "created_at": datetime.now().isoformat(),
+                           "created_timestamp": time.time(), "analysis": analysis},
+                          f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to store analysis {path}: {e}")
+
+
+# 全局存储实例与增量模式开关
+_analysis_store: Optional[AnalysisStore] = None
+_incremental = os.getenv("INCREMENTAL_ANALYSIS", "false").lower() in ("1", "true", "yes")
+
+
+def get_analysis_store() -> AnalysisStore:
+    """获取全局分析结果存储（目录由ANALYSIS_STORE_DIR配置）"""
+    global _analysis_store
+    if _analysis_store is None:
+        _analysis_store = AnalysisStore(os.getenv("ANALYSIS_STORE_DIR", DEFAULT_STORE_DIR))
+    return _analysis_store
+
+
+def set_incremental_mode(enabled: bool):
+    """设置是否复用输入数据未变化的分析结果（例如命令行 --incremental）"""
+    global _incremental
+    _incremental = enabled
+
+
+def is_incremental_mode() -> bool:
+    return _incremental
@@ -0,0 +1,169 @@
+"""
+LLM响应缓存 - 完全匹配的请求直接返回上次的响应
+缓存键是 (模型, 温度, max_tokens, 消息, 工具schema等请求参数) 的哈希，
+条目按内容寻址存放在磁盘上（cache/llm_responses/<前两位>/<哈希>.json），
+总大小超过上限时按最近访问时间（LRU）淘汰。
+重跑同一分析（例如总结失败后重新执行整个命令）时，相同的LLM调用不再重复付费。
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from src.utils.logging_config import setup_logger
+from src.utils.execution_logger import get_execution_logger
+
+logger = setup_logger(__name__)
+
+project_root = os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_CACHE_DIR = os.path.join(project_root, "cache", "llm_responses")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# 提示词中包含精确到秒的当前时刻，计算缓存键时去掉时分秒，同一天内重跑可以命中
+_CLOCK_TIME_PATTERN = re.compile(r"\b\d{1,2}:\d{2}:\d{2}\b")
+
+
+def _normalize_for_key(value: Any) -> Any:
+    if isinstance(value, str):
+        return _CLOCK_TIME_PATTERN.sub("<time>", value)
+    if isinstance(value, dict):
+        return {k: _normalize_for_key(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize_for_key(v) for v in value]
+    return value
+
+
+def make_llm_cache_key(payload: Dict[str, Any]) -> str:
+    """请求内容的SHA-256哈希（键顺序无关）"""
+    canonical = json.dumps(_normalize_for_key(payload), ensure_ascii=False,
+                           sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """内容寻址的磁盘LLM响应缓存，按总大小做LRU淘汰"""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 bypass: bool = False):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 磁盘上缓存文件的总大小上限
+            bypass: 为True时不读取缓存（仍然写入，用新响应刷新缓存）
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = int(max_bytes)
+        self.bypass = bypass
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # 磁盘条目的LRU索引（键 -> 文件大小）和总大小，首次使用时扫描一次目录，之后随读写维护
+        self._entries: "Optional[OrderedDict[str, int]]" = None
+        self._total_bytes = 0
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _index(self) -> "OrderedDict[str, int]":
+        if self._entries is None:
+            files = [(p.stem, p.stat()) for p in self.cache_dir.glob("*/*.json")]
+            files.sort(key=lambda e: e[1].st_mtime)
+            self._entries = OrderedDict((key, st.st_size) for key, st in files)
+            self._total_bytes = sum(self._entries.values())
+        return self._entries
+
+    def get(self, payload: Dict[str, Any]) -> Optional[Any]:
+        """读取缓存的响应，未命中（或bypass）时返回None"""
+        if self.bypass:
+            return None
+        key = make_llm_cache_key(payload)
+        path = self._path(key)
+        value = None
+        if path.exists():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    value = json.load(f)["value"]
+                # 更新访问时间，淘汰按最近访问排序
+                os.utime(path, None)
+                if key in self._index():
+                    self._entries.move_to_end(key)
+            except Exception as e:
+                logger.warning(f"Failed to read LLM cache entry {path}: {e}")
+                value = None
+
+        hit = value is not None
+        self.stats["hits" if hit else "misses"] += 1
+        get_execution_logger().record_cache_access("llm_response_cache", hit)
+        return value
+
+    def set(self, payload: Dict[str, Any], value: Any):
+        """写入响应"""
+        key = make_llm_cache_key(payload)
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"model": payload.get("model"), "created_at": time.time(),
+                           "value": value}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self.stats["writes"] += 1
+            size = path.stat().st_size
+            entries = self._index()
+            self._total_bytes += size - entries.pop(key, 0)
+            entries[key] = size
+            self._prune()
+        except Exception as e:
+            logger.warning(f"Failed to write LLM cache entry {path}: {e}")
+
+    def clear(self):
+        for path in self.cache_dir.glob("*/*.json"):
+            path.unlink(missing_ok=True)
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+
+    def _prune(self):
+        """总大小超过上限时按LRU索引淘汰最久未访问的条目，不重新扫描目录"""
+        entries = self._index()
+        while self._total_bytes > self.max_bytes and entries:
+            key, size = entries.popitem(last=False)
+            self._path(key).unlink(missing_ok=True)
+            self._total_bytes -= size
+            self.stats["evictions"] += 1
+
+
+# 全局缓存实例与本次运行的bypass标志
+_llm_cache: Optional[LLMResponseCache] = None
+_bypass = False
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """
+    获取全局LLM响应缓存，LLM_CACHE_ENABLED=false时返回None
+
+    相关环境变量：LLM_CACHE_DIR、LLM_CACHE_MAX_BYTES、LLM_CACHE_BYPASS
+    """
+    global _llm_cache
+    if os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache(
+            cache_dir=os.getenv("LLM_CACHE_DIR", DEFAULT_CACHE_DIR),
+            max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(DEFAULT_MAX_BYTES))),
+        )
+    _llm_cache.bypass = _bypass or os.getenv(
+        "LLM_CACHE_BYPASS", "false").lower() in ("1", "true", "yes")
+    return _llm_cache
+
+
+def set_llm_cache_bypass(bypass: bool):
+    """设置本次运行是否跳过缓存读取（例如命令行 --no-llm-cache）"""
+    global _bypass
+    _bypass = bypass
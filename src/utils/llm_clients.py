@@ -1,11 +1,13 @@
 import os
-import time
-import backoff
+import asyncio
 from abc import ABC, abstractmethod
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from google import genai
 from src.utils.logging_config import setup_logger, SUCCESS_ICON, ERROR_ICON, WAIT_ICON
+from src.utils.retry_policy import get_llm_retry_policy
+from src.utils.rate_limiter import get_rate_limiter, estimate_request_tokens
+from src.utils.llm_cache import get_llm_cache
 
 # 设置日志记录
 logger = setup_logger('llm_clients')
@@ -19,6 +21,35 @@ class LLMClient(ABC):
         """获取模型回答"""
         pass
 
+    async def aget_completion(self, messages, **kwargs):
+        """
+        异步获取模型回答
+
+        默认在线程池中执行同步的get_completion，避免阻塞事件循环；
+        子类应使用原生异步SDK覆盖此方法。
+        """
+        return await asyncio.to_thread(self.get_completion, messages, **kwargs)
+
+    def _cache_payload(self, messages):
+        """LLM响应缓存的键内容：客户端类型、模型和消息"""
+        return {
+            "kind": type(self).__name__,
+            "base_url": getattr(self, "base_url", None),
+            "model": getattr(self, "model", None),
+            "messages": messages,
+        }
+
+    def _cached_completion(self, messages):
+        """读取缓存的回答，未命中或缓存关闭时返回None"""
+        cache = get_llm_cache()
+        return cache.get(self._cache_payload(messages)) if cache else None
+
+    def _store_completion(self, messages, content):
+        """缓存成功获取的回答"""
+        cache = get_llm_cache()
+        if cache and content:
+            cache.set(self._cache_payload(messages), content)
+
 
 class GeminiClient(LLMClient):
     """Google Gemini API 客户端"""
@@ -36,15 +67,21 @@ class GeminiClient(LLMClient):
         self.client = genai.Client(api_key=self.api_key)
         logger.info(f"{SUCCESS_ICON} Gemini 客户端初始化成功")
 
-    @backoff.on_exception(
-        backoff.expo,
-        (Exception),
-        max_tries=5,
-        max_time=300,
-        giveup=lambda e: "AFC is enabled" not in str(e)
-    )
-    def generate_content_with_retry(self, contents, config=None):
-        """带重试机制的内容生成函数"""
+    @staticmethod
+    def _log_api_error(e):
+        error_msg = str(e)
+        if "location" in error_msg.lower():
+            logger.info(
+                f"\033[91m❗ Gemini API 地理位置限制错误: 请使用美国节点VPN后重试\033[0m")
+            logger.error(f"详细错误: {error_msg}")
+        elif "AFC is enabled" in error_msg:
+            logger.warning(
+                f"{ERROR_ICON} 触发 API 限制，等待重试... 错误: {error_msg}")
+        else:
+            logger.error(f"{ERROR_ICON} API 调用失败: {error_msg}")
+
+    def generate_content(self, contents, config=None):
+        """单次内容生成调用，重试由RetryPolicy负责"""
         try:
             logger.info(f"{WAIT_ICON} 正在调用 Gemini API...")
             logger.debug(f"请求内容: {contents}")
@@ -60,84 +97,122 @@ class GeminiClient(LLMClient):
             logger.debug(f"响应内容: {response.text[:500]}...")
             return response
         except Exception as e:
-            error_msg = str(e)
-            if "location" in error_msg.lower():
-                logger.info(
-                    f"\033[91m❗ Gemini API 地理位置限制错误: 请使用美国节点VPN后重试\033[0m")
-                logger.error(f"详细错误: {error_msg}")
-            elif "AFC is enabled" in error_msg:
-                logger.warning(
-                    f"{ERROR_ICON} 触发 API 限制，等待重试... 错误: {error_msg}")
-                time.sleep(5)
-            else:
-                logger.error(f"{ERROR_ICON} API 调用失败: {error_msg}")
+            self._log_api_error(e)
             raise e
 
-    def get_completion(self, messages, max_retries=3, initial_retry_delay=1, **kwargs):
-        """获取聊天完成结果，包含重试逻辑"""
+    async def agenerate_content(self, contents, config=None):
+        """单次异步内容生成调用，重试由RetryPolicy负责"""
+        try:
+            logger.info(f"{WAIT_ICON} 正在调用 Gemini API (async)...")
+            logger.debug(f"请求内容: {contents}")
+            logger.debug(f"请求配置: {config}")
+
+            response = await self.client.aio.models.generate_content(
+                model=self.model,
+                contents=contents,
+                config=config
+            )
+
+            logger.info(f"{SUCCESS_ICON} API 调用成功")
+            logger.debug(f"响应内容: {response.text[:500]}...")
+            return response
+        except Exception as e:
+            self._log_api_error(e)
+            raise e
+
+    @staticmethod
+    def _build_request(messages):
+        """把OpenAI格式的消息转换为Gemini的prompt和配置"""
+        prompt = ""
+        system_instruction = None
+
+        for message in messages:
+            role = message["role"]
+            content = message["content"]
+            if role == "system":
+                system_instruction = content
+            elif role == "user":
+                prompt += f"User: {content}\n"
+            elif role == "assistant":
+                prompt += f"Assistant: {content}\n"
+
+        # 准备配置
+        config = {}
+        if system_instruction:
+            config['system_instruction'] = system_instruction
+
+        return prompt.strip(), config
+
+    def get_completion(self, messages, max_retries=None, initial_retry_delay=None,
+                       retry_policy=None, **kwargs):
+        """
+        获取聊天完成结果，重试遵循共享的RetryPolicy
+
+        Args:
+            messages: OpenAI格式的消息列表
+            max_retries: 覆盖策略的最多尝试次数（可选）
+            initial_retry_delay: 覆盖策略的基础延迟（可选）
+            retry_policy: 使用指定的策略代替共享策略（可选）
+        """
+        policy = (retry_policy or get_llm_retry_policy()).with_overrides(
+            max_retries, initial_retry_delay)
         try:
             logger.info(f"{WAIT_ICON} 使用 Gemini 模型: {self.model}")
             logger.debug(f"消息内容: {messages}")
 
-            for attempt in range(max_retries):
-                try:
-                    # 转换消息格式
-                    prompt = ""
-                    system_instruction = None
-
-                    for message in messages:
-                        role = message["role"]
-                        content = message["content"]
-                        if role == "system":
-                            system_instruction = content
-                        elif role == "user":
-                            prompt += f"User: {content}\n"
-                        elif role == "assistant":
-                            prompt += f"Assistant: {content}\n"
-
-                    # 准备配置
-                    config = {}
-                    if system_instruction:
-                        config['system_instruction'] = system_instruction
-
-                    # 调用 API
-                    response = self.generate_content_with_retry(
-                        contents=prompt.strip(),
-                        config=config
-                    )
-
-                    if response is None:
-                        logger.warning(
-                            f"{ERROR_ICON} 尝试 {attempt + 1}/{max_retries}: API 返回空值")
-                        if attempt < max_retries - 1:
-                            retry_delay = initial_retry_delay * (2 ** attempt)
-                            logger.info(
-                                f"{WAIT_ICON} 等待 {retry_delay} 秒后重试...")
-                            time.sleep(retry_delay)
-                            continue
-                        return None
-
-                    logger.debug(f"API 原始响应: {response.text}")
-                    logger.info(f"{SUCCESS_ICON} 成功获取 Gemini 响应")
-
-                    # 直接返回文本内容
-                    return response.text
-
-                except Exception as e:
-                    logger.error(
-                        f"{ERROR_ICON} 尝试 {attempt + 1}/{max_retries} 失败: {str(e)}")
-                    if attempt < max_retries - 1:
-                        retry_delay = initial_retry_delay * (2 ** attempt)
-                        logger.info(f"{WAIT_ICON} 等待 {retry_delay} 秒后重试...")
-                        time.sleep(retry_delay)
-                    else:
-                        logger.error(f"{ERROR_ICON} 最终错误: {str(e)}")
-                        return None
+            cached = self._cached_completion(messages)
+            if cached is not None:
+                logger.info(f"{SUCCESS_ICON} 命中 LLM 响应缓存")
+                return cached
+
+            prompt, config = self._build_request(messages)
+            response = policy.call(
+                self.generate_content, contents=prompt, config=config)
+            if response is None:
+                logger.warning(f"{ERROR_ICON} API 返回空值")
+                return None
+
+            logger.debug(f"API 原始响应: {response.text}")
+            logger.info(f"{SUCCESS_ICON} 成功获取 Gemini 响应")
+
+            # 直接返回文本内容
+            self._store_completion(messages, response.text)
+            return response.text
 
         except Exception as e:
             logger.error(f"{ERROR_ICON} get_completion 发生错误: {str(e)}")
             return None
 
+    async def aget_completion(self, messages, max_retries=None, initial_retry_delay=None,
+                              retry_policy=None, **kwargs):
+        """get_completion的异步版本，重试等待使用asyncio.sleep，不阻塞事件循环"""
+        policy = (retry_policy or get_llm_retry_policy()).with_overrides(
+            max_retries, initial_retry_delay)
+        try:
+            logger.info(f"{WAIT_ICON} 使用 Gemini 模型 (async): {self.model}")
+            logger.debug(f"消息内容: {messages}")
+
+            cached = self._cached_completion(messages)
+            if cached is not None:
+                logger.info(f"{SUCCESS_ICON} 命中 LLM 响应缓存")
+                return cached
+
+            prompt, config = self._build_request(messages)
+            response = await policy.acall(
+                self.agenerate_content, contents=prompt, config=config)
+            if response is None:
+                logger.warning(f"{ERROR_ICON} API 返回空值")
+                return None
+
+            logger.debug(f"API 原始响应: {response.text}")
+            logger.info(f"{SUCCESS_ICON} 成功获取 Gemini 响应")
+            self._store_completion(messages, response.text)
+            return response.text
+
+        except Exception as e:
+            logger.error(f"{ERROR_ICON} aget_completion 发生错误: {str(e)}")
+            return None
+
 
 class OpenAICompatibleClient(LLMClient):
     """OpenAI 兼容 API 客户端"""
@@ -162,21 +237,29 @@ class OpenAICompatibleClient(LLMClient):
             raise ValueError(
                 "OPENAI_COMPATIBLE_MODEL not found in environment variables")
 
-        # 初始化 OpenAI 客户端
+        # 初始化 OpenAI 客户端，关闭SDK内置重试，统一由RetryPolicy重试
         self.client = OpenAI(
             base_url=self.base_url,
-            api_key=self.api_key
+            api_key=self.api_key,
+            max_retries=0
         )
+        # 异步客户端在首次异步调用时创建
+        self._async_client = None
         logger.info(f"{SUCCESS_ICON} OpenAI Compatible 客户端初始化成功")
 
-    @backoff.on_exception(
-        backoff.expo,
-        (Exception),
-        max_tries=5,
-        max_time=300
-    )
-    def call_api_with_retry(self, messages, stream=False):
-        """带重试机制的 API 调用函数"""
+    @property
+    def async_client(self):
+        """异步OpenAI客户端（延迟创建）"""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                base_url=self.base_url,
+                api_key=self.api_key,
+                max_retries=0
+            )
+        return self._async_client
+
+    def call_api(self, messages, stream=False):
+        """单次 API 调用，重试由RetryPolicy负责"""
         try:
             logger.info(f"{WAIT_ICON} 正在调用 OpenAI Compatible API...")
             logger.debug(f"请求内容: {messages}")
@@ -195,84 +278,127 @@ class OpenAICompatibleClient(LLMClient):
             logger.error(f"{ERROR_ICON} API 调用失败: {error_msg}")
             raise e
 
-    def get_completion(self, messages, max_retries=3, initial_retry_delay=1, **kwargs):
-        """获取聊天完成结果，包含重试逻辑"""
+    async def acall_api(self, messages, stream=False):
+        """单次异步 API 调用，重试由RetryPolicy负责"""
+        try:
+            logger.info(f"{WAIT_ICON} 正在调用 OpenAI Compatible API (async)...")
+            logger.debug(f"请求内容: {messages}")
+            logger.debug(f"模型: {self.model}, 流式: {stream}")
+
+            # 在 (API地址, 模型) 的共享限流器中排队，避免超出RPM/TPM
+            limiter = get_rate_limiter(self.base_url, self.model)
+            reserved = await limiter.acquire(estimate_request_tokens(messages))
+
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                stream=stream
+            )
+
+            usage = getattr(response, "usage", None)
+            limiter.reconcile(reserved, getattr(usage, "total_tokens", None))
+
+            logger.info(f"{SUCCESS_ICON} API 调用成功")
+            return response
+        except Exception as e:
+            error_msg = str(e)
+            logger.error(f"{ERROR_ICON} API 调用失败: {error_msg}")
+            raise e
+
+    @staticmethod
+    def _extract_content(response):
+        """从不同格式的响应中提取文本内容"""
+        content = None
+
+        # 如果响应是字典类型（某些兼容API可能直接返回字典）
+        if isinstance(response, dict):
+            if 'choices' in response and len(response['choices']) > 0:
+                if 'message' in response['choices'][0] and 'content' in response['choices'][0]['message']:
+                    content = response['choices'][0]['message']['content']
+                elif 'text' in response['choices'][0]:
+                    content = response['choices'][0]['text']
+        # 如果响应是OpenAI标准对象
+        elif hasattr(response, 'choices') and len(response.choices) > 0:
+            if hasattr(response.choices[0], 'message') and hasattr(response.choices[0].message, 'content'):
+                content = response.choices[0].message.content
+
+        # 如果无法提取内容，尝试其他方法
+        if content is None:
+            if hasattr(response, 'text'):
+                content = response.text
+            elif hasattr(response, 'content'):
+                content = response.content
+            else:
+                # 最后尝试字符串化整个响应
+                content = str(response)
+                logger.warning(f"{WAIT_ICON} 无法直接提取响应内容，使用字符串化响应")
+
+        return content
+
+    def _content_or_warning(self, messages, response):
+        if response is None:
+            logger.warning(f"{ERROR_ICON} API 返回空值")
+            return None
+
+        content = self._extract_content(response)
+        if content:
+            logger.debug(f"API 响应内容: {content[:500]}...")
+            logger.info(f"{SUCCESS_ICON} 成功获取 OpenAI Compatible 响应")
+            self._store_completion(messages, content)
+            return content
+
+        logger.warning(f"{ERROR_ICON} 无法从响应中提取内容")
+        return "无法从响应中提取内容"
+
+    def get_completion(self, messages, max_retries=None, initial_retry_delay=None,
+                       retry_policy=None, **kwargs):
+        """
+        获取聊天完成结果，重试遵循共享的RetryPolicy
+
+        Args:
+            messages: OpenAI格式的消息列表
+            max_retries: 覆盖策略的最多尝试次数（可选）
+            initial_retry_delay: 覆盖策略的基础延迟（可选）
+            retry_policy: 使用指定的策略代替共享策略（可选）
+        """
+        policy = (retry_policy or get_llm_retry_policy()).with_overrides(
+            max_retries, initial_retry_delay)
         try:
             logger.info(f"{WAIT_ICON} 使用 OpenAI Compatible 模型: {self.model}")
             logger.debug(f"消息内容: {messages}")
 
-            for attempt in range(max_retries):
-                try:
-                    # 调用 API
-                    response = self.call_api_with_retry(messages)
-
-                    if response is None:
-                        logger.warning(
-                            f"{ERROR_ICON} 尝试 {attempt + 1}/{max_retries}: API 返回空值")
-                        if attempt < max_retries - 1:
-                            retry_delay = initial_retry_delay * (2 ** attempt)
-                            logger.info(
-                                f"{WAIT_ICON} 等待 {retry_delay} 秒后重试...")
-                            time.sleep(retry_delay)
-                            continue
-                        return None
-
-                    # 处理不同类型的响应
-                    content = None
-
-                    # 如果响应是字典类型（某些兼容API可能直接返回字典）
-                    if isinstance(response, dict):
-                        if 'choices' in response and len(response['choices']) > 0:
-                            if 'message' in response['choices'][0] and 'content' in response['choices'][0]['message']:
-                                content = response['choices'][0]['message']['content']
-                            elif 'text' in response['choices'][0]:
-                                content = response['choices'][0]['text']
-                    # 如果响应是OpenAI标准对象
-                    elif hasattr(response, 'choices') and len(response.choices) > 0:
-                        if hasattr(response.choices[0], 'message') and hasattr(response.choices[0].message, 'content'):
-                            content = response.choices[0].message.content
-
-                    # 如果无法提取内容，尝试其他方法
-                    if content is None:
-                        if hasattr(response, 'text'):
-                            content = response.text
-                        elif hasattr(response, 'content'):
-                            content = response.content
-                        else:
-                            # 最后尝试字符串化整个响应
-                            content = str(response)
-                            logger.warning(f"{WAIT_ICON} 无法直接提取响应内容，使用字符串化响应")
-
-                    if content:
-                        logger.debug(f"API 响应内容: {content[:500]}...")
-                        logger.info(
-                            f"{SUCCESS_ICON} 成功获取 OpenAI Compatible 响应")
-                        return content
-                    else:
-                        logger.warning(f"{ERROR_ICON} 无法从响应中提取内容")
-                        if attempt < max_retries - 1:
-                            retry_delay = initial_retry_delay * (2 ** attempt)
-                            logger.info(
-                                f"{WAIT_ICON} 等待 {retry_delay} 秒后重试...")
-                            time.sleep(retry_delay)
-                            continue
-                        return "无法从响应中提取内容"
-
-                except Exception as e:
-                    logger.error(
-                        f"{ERROR_ICON} 尝试 {attempt + 1}/{max_retries} 失败: {str(e)}")
-                    if attempt < max_retries - 1:
-                        retry_delay = initial_retry_delay * (2 ** attempt)
-                        logger.info(f"{WAIT_ICON} 等待 {retry_delay} 秒后重试...")
-                        time.sleep(retry_delay)
-                    else:
-                        logger.error(f"{ERROR_ICON} 最终错误: {str(e)}")
-                        return None
+            cached = self._cached_completion(messages)
+            if cached is not None:
+                logger.info(f"{SUCCESS_ICON} 命中 LLM 响应缓存")
+                return cached
+
+            return self._content_or_warning(messages, policy.call(self.call_api, messages))
 
         except Exception as e:
             logger.error(f"{ERROR_ICON} get_completion 发生错误: {str(e)}")
             return None
 
+    async def aget_completion(self, messages, max_retries=None, initial_retry_delay=None,
+                              retry_policy=None, **kwargs):
+        """get_completion的异步版本，重试等待使用asyncio.sleep，不阻塞事件循环"""
+        policy = (retry_policy or get_llm_retry_policy()).with_overrides(
+            max_retries, initial_retry_delay)
+        try:
+            logger.info(
+                f"{WAIT_ICON} 使用 OpenAI Compatible 模型 (async): {self.model}")
+            logger.debug(f"消息内容: {messages}")
+
+            cached = self._cached_completion(messages)
+            if cached is not None:
+                logger.info(f"{SUCCESS_ICON} 命中 LLM 响应缓存")
+                return cached
+
+            return self._content_or_warning(messages, await policy.acall(self.acall_api, messages))
+
+        except Exception as e:
+            logger.error(f"{ERROR_ICON} aget_completion 发生错误: {str(e)}")
+            return None
+
 
 class LLMClientFactory:
     """LLM 客户端工厂类"""
@@ -0,0 +1,357 @@
+"""
+LLM客户端与ReAct agent注册表 - 进程内复用模型客户端和编译好的agent图
+每次分析都新建ChatOpenAI会带来新的HTTP连接池（以及TLS握手），每次新建
+create_react_agent都要重新编译图。注册表按 (模型, 温度, max_tokens, 工具集哈希)
+缓存编译好的agent，所有agent和总结器共享同一个带连接池的异步HTTP客户端。
+环境变量中的模型配置变化时自动失效，也可以调用invalidate_llm_registry()手动失效。
+"""
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from langchain_core.messages import (AIMessageChunk, message_chunk_to_message,
+                                     message_to_dict, messages_from_dict)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.outputs.chat_generation import merge_chat_generation_chunks
+from langchain_openai import ChatOpenAI
+from langgraph.prebuilt import create_react_agent
+
+from src.utils.logging_config import setup_logger, SUCCESS_ICON, WAIT_ICON
+from src.utils.execution_logger import get_execution_logger
+from src.utils.retry_policy import get_llm_retry_policy
+from src.utils.rate_limiter import get_rate_limiter, estimate_request_tokens
+from src.utils.llm_cache import get_llm_cache
+
+logger = setup_logger(__name__)
+
+# 决定模型客户端身份的环境变量
+CONFIG_ENV_VARS = ("OPENAI_COMPATIBLE_API_KEY",
+                   "OPENAI_COMPATIBLE_BASE_URL", "OPENAI_COMPATIBLE_MODEL")
+
+
+# 以下配置在使用时读取环境变量：本模块在入口调用load_dotenv之前就被导入，导入时.env还未加载
+def react_recursion_limit() -> int:
+    """
+    ReAct agent的最大步数（LangGraph recursion_limit，每轮"模型→工具"占两步），
+    超过后抛出GraphRecursionError，避免分析师在工具重试上无限循环（REACT_RECURSION_LIMIT，默认25）
+    """
+    return int(os.getenv("REACT_RECURSION_LIMIT", "25"))
+
+
+def _stream_usage_enabled() -> bool:
+    """
+    流式调用时是否请求服务端在最后一个chunk中返回用量（stream_options.include_usage），
+    不支持该参数的兼容服务可以设置LLM_STREAM_USAGE=false
+    """
+    return os.getenv("LLM_STREAM_USAGE", "true").lower() in ("1", "true", "yes")
+
+
+class ManagedChatOpenAI(ChatOpenAI):
+    """
+    使用共享RetryPolicy的ChatOpenAI
+
+    SDK内置重试被关闭（max_retries=0），每次生成只经过一层重试：
+    总时间预算、全抖动退避并遵守Retry-After。异步调用的每次尝试
+    都先经过 (API地址, 模型) 的共享限流器排队；完全相同的请求直接由
+    LLM响应缓存返回。流式调用（astream）同样经过缓存、限流和重试，
+    重试只覆盖拿到第一个chunk之前的阶段，已经输出的内容不会重复。
+    """
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        cache = get_llm_cache()
+        cache_payload = self._cache_payload(messages, stop, kwargs) if cache else None
+        if cache:
+            cached = cache.get(cache_payload)
+            if cached is not None:
+                return _chat_result_from_cache(cached)
+
+        result = await get_llm_retry_policy().acall(
+            self._rate_limited_agenerate, messages, stop=stop, run_manager=run_manager, **kwargs)
+        if cache:
+            cache.set(cache_payload, _chat_result_to_cache(result))
+        return result
+
+    def _cache_payload(self, messages, stop, kwargs) -> Dict[str, Any]:
+        """缓存键的请求内容：模型参数、消息（不含随机生成的消息id）和工具schema等请求参数"""
+        return {
+            "kind": "chat_model",
+            "base_url": self.openai_api_base,
+            "model": self.model_name,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "stop": stop,
+            "messages": [{
+                "type": m.type,
+                "content": m.content,
+                "name": getattr(m, "name", None),
+                "tool_calls": getattr(m, "tool_calls", None),
+                "tool_call_id": getattr(m, "tool_call_id", None),
+            } for m in messages],
+            "kwargs": kwargs,
+        }
+
+    async def _rate_limited_agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        limiter = get_rate_limiter(self.openai_api_base, self.model_name)
+        reserved = await limiter.acquire(
+            estimate_request_tokens(messages, kwargs.get("max_tokens", self.max_tokens)))
+        result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        usage = (result.llm_output or {}).get("token_usage") or {}
+        limiter.reconcile(reserved, usage.get("total_tokens"))
+        return result
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return get_llm_retry_policy().call(
+            super()._generate, messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        cache = get_llm_cache()
+        cache_payload = self._cache_payload(messages, stop, kwargs) if cache else None
+        if cache:
+            cached = cache.get(cache_payload)
+            if cached is not None:
+                # 缓存命中时整段内容作为一个chunk返回
+                yield _chat_chunk_from_cache(cached)
+                return
+
+        limiter = get_rate_limiter(self.openai_api_base, self.model_name)
+        stream, first, reserved = await get_llm_retry_policy().acall(
+            self._open_stream, messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        chunks = []
+        if first is not None:
+            chunks.append(first)
+            yield first
+        async for chunk in stream:
+            chunks.append(chunk)
+            yield chunk
+
+        generation = merge_chat_generation_chunks(chunks)
+        usage = getattr(generation.message, "usage_metadata", None) if generation else None
+        limiter.reconcile(reserved, usage.get("total_tokens") if usage else None)
+        if cache and generation is not None:
+            # 与非流式响应使用同一缓存条目，llm_output按非流式的格式补齐
+            token_usage = {"prompt_tokens": usage["input_tokens"],
+                           "completion_tokens": usage["output_tokens"],
+                           "total_tokens": usage["total_tokens"]} if usage else None
+            cache.set(cache_payload, _chat_result_to_cache(ChatResult(
+                generations=[ChatGeneration(message=message_chunk_to_message(generation.message),
+                                            generation_info=generation.generation_info)],
+                llm_output={"token_usage": token_usage, "model_name": self.model_name})))
+
+    async def _open_stream(self, messages, stop=None, run_manager=None, **kwargs):
+        """排队拿到限流额度后建立流式连接并读取第一个chunk"""
+        limiter = get_rate_limiter(self.openai_api_base, self.model_name)
+        reserved = await limiter.acquire(
+            estimate_request_tokens(messages, kwargs.get("max_tokens", self.max_tokens)))
+        stream = super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs)
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except BaseException:
+            await stream.aclose()
+            raise
+        return stream, first, reserved
+
+
+def _chat_result_to_cache(result: ChatResult) -> Dict[str, Any]:
+    return {
+        "generations": [{"message": message_to_dict(g.message), "generation_info": g.generation_info}
+                        for g in result.generations],
+        "llm_output": result.llm_output,
+    }
+
+
+def _chat_result_from_cache(value: Dict[str, Any]) -> ChatResult:
+    llm_output = dict(value.get("llm_output") or {})
+    llm_output["llm_cache_hit"] = True
+    return ChatResult(
+        generations=[ChatGeneration(message=messages_from_dict([g["message"]])[0],
+                                    generation_info=g.get("generation_info"))
+                     for g in value["generations"]],
+        llm_output=llm_output,
+    )
+
+
+def _chat_chunk_from_cache(value: Dict[str, Any]) -> ChatGenerationChunk:
+    message = messages_from_dict([value["generations"][0]["message"]])[0]
+    return ChatGenerationChunk(
+        message=AIMessageChunk(content=message.content,
+                               usage_metadata=getattr(message, "usage_metadata", None),
+                               response_metadata=message.response_metadata),
+        generation_info={"llm_cache_hit": True},
+    )
+
+
+class LLMRegistry:
+    """进程级的模型客户端与编译agent缓存"""
+
+    def __init__(self):
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._loop = None
+        self._config_fingerprint: Optional[str] = None
+        self._models: Dict[Tuple, ChatOpenAI] = {}
+        self._agents: Dict[Tuple, Any] = {}
+        self.stats = {"model_hits": 0, "model_misses": 0,
+                      "agent_hits": 0, "agent_misses": 0, "invalidations": 0}
+
+    @staticmethod
+    def current_config_fingerprint() -> str:
+        """当前环境变量中模型配置的指纹（API key只参与哈希，不保存明文）"""
+        values = "\0".join(os.getenv(name, "") for name in CONFIG_ENV_VARS)
+        return hashlib.sha256(values.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def toolset_hash(tools: List[Any]) -> str:
+        """工具集哈希：工具名称、描述和参数schema"""
+        payload = []
+        for tool in sorted(tools, key=lambda t: t.name):
+            schema = tool.args_schema
+            if schema is not None and not isinstance(schema, dict):
+                schema = schema.model_json_schema() if hasattr(
+                    schema, "model_json_schema") else schema.schema()
+            payload.append([tool.name, tool.description, schema])
+        return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True,
+                                         default=str).encode("utf-8")).hexdigest()[:16]
+
+    def _check_validity(self):
+        """配置变化或事件循环变化时清空缓存（httpx连接绑定在创建它的事件循环上）"""
+        fingerprint = self.current_config_fingerprint()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if self._config_fingerprint is not None and fingerprint != self._config_fingerprint:
+            logger.info(
+                f"{WAIT_ICON} LLM config changed, invalidating cached clients and agents.")
+            self.invalidate()
+        elif self._http_client is not None and loop is not None and loop is not self._loop:
+            # 旧事件循环上的连接无法复用，直接丢弃
+            self._http_client = None
+            self._models.clear()
+            self._agents.clear()
+
+        self._config_fingerprint = fingerprint
+        if loop is not None:
+            self._loop = loop
+
+    def get_http_client(self) -> httpx.AsyncClient:
+        """共享的异步HTTP客户端（带连接池）"""
+        if self._http_client is None or self._http_client.is_closed:
+            # 连接池大小与超时（秒）
+            self._http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20")),
+                    max_keepalive_connections=int(os.getenv("LLM_HTTP_KEEPALIVE_CONNECTIONS", "10"))),
+                timeout=float(os.getenv("LLM_HTTP_TIMEOUT", "600")),
+            )
+        return self._http_client
+
+    def get_chat_model(self, temperature: float, max_tokens: int) -> ChatOpenAI:
+        """
+        获取（或创建）使用环境变量配置的ChatOpenAI客户端
+
+        Args:
+            temperature: 采样温度
+            max_tokens: 最大输出token数
+
+        Returns:
+            ChatOpenAI: 共享HTTP连接池的模型客户端
+        """
+        self._check_validity()
+        model_name = os.getenv("OPENAI_COMPATIBLE_MODEL")
+        key = (model_name, temperature, max_tokens)
+        llm = self._models.get(key)
+        get_execution_logger().record_cache_access("llm_client_registry", llm is not None)
+        if llm is not None:
+            self.stats["model_hits"] += 1
+            return llm
+
+        self.stats["model_misses"] += 1
+        llm = ManagedChatOpenAI(
+            model=model_name,
+            api_key=os.getenv("OPENAI_COMPATIBLE_API_KEY"),
+            base_url=os.getenv("OPENAI_COMPATIBLE_BASE_URL"),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            http_async_client=self.get_http_client(),
+            max_retries=0,
+            stream_usage=_stream_usage_enabled(),
+        )
+        self._models[key] = llm
+        return llm
+
+    def get_react_agent(self, tools: List[Any], temperature: float, max_tokens: int):
+        """
+        获取（或编译）使用指定工具集的ReAct agent
+
+        Args:
+            tools: agent可用的工具
+            temperature: 采样温度
+            max_tokens: 最大输出token数
+
+        Returns:
+            编译好的LangGraph ReAct agent
+        """
+        llm = self.get_chat_model(temperature, max_tokens)
+        key = (llm.model_name, temperature, max_tokens, self.toolset_hash(tools))
+        agent = self._agents.get(key)
+        get_execution_logger().record_cache_access("react_agent_registry", agent is not None)
+        if agent is not None:
+            self.stats["agent_hits"] += 1
+            return agent
+
+        self.stats["agent_misses"] += 1
+        agent = create_react_agent(llm, tools)
+        self._agents[key] = agent
+        logger.info(
+            f"{SUCCESS_ICON} Compiled ReAct agent for {key[0]} with {len(tools)} tools "
+            f"(toolset {key[3]}).")
+        return agent
+
+    def invalidate(self):
+        """丢弃所有缓存的模型客户端和agent（HTTP客户端在close()中关闭）"""
+        self._models.clear()
+        self._agents.clear()
+        self.stats["invalidations"] += 1
+
+    async def close(self):
+        """关闭共享的HTTP客户端并清空缓存"""
+        self.invalidate()
+        if self._http_client is not None and not self._http_client.is_closed:
+            await self._http_client.aclose()
+        self._http_client = None
+        self._loop = None
+
+
+# 全局注册表实例
+_llm_registry = LLMRegistry()
+
+
+def get_llm_registry() -> LLMRegistry:
+    """获取全局LLM注册表"""
+    return _llm_registry
+
+
+def get_chat_model(temperature: float, max_tokens: int) -> ChatOpenAI:
+    """获取共享的ChatOpenAI客户端，见LLMRegistry.get_chat_model"""
+    return _llm_registry.get_chat_model(temperature, max_tokens)
+
+
+def get_react_agent(tools: List[Any], temperature: float, max_tokens: int):
+    """获取缓存的ReAct agent，见LLMRegistry.get_react_agent"""
+    return _llm_registry.get_react_agent(tools, temperature, max_tokens)
+
+
+def invalidate_llm_registry():
+    """手动使缓存的客户端和agent失效（例如在运行中修改了模型配置）"""
+    _llm_registry.invalidate()
+
+
+async def close_llm_registry():
+    """进程退出前关闭共享的HTTP客户端"""
+    await _llm_registry.close()
@@ -0,0 +1,64 @@
+"""
+命令行进度输出 - 把工作流的进度事件（workflow.stream_analysis）实时打印到终端
+每个节点开始和结束各打印一行（带耗时和输出字数），工具调用打印在所属节点下方，
+某个分支长时间没有结束行时可以立即看出卡在哪个节点、哪个工具上。
+"""
+import sys
+from collections import Counter
+from typing import Any, Dict, TextIO
+
+from src.utils.logging_config import SUCCESS_ICON, ERROR_ICON, WAIT_ICON
+
+# 节点在终端上显示的名称
+NODE_LABELS = {
+    "data_prefetch": "数据预取",
+    "fundamental_analyst": "基本面分析",
+    "technical_analyst": "技术面分析",
+    "value_analyst": "估值分析",
+    "summarizer": "总结报告",
+}
+
+# 节点结束状态的显示文字
+STATUS_LABELS = {
+    "completed": "完成",
+    "failed": "失败",
+    "timed_out": "超时，已取消",
+    "skipped": "已从检查点恢复",
+    "reused": "输入未变化，复用上次结果",
+}
+
+
+class ConsoleProgress:
+    """进度事件回调：在终端打印节点和工具调用的进度"""
+
+    def __init__(self, stream: TextIO = None):
+        self.stream = stream or sys.stdout
+        self.output_chars = Counter()
+        self.tool_calls = Counter()
+
+    def _print(self, elapsed: float, line: str):
+        print(f"[{elapsed:6.1f}s] {line}", file=self.stream, flush=True)
+
+    def __call__(self, event: Dict[str, Any]):
+        kind = event["type"]
+        node = event.get("node")
+        label = NODE_LABELS.get(node, node)
+
+        if kind == "node_start":
+            self._print(event["elapsed"], f"{WAIT_ICON} {label} 开始")
+        elif kind == "node_end":
+            status = event["status"]
+            icon = ERROR_ICON if status in ("failed", "timed_out") else SUCCESS_ICON
+            details = [f"{event['duration']:.1f}s"]
+            if self.tool_calls[node]:
+                details.append(f"{self.tool_calls[node]} 次工具调用")
+            if self.output_chars[node]:
+                details.append(f"输出 {self.output_chars[node]} 字")
+            self._print(event["elapsed"],
+                        f"{icon} {label} {STATUS_LABELS.get(status, status)} ({', '.join(details)})")
+        elif kind == "tool_start":
+            self.tool_calls[node] += 1
+            self._print(event["elapsed"], f"   ↳ {label} 调用工具 {event['tool']}")
+        elif kind == "token":
+            # token逐条打印会和并行分支交错，这里只统计字数，节点结束时汇总
+            self.output_chars[node] += len(event["text"])
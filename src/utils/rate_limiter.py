@@ -0,0 +1,173 @@
+"""
+LLM请求限流 - 按 (API地址, 模型) 的令牌桶，同时限制每分钟请求数(RPM)和每分钟token数(TPM)
+批量分析时三个并行的ReAct agent加上总结器很容易超过服务商的RPM/TPM限制，
+触发429后又进入重试等待。限流器让请求在本地按到达顺序排队，吞吐量保持在限额附近，
+而不是先失败再退避。请求前按提示词估算token，拿到响应后按实际用量校正。
+"""
+import asyncio
+import os
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from src.utils.logging_config import setup_logger, WAIT_ICON
+from src.utils.execution_logger import get_execution_logger
+
+logger = setup_logger(__name__)
+
+# 非中日韩字符估算时每个token对应的字符数；中日韩字符按每字一个token估算
+CHARS_PER_TOKEN = 4
+
+# 每条消息的格式开销（角色标记等）
+TOKENS_PER_MESSAGE = 4
+
+
+def estimate_text_tokens(text: str) -> int:
+    """粗略估算文本的token数量"""
+    cjk = sum(1 for ch in text if "\u3400" <= ch <= "\u9fff" or "\uf900" <= ch <= "\ufaff")
+    return cjk + (len(text) - cjk + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _message_text(message: Any) -> str:
+    content = message.get("content") if isinstance(message, dict) else getattr(message, "content", "")
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") if isinstance(part, dict) else str(part)
+                        for part in content)
+    return str(content or "")
+
+
+def estimate_request_tokens(messages: Iterable[Any], max_tokens: Optional[int] = None) -> int:
+    """估算一次请求计入TPM的token数：提示词 + 最大输出token数（与服务商的计数方式一致）"""
+    prompt_tokens = sum(estimate_text_tokens(_message_text(m)) + TOKENS_PER_MESSAGE
+                        for m in messages)
+    return prompt_tokens + (max_tokens or 0)
+
+
+class TokenBucket:
+    """按分钟额度匀速补充的令牌桶，允许因实际用量超出估算而短暂透支"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """拿到amount个令牌还需等待的秒数"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        """按实际用量校正：amount为正时退回多扣的令牌，为负时补扣"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """单个 (API地址, 模型) 的RPM + TPM限流器，等待的请求按到达顺序（FIFO）放行"""
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, name: str = "llm"):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop = None
+        self.stats = {"requests": 0, "throttled": 0, "wait_seconds": 0.0,
+                      "max_wait_seconds": 0.0, "estimated_tokens": 0, "actual_tokens": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    async def acquire(self, estimated_tokens: int = 0) -> int:
+        """
+        等待直到RPM和TPM都有余量，然后扣除一个请求和estimated_tokens个token
+
+        asyncio.Lock按获取顺序唤醒等待者，排在前面的请求拿到额度之前后面的请求不会插队。
+
+        Returns:
+            int: 实际预扣的token数，用于之后的reconcile
+        """
+        self.stats["requests"] += 1
+        if not self.enabled:
+            return 0
+
+        start = time.monotonic()
+        async with self._get_lock():
+            while True:
+                wait = max(
+                    self.requests.wait_time(1) if self.requests else 0.0,
+                    self.tokens.wait_time(estimated_tokens) if self.tokens else 0.0)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.requests:
+                self.requests.consume(1)
+            if self.tokens:
+                self.tokens.consume(estimated_tokens)
+
+        waited = time.monotonic() - start
+        if waited > 0.01:
+            self.stats["throttled"] += 1
+            logger.info(f"{WAIT_ICON} [{self.name}] rate limited, waited {waited:.2f}s")
+        self.stats["wait_seconds"] += waited
+        self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+        self.stats["estimated_tokens"] += estimated_tokens
+        get_execution_logger().log_component_stats(f"rate_limiter.{self.name}", self.stats)
+        return estimated_tokens
+
+    def reconcile(self, reserved_tokens: int, actual_tokens: Optional[int]):
+        """用服务端返回的实际用量校正TPM令牌桶"""
+        if actual_tokens is None:
+            return
+        self.stats["actual_tokens"] += actual_tokens
+        if self.tokens:
+            self.tokens.refund(reserved_tokens - actual_tokens)
+
+
+# 全局限流器表：(base_url, model) -> RateLimiter
+_rate_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+
+
+def get_rate_limiter(base_url: Optional[str], model: Optional[str]) -> RateLimiter:
+    """
+    获取 (API地址, 模型) 对应的共享限流器
+
+    额度在首次创建时从环境变量读取：LLM_RATE_LIMIT_RPM、LLM_RATE_LIMIT_TPM，0或未设置表示不限制
+    """
+    key = (base_url or "", model or "")
+    limiter = _rate_limiters.get(key)
+    if limiter is None:
+        limiter = RateLimiter(float(os.getenv("LLM_RATE_LIMIT_RPM", "0")),
+                              float(os.getenv("LLM_RATE_LIMIT_TPM", "0")),
+                              name=f"{key[1]}@{key[0]}")
+        _rate_limiters[key] = limiter
+    return limiter
+
+
+def get_rate_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """所有限流器的统计"""
+    return {limiter.name: dict(limiter.stats) for limiter in _rate_limiters.values()}
+
+
+def reset_rate_limiters():
+    """清空限流器（配置变化后或测试中使用）"""
+    _rate_limiters.clear()
@@ -0,0 +1,207 @@
+"""
+统一的LLM重试策略 - 单层重试，带总时间预算
+原来的SDK重试、backoff装饰器和get_completion中的手动重试循环层层叠加，
+一次失败的请求可能重试几十次、阻塞数分钟。所有LLM调用路径改为共享一个策略：
+总时间预算、指数退避加全抖动（full jitter）、只重试可恢复的错误（429/5xx/超时/连接错误），
+并遵守服务端返回的Retry-After。重试次数和损失的时间记录到执行日志。
+"""
+import asyncio
+import email.utils
+import os
+import random
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Optional
+
+from src.utils.logging_config import setup_logger, ERROR_ICON, WAIT_ICON
+from src.utils.execution_logger import get_execution_logger
+
+logger = setup_logger(__name__)
+
+# 可重试的HTTP状态码
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+
+# 按异常类名识别的超时/连接错误（openai、httpx、google-genai等SDK）
+RETRYABLE_EXCEPTION_NAMES = {
+    "APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError",
+    "TimeoutException", "ConnectTimeout", "ReadTimeout", "WriteTimeout", "PoolTimeout",
+    "ConnectError", "ReadError", "RemoteProtocolError", "ServerError",
+}
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    """从异常中提取HTTP状态码（openai的status_code、genai的code或response.status_code）"""
+    for attr in ("status_code", "code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    """判断错误是否值得重试：限流、服务端错误、超时和连接错误"""
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    if type(exc).__name__ in RETRYABLE_EXCEPTION_NAMES:
+        return True
+    # Gemini自动函数调用(AFC)限流时只返回消息文本
+    return "AFC is enabled" in str(exc)
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """读取响应头中的Retry-After（秒数或HTTP日期），没有时返回None"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return max(0.0, float(value) / 1000)
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+    except Exception:
+        return None
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    单层重试策略
+
+    Attributes:
+        max_attempts: 最多尝试次数（包含第一次）
+        total_budget: 从第一次尝试开始的总时间预算（秒），下一次等待会超出预算时放弃
+        base_delay: 指数退避的基础延迟（秒）
+        max_delay: 单次等待的上限（秒）
+        name: 策略名称，用于日志和统计
+    """
+    max_attempts: int = 4
+    total_budget: float = 120.0
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    name: str = "llm"
+
+    @classmethod
+    def from_env(cls, name: str = "llm") -> "RetryPolicy":
+        """从LLM_RETRY_*环境变量创建策略"""
+        return cls(
+            max_attempts=int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "4")),
+            total_budget=float(os.getenv("LLM_RETRY_BUDGET_SECONDS", "120")),
+            base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "1")),
+            max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", "30")),
+            name=name,
+        )
+
+    def with_overrides(self, max_attempts: Optional[int] = None,
+                       base_delay: Optional[float] = None) -> "RetryPolicy":
+        """返回覆盖了部分参数的新策略（兼容旧的max_retries/initial_retry_delay参数）"""
+        changes = {}
+        if max_attempts is not None:
+            changes["max_attempts"] = max(1, int(max_attempts))
+        if base_delay is not None:
+            changes["base_delay"] = float(base_delay)
+        return replace(self, **changes) if changes else self
+
+    def compute_delay(self, attempt: int, exc: BaseException) -> float:
+        """第attempt次失败（从0开始）后的等待时间：Retry-After优先，否则全抖动指数退避"""
+        server_delay = retry_after_seconds(exc)
+        if server_delay is not None:
+            return server_delay
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def _next_delay(self, attempt: int, exc: BaseException, started: float) -> Optional[float]:
+        """返回下一次重试前的等待时间；不应重试时返回None"""
+        if attempt + 1 >= self.max_attempts or not is_retryable_error(exc):
+            return None
+        delay = self.compute_delay(attempt, exc)
+        if time.monotonic() - started + delay > self.total_budget:
+            logger.warning(
+                f"{ERROR_ICON} [{self.name}] retry budget of {self.total_budget:.0f}s exhausted")
+            return None
+        return delay
+
+    def _record(self, retries: int, time_lost: float, success: bool):
+        get_execution_logger().record_retry(self.name, retries, time_lost, success)
+
+    async def acall(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """按策略执行协程函数，失败时异步等待后重试，最终失败时抛出最后一个异常"""
+        started = time.monotonic()
+        time_lost = 0.0
+        attempt = 0
+        while True:
+            attempt_start = time.monotonic()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                delay = self._next_delay(attempt, e, started)
+                time_lost += time.monotonic() - attempt_start
+                if delay is None:
+                    self._record(attempt, time_lost, False)
+                    raise
+                logger.warning(
+                    f"{WAIT_ICON} [{self.name}] attempt {attempt + 1}/{self.max_attempts} failed: {e}; "
+                    f"retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                time_lost += delay
+                attempt += 1
+                continue
+            if attempt:
+                self._record(attempt, time_lost, True)
+            return result
+
+    def call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """acall的同步版本，用于同步客户端"""
+        started = time.monotonic()
+        time_lost = 0.0
+        attempt = 0
+        while True:
+            attempt_start = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                delay = self._next_delay(attempt, e, started)
+                time_lost += time.monotonic() - attempt_start
+                if delay is None:
+                    self._record(attempt, time_lost, False)
+                    raise
+                logger.warning(
+                    f"{WAIT_ICON} [{self.name}] attempt {attempt + 1}/{self.max_attempts} failed: {e}; "
+                    f"retrying in {delay:.1f}s")
+                time.sleep(delay)
+                time_lost += delay
+                attempt += 1
+                continue
+            if attempt:
+                self._record(attempt, time_lost, True)
+            return result
+
+
+# 所有LLM调用路径共享的默认策略
+_llm_retry_policy: Optional[RetryPolicy] = None
+
+
+def get_llm_retry_policy() -> RetryPolicy:
+    """获取共享的LLM重试策略（首次调用时从环境变量创建）"""
+    global _llm_retry_policy
+    if _llm_retry_policy is None:
+        _llm_retry_policy = RetryPolicy.from_env()
+    return _llm_retry_policy
+
+
+def set_llm_retry_policy(policy: Optional[RetryPolicy]):
+    """替换共享的LLM重试策略，传入None时下次调用重新从环境变量创建"""
+    global _llm_retry_policy
+    _llm_retry_policy = policy
@@ -0,0 +1,171 @@
+"""
+Token用量与成本统计 - 通过LangChain回调收集每次模型调用的真实用量
+记录提示词/输出/缓存命中的token数、延迟和首token时间，按agent、模型和整次运行汇总到
+execution_info.json；配置价格表后同时计算费用。
+价格表通过LLM_PRICE_TABLE（JSON字符串）或LLM_PRICE_TABLE_FILE（JSON文件路径）配置，
+单位为每百万token的价格，例如：
+    {"gpt-4o": {"input": 2.5, "cached_input": 1.25, "output": 10.0}}
+"""
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from src.utils.logging_config import setup_logger
+from src.utils.execution_logger import get_execution_logger
+
+logger = setup_logger(__name__)
+
+_price_table: Optional[Dict[str, Dict[str, float]]] = None
+
+
+def load_price_table() -> Dict[str, Dict[str, float]]:
+    """加载价格表（首次调用时读取环境变量），未配置时返回空表"""
+    global _price_table
+    if _price_table is None:
+        _price_table = {}
+        try:
+            price_file = os.getenv("LLM_PRICE_TABLE_FILE")
+            if price_file:
+                with open(price_file, "r", encoding="utf-8") as f:
+                    _price_table = json.load(f)
+            elif os.getenv("LLM_PRICE_TABLE"):
+                _price_table = json.loads(os.getenv("LLM_PRICE_TABLE"))
+        except Exception as e:
+            logger.warning(f"Failed to load LLM price table: {e}")
+            _price_table = {}
+    return _price_table
+
+
+def reset_price_table():
+    """丢弃已加载的价格表，下次使用时重新读取配置"""
+    global _price_table
+    _price_table = None
+
+
+def compute_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int,
+                 cached_tokens: int = 0) -> Optional[float]:
+    """
+    按价格表计算一次调用的费用
+
+    Returns:
+        float: 费用；价格表中没有该模型时返回None
+    """
+    prices = load_price_table().get(model or "")
+    if prices is None:
+        return None
+    input_price = prices.get("input", 0.0)
+    cached_price = prices.get("cached_input", input_price)
+    output_price = prices.get("output", 0.0)
+    uncached = max(prompt_tokens - cached_tokens, 0)
+    return (uncached * input_price + cached_tokens * cached_price
+            + completion_tokens * output_price) / 1_000_000
+
+
+def extract_usage(response: LLMResult) -> Dict[str, Any]:
+    """从模型返回中提取用量：优先使用消息上的usage_metadata，其次使用llm_output中的token_usage"""
+    llm_output = response.llm_output or {}
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0,
+             "model": llm_output.get("model_name")}
+
+    found = False
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            metadata = getattr(message, "usage_metadata", None)
+            if metadata:
+                found = True
+                usage["prompt_tokens"] += metadata.get("input_tokens", 0) or 0
+                usage["completion_tokens"] += metadata.get("output_tokens", 0) or 0
+                details = metadata.get("input_token_details") or {}
+                usage["cached_tokens"] += details.get("cache_read", 0) or 0
+            if message is not None and not usage["model"]:
+                usage["model"] = (getattr(message, "response_metadata", None) or {}).get("model_name")
+
+    if not found:
+        token_usage = llm_output.get("token_usage") or {}
+        usage["prompt_tokens"] = token_usage.get("prompt_tokens", 0) or 0
+        usage["completion_tokens"] = token_usage.get("completion_tokens", 0) or 0
+        details = token_usage.get("prompt_tokens_details") or {}
+        usage["cached_tokens"] = details.get("cached_tokens", 0) or 0
+    return usage
+
+
+def is_llm_cache_hit(response: LLMResult) -> bool:
+    """响应是否来自LLM响应缓存（非流式标记在llm_output，流式标记在chunk的generation_info）"""
+    if (response.llm_output or {}).get("llm_cache_hit"):
+        return True
+    return any((generation.generation_info or {}).get("llm_cache_hit")
+               for generations in response.generations for generation in generations)
+
+
+class UsageCallbackHandler(AsyncCallbackHandler):
+    """
+    收集一个agent所有模型调用（包括ReAct循环中的每一步）的用量
+
+    用法：
+        handler = UsageCallbackHandler("technical_agent")
+        await agent.ainvoke(inputs, config={"callbacks": [handler]})
+        handler.totals  # 本agent的用量汇总，可传给log_llm_interaction的token_usage
+    """
+
+    def __init__(self, agent_name: str):
+        self.agent_name = agent_name
+        self._runs: Dict[UUID, Dict[str, Optional[float]]] = {}
+        self.totals = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                       "cached_tokens": 0, "total_tokens": 0, "llm_cache_hits": 0,
+                       "latency_seconds": 0.0, "cost": None}
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs):
+        self._runs[run_id] = {"start": time.monotonic(), "first_token": None}
+
+    async def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs):
+        self._runs[run_id] = {"start": time.monotonic(), "first_token": None}
+
+    async def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and run["first_token"] is None:
+            run["first_token"] = time.monotonic()
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._runs.pop(run_id, None)
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs):
+        run = self._runs.pop(run_id, None) or {"start": time.monotonic(), "first_token": None}
+        now = time.monotonic()
+        latency = now - run["start"]
+        # 非流式调用拿到完整响应时才有第一个token
+        first_token = (run["first_token"] or now) - run["start"]
+
+        usage = extract_usage(response)
+        cache_hit = is_llm_cache_hit(response)
+        cost = None if cache_hit else compute_cost(
+            usage["model"], usage["prompt_tokens"], usage["completion_tokens"], usage["cached_tokens"])
+
+        self.totals["calls"] += 1
+        self.totals["latency_seconds"] += latency
+        if cache_hit:
+            # 命中LLM响应缓存的调用没有消耗token
+            self.totals["llm_cache_hits"] += 1
+        else:
+            for field in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+                self.totals[field] += usage[field]
+            self.totals["total_tokens"] += usage["prompt_tokens"] + usage["completion_tokens"]
+            if cost is not None:
+                self.totals["cost"] = (self.totals["cost"] or 0.0) + cost
+
+        get_execution_logger().record_token_usage(
+            agent_name=self.agent_name,
+            model=usage["model"] or "unknown",
+            prompt_tokens=0 if cache_hit else usage["prompt_tokens"],
+            completion_tokens=0 if cache_hit else usage["completion_tokens"],
+            cached_tokens=0 if cache_hit else usage["cached_tokens"],
+            latency=latency,
+            first_token_latency=first_token,
+            cost=cost,
+            llm_cache_hit=cache_hit,
+        )
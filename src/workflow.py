@@ -0,0 +1,439 @@
+"""
+分析工作流 - 构建LangGraph图并根据用户查询生成初始状态
+命令行单次分析和批量分析共用这里的函数：图只编译一次，各次分析通过ainvoke并发执行。
+编译时传入检查点存储后，每个节点的输出都会持久化，失败的运行可以用resume_analysis恢复。
+分析师节点的结果按输入数据指纹保存，增量模式下输入未变化的分析师直接复用上次的结果。
+传入on_event回调时通过astream_events驱动工作流，节点开始/结束、工具调用和token流实时回调。
+分析师节点有截止时间，超时的分支被取消并返回标记为部分结果或不可用的分析；
+预取节点在内部按自己的截止时间取消未完成的请求（见prefetch_agent）。
+"""
+import asyncio
+import re
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from langgraph.graph import StateGraph, END
+
+from src.utils.logging_config import setup_logger, SUCCESS_ICON, ERROR_ICON, WAIT_ICON
+from src.utils.execution_logger import get_execution_logger
+from src.utils.state_definition import AgentState
+from src.utils.incremental import analysis_fingerprint, get_analysis_store, is_incremental_mode
+from src.utils.deadlines import get_node_deadline, PartialResultCollector, partial_result_collector
+from src.agents.summary_agent import summary_agent
+from src.agents.value_agent import value_agent
+from src.agents.technical_agent import technical_agent
+from src.agents.fundamental_agent import fundamental_agent
+from src.agents.prefetch_agent import prefetch_agent
+
+logger = setup_logger(__name__)
+
+# 各节点完成后写入data的结果键和失败时的错误键。
+# 结果存在且没有错误的节点视为已完成，恢复运行时直接跳过。
+NODE_OUTPUTS = {
+    "data_prefetch": ("prefetched", None),
+    "fundamental_analyst": ("fundamental_analysis", "fundamental_analysis_error"),
+    "technical_analyst": ("technical_analysis", "technical_analysis_error"),
+    "value_analyst": ("value_analysis", "value_analysis_error"),
+    "summarizer": ("final_report", "summary_error"),
+}
+
+ANALYST_NODES = ("fundamental_analyst", "technical_analyst", "value_analyst")
+
+# 分析师节点对应的智能体名称（prefetch_agent.ANALYST_SECTIONS中声明了各自依赖的数据块）
+ANALYST_AGENTS = {
+    "fundamental_analyst": "fundamental_agent",
+    "technical_analyst": "technical_agent",
+    "value_analyst": "value_agent",
+}
+
+
+def node_completed(node_name: str, data: Dict[str, Any]) -> bool:
+    """节点的结果是否已经在状态中（且没有失败）"""
+    output_key, error_key = NODE_OUTPUTS[node_name]
+    return bool(data.get(output_key)) and not (error_key and data.get(error_key))
+
+
+def _skip_completed(node_name: str, node: Callable) -> Callable:
+    """包装节点：状态中已有该节点的有效结果时不再执行"""
+    async def run(state: AgentState) -> Dict[str, Any]:
+        if node_completed(node_name, state.get("data", {})):
+            logger.info(f"{SUCCESS_ICON} Skipping {node_name}: result restored from checkpoint")
+            get_execution_logger().log_component_stats(
+                f"checkpoint.{node_name}", {"skipped": True})
+            return {"metadata": {f"{node_name}_skipped": True}}
+        return await node(state)
+
+    run.__name__ = getattr(node, "__name__", node_name)
+    return run
+
+
+def _reuse_unchanged(node_name: str, node: Callable) -> Callable:
+    """
+    包装分析师节点：增量模式下输入数据指纹与上次相同时复用保存的分析结果
+
+    无论是否开启增量模式，成功的分析都会按指纹保存，作为下一次增量运行的基准。
+    """
+    agent_name = ANALYST_AGENTS[node_name]
+    output_key, error_key = NODE_OUTPUTS[node_name]
+
+    async def run(state: AgentState) -> Dict[str, Any]:
+        data = state.get("data", {})
+        stock_code = data.get("stock_code")
+        fingerprint = analysis_fingerprint(agent_name, data) if stock_code else None
+        store = get_analysis_store() if fingerprint else None
+
+        if fingerprint and is_incremental_mode():
+            record = store.load(stock_code, agent_name, fingerprint)
+            execution_logger = get_execution_logger()
+            execution_logger.record_cache_access("incremental_analysis", record is not None,
+                                                 key=f"{stock_code}/{agent_name}")
+            if record:
+                logger.info(f"{SUCCESS_ICON} Reusing {node_name} result from "
+                            f"{record['created_at']}: inputs unchanged")
+                execution_logger.log_component_stats(
+                    f"incremental.{node_name}",
+                    {"reused": True, "created_at": record["created_at"]})
+                return {"data": {output_key: record["analysis"],
+                                 f"{output_key}_reused_from": record["created_at"]}}
+
+        result = await node(state)
+        new_data = (result or {}).get("data", {})
+        if fingerprint and new_data.get(output_key) and not new_data.get(error_key):
+            store.save(stock_code, agent_name, fingerprint, new_data[output_key])
+        return result
+
+    run.__name__ = getattr(node, "__name__", node_name)
+    return run
+
+
+def _with_deadline(node_name: str, node: Callable) -> Callable:
+    """
+    包装分析师节点：超过截止时间后取消节点，返回标记为部分结果或不可用的分析
+
+    超时的节点会写入错误键，恢复运行（--resume）时会重新执行；超时事件记录到执行日志。
+    """
+    output_key, error_key = NODE_OUTPUTS[node_name]
+
+    async def run(state: AgentState) -> Dict[str, Any]:
+        deadline = get_node_deadline(node_name)
+        if deadline is None:
+            return await node(state)
+
+        collector = PartialResultCollector()
+        token = partial_result_collector.set(collector)
+        start_time = time.time()
+        try:
+            return await asyncio.wait_for(node(state), timeout=deadline)
+        except asyncio.TimeoutError:
+            elapsed = time.time() - start_time
+        finally:
+            partial_result_collector.reset(token)
+
+        partial = collector.has_partial
+        logger.warning(f"{ERROR_ICON} {node_name} exceeded its {deadline:g}s deadline and was cancelled "
+                       f"({len(collector.tool_results)} tool call(s) completed)")
+        get_execution_logger().log_timeout(node_name, deadline, elapsed, partial,
+                                           {"tool_calls": len(collector.tool_results)})
+        if partial:
+            analysis = (f"【部分结果】该分析未能在{deadline:g}秒内完成，已被取消。"
+                        f"以下是超时前获取的信息，结论可能不完整：\n\n{collector.render()}")
+        else:
+            analysis = f"【结果不可用】该分析未能在{deadline:g}秒内完成，已被取消。"
+        return {
+            "data": {
+                output_key: analysis,
+                error_key: f"Timed out after {deadline:g}s" + (" (partial result)" if partial else ""),
+            },
+            "metadata": {f"{node_name}_timed_out": True},
+        }
+
+    run.__name__ = getattr(node, "__name__", node_name)
+    return run
+
+
+def build_workflow(checkpointer=None):
+    """
+    构建并编译分析工作流
+    批量模式下所有股票共用同一个编译好的图，MCP会话池和LLM客户端也在进程内共享
+
+    Args:
+        checkpointer: LangGraph检查点存储（如FileCheckpointSaver），为None时不保存检查点
+    """
+    workflow = StateGraph(AgentState)
+
+    # Add a simple pass-through node to act as a clear starting point for parallel branches
+    workflow.add_node("start_node", lambda state: state)
+
+    # Deterministic data prefetch ahead of the analysts
+    workflow.add_node("data_prefetch", _skip_completed("data_prefetch", prefetch_agent))
+
+    # Add agent nodes
+    for node_name, agent in (("fundamental_analyst", fundamental_agent),
+                             ("technical_analyst", technical_agent),
+                             ("value_analyst", value_agent)):
+        workflow.add_node(node_name, _skip_completed(
+            node_name, _reuse_unchanged(node_name, _with_deadline(node_name, agent))))
+    workflow.add_node("summarizer", _skip_completed("summarizer", summary_agent))
+
+    # Set the entry point
+    workflow.set_entry_point("start_node")
+
+    # Prefetch the standard data bundle once, then fan out to the analysts
+    workflow.add_edge("start_node", "data_prefetch")
+
+    # Edges for parallel execution of fundamental, technical, and value agents
+    workflow.add_edge("data_prefetch", "fundamental_analyst")
+    workflow.add_edge("data_prefetch", "technical_analyst")
+    workflow.add_edge("data_prefetch", "value_analyst")
+
+    # Edges to converge the outputs into the summary agent
+    # LangGraph will ensure "summarizer" waits for all its direct predecessors.
+    workflow.add_edge("fundamental_analyst", "summarizer")
+    workflow.add_edge("technical_analyst", "summarizer")
+    workflow.add_edge("value_analyst", "summarizer")
+
+    # Edge from the summary agent to the end of the workflow
+    workflow.add_edge("summarizer", END)
+
+    # Compile the workflow
+    return workflow.compile(checkpointer=checkpointer)
+
+
+def build_initial_state(user_query: str) -> AgentState:
+    """从查询中提取股票代码和公司名称并附上当前时间信息，生成工作流的初始状态"""
+    # 从查询中提取股票代码和公司名称
+    stock_code = None
+    company_name = None
+
+    # 简单的提取逻辑 - 假设查询格式为"分析[公司名称]"或包含股票代码
+    if "分析" in user_query:
+        # 尝试提取公司名称
+        parts = user_query.split("分析")
+        if len(parts) > 1 and parts[1].strip():
+            company_name = parts[1].strip()
+
+            # 如果公司名称包含股票代码（如括号内的数字），则提取
+            code_match = re.search(r'[（(](\d{6})[)）]', company_name)
+            if code_match:
+                stock_code = code_match.group(1)
+                # 从公司名称中移除股票代码部分
+                company_name = re.sub(
+                    r'[（(]\d{6}[)）]', '', company_name).strip()
+
+    # 如果未提取到股票代码但查询中包含6位数字，则可能是股票代码
+    if not stock_code:
+        code_match = re.search(r'\b(\d{6})\b', user_query)
+        if code_match:
+            stock_code = code_match.group(1)
+
+    # 记录提取结果
+    logger.info(f"从查询中提取 - 公司名称: {company_name}, 股票代码: {stock_code}")
+
+    # 获取当前时间信息
+    current_datetime = datetime.now()
+    current_date_cn = current_datetime.strftime("%Y年%m月%d日")
+    current_date_en = current_datetime.strftime("%Y-%m-%d")
+    current_weekday_cn = ["星期一", "星期二", "星期三", "星期四",
+                          "星期五", "星期六", "星期日"][current_datetime.weekday()]
+    current_time = current_datetime.strftime("%H:%M:%S")
+
+    # 格式化完整的时间信息
+    current_time_info = f"{current_date_cn} ({current_date_en}) {current_weekday_cn} {current_time}"
+
+    logger.info(f"当前时间: {current_time_info}")
+
+    # 准备初始状态
+    initial_data = {
+        "query": user_query,
+        "current_date": current_date_en,
+        "current_date_cn": current_date_cn,
+        "current_time": current_time,
+        "current_weekday_cn": current_weekday_cn,
+        "current_time_info": current_time_info,
+        "analysis_timestamp": current_datetime.isoformat()
+    }
+    if company_name:
+        initial_data["company_name"] = company_name
+    if stock_code:
+        # 添加股票代码前缀（上交所或深交所）
+        if stock_code.startswith('6'):
+            initial_data["stock_code"] = f"sh.{stock_code}"
+        elif stock_code.startswith('0') or stock_code.startswith('3'):
+            initial_data["stock_code"] = f"sz.{stock_code}"
+        else:
+            initial_data["stock_code"] = stock_code
+
+    # Prepare the initial state for the workflow
+    initial_state = AgentState(
+        messages=[],  # Langchain convention
+        data=initial_data,  # Application-specific data with extracted info
+        metadata={}  # For any other run-specific info
+    )
+    return initial_state
+
+
+def _thread_config(thread_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    return {"configurable": {"thread_id": thread_id}} if thread_id else None
+
+
+def _node_status(node_name: str, output: Any) -> str:
+    """根据节点的返回值判断节点结果：completed / failed / timed_out / skipped / reused"""
+    if not isinstance(output, dict):
+        return "completed"
+    metadata = output.get("metadata") or {}
+    if metadata.get(f"{node_name}_skipped"):
+        return "skipped"
+    if metadata.get(f"{node_name}_timed_out"):
+        return "timed_out"
+    output_key, error_key = NODE_OUTPUTS[node_name]
+    data = output.get("data") or {}
+    if error_key and data.get(error_key):
+        return "failed"
+    if data.get(f"{output_key}_reused_from"):
+        return "reused"
+    return "completed"
+
+
+async def stream_analysis(app, graph_input: Any, config: Optional[Dict[str, Any]],
+                          on_event: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+    """
+    通过astream_events执行工作流，把LangGraph事件转换为进度事件回调给on_event
+
+    进度事件（均包含type和从开始运行算起的elapsed秒数）：
+        node_start  {"node"}
+        node_end    {"node", "status", "duration"}（status见_node_status）
+        tool_start  {"node", "tool"}
+        tool_end    {"node", "tool", "duration"}
+        token       {"node", "text"}
+
+    Args:
+        app: build_workflow()编译好的工作流
+        graph_input: 初始状态，从检查点继续时为None
+        config: 工作流配置（thread_id等）
+        on_event: 进度事件回调，不能阻塞
+
+    Returns:
+        Dict[str, Any]: 工作流的最终状态
+    """
+    start_time = time.time()
+    run_started: Dict[str, float] = {}
+    final_state = None
+
+    async for event in app.astream_events(graph_input, config=config, version="v2"):
+        kind = event["event"]
+        name = event.get("name")
+        node = (event.get("metadata") or {}).get("langgraph_node")
+        now = time.time()
+        progress = None
+
+        if kind in ("on_chain_start", "on_chain_end") and name in NODE_OUTPUTS and node == name:
+            if kind == "on_chain_start":
+                run_started[event["run_id"]] = now
+                progress = {"type": "node_start", "node": node}
+            else:
+                duration = now - run_started.pop(event["run_id"], now)
+                progress = {"type": "node_end", "node": node,
+                            "status": _node_status(node, event["data"].get("output")),
+                            "duration": round(duration, 3)}
+        elif kind == "on_tool_start":
+            run_started[event["run_id"]] = now
+            progress = {"type": "tool_start", "node": node, "tool": name}
+        elif kind == "on_tool_end":
+            duration = now - run_started.pop(event["run_id"], now)
+            progress = {"type": "tool_end", "node": node, "tool": name,
+                        "duration": round(duration, 3)}
+        elif kind == "on_chat_model_stream":
+            text = getattr(event["data"].get("chunk"), "content", None)
+            if text and isinstance(text, str):
+                progress = {"type": "token", "node": node, "text": text}
+        elif kind == "on_chain_end" and not event.get("parent_ids"):
+            final_state = event["data"].get("output")
+
+        if progress is not None:
+            progress["elapsed"] = round(now - start_time, 3)
+            on_event(progress)
+
+    return final_state
+
+
+async def run_analysis(app, user_query: str, thread_id: Optional[str] = None,
+                       on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    对一条查询执行完整的分析工作流
+
+    Args:
+        app: build_workflow()编译好的工作流
+        user_query: 用户的分析需求
+        thread_id: 检查点的thread_id（使用执行ID），工作流带检查点时必须提供
+        on_event: 进度事件回调（见stream_analysis），为None时直接ainvoke
+
+    Returns:
+        Dict[str, Any]: 工作流的最终状态
+    """
+    initial_state = build_initial_state(user_query)
+    config = _thread_config(thread_id)
+    if on_event is not None:
+        return await stream_analysis(app, initial_state, config, on_event)
+    return await app.ainvoke(initial_state, config=config)
+
+
+def failed_nodes(data: Dict[str, Any]) -> List[str]:
+    """
+    从最终状态中找出需要重新运行的节点
+
+    任一分析师需要重跑时总结也要重跑，新的报告才会包含它的结果。
+    """
+    failed = [name for name in NODE_OUTPUTS if not node_completed(name, data)]
+    if any(name in failed for name in ANALYST_NODES) and "summarizer" not in failed:
+        failed.append("summarizer")
+    return failed
+
+
+async def resume_analysis(app, thread_id: str,
+                          on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    从检查点恢复一次分析
+
+    - 运行中途中断（进程退出或节点抛出异常）：从中断处继续，同一步中已完成的节点不重跑
+    - 运行已结束但有节点失败（例如总结超时）：清除失败节点的结果后重新走一遍图，
+      已完成的节点由_skip_completed直接跳过，只有失败的节点真正执行
+
+    Args:
+        app: 带检查点存储编译的工作流
+        thread_id: 要恢复的执行ID
+        on_event: 进度事件回调（见stream_analysis）
+
+    Returns:
+        Dict[str, Any]: 工作流的最终状态
+    """
+    config = _thread_config(thread_id)
+
+    async def continue_run():
+        if on_event is not None:
+            return await stream_analysis(app, None, config, on_event)
+        return await app.ainvoke(None, config=config)
+
+    snapshot = await app.aget_state(config)
+    if not snapshot.values:
+        raise ValueError(f"No checkpoint found for execution {thread_id}")
+
+    if snapshot.next:
+        logger.info(f"{WAIT_ICON} Resuming execution {thread_id} at {list(snapshot.next)}")
+        return await continue_run()
+
+    data = snapshot.values.get("data", {})
+    to_rerun = failed_nodes(data)
+    if not to_rerun:
+        logger.info(f"{SUCCESS_ICON} Execution {thread_id} already completed, nothing to resume")
+        return snapshot.values
+
+    logger.info(f"{WAIT_ICON} Resuming execution {thread_id}, re-running {to_rerun}")
+    cleared = {}
+    for name in to_rerun:
+        output_key, error_key = NODE_OUTPUTS[name]
+        cleared[output_key] = None
+        if error_key:
+            cleared[error_key] = None
+    await app.aupdate_state(config, {"data": cleared}, as_node="start_node")
+    return await continue_run()
@@ -0,0 +1,135 @@
+import asyncio
+import time
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from src.agents.prefetch_agent import (
+    prefetch_agent, recent_quarters, build_prefetch_requests, format_prefetched_data)
+from src.utils.state_definition import AgentState
+
+
+def test_recent_quarters_counts_back_from_last_completed_quarter():
+    assert recent_quarters("2025-05-20", 3) == [(2025, 1), (2024, 4), (2024, 3)]
+    assert recent_quarters("2025-01-02", 2) == [(2024, 4), (2024, 3)]
+
+
+def test_build_prefetch_requests_covers_standard_bundle():
+    requests = build_prefetch_requests("sh.600519", "2025-05-20")
+    tools = [tool_name for _, tool_name, _ in requests]
+
+    assert tools.count("get_stock_basic_info") == 1
+    assert tools.count("get_historical_k_data") == 2  # K-line + valuation history
+    assert tools.count("get_profit_data") == 8
+    assert tools.count("get_dividend_data") == 3
+
+    kline_args = requests[1][2]
+    assert kline_args["start_date"] == "2024-11-18"
+    assert kline_args["end_date"] == "2025-05-20"
+
+
+@pytest.mark.asyncio
+async def test_prefetch_agent_stores_bundle_and_errors():
+    async def fake_call(tool_name, tool_args):
+        if tool_name == "get_dividend_data":
+            raise RuntimeError("no dividend data")
+        return f"{tool_name}:{tool_args['code']}"
+
+    initial_state = AgentState(
+        messages=[],
+        data={"query": "分析贵州茅台", "stock_code": "sh.600519", "current_date": "2025-05-20"},
+        metadata={}
+    )
+
+    with patch('src.agents.prefetch_agent.call_mcp_tool', new=AsyncMock(side_effect=fake_call)):
+        result_state = await prefetch_agent(initial_state)
+
+    prefetched = result_state["data"]["prefetched"]
+    assert prefetched["basic_info"] == "get_stock_basic_info:sh.600519"
+    assert prefetched["financials"]["profit"]["2025Q1"] == "get_profit_data:sh.600519"
+    assert "dividends" not in prefetched
+    assert len(result_state["data"]["prefetch_errors"]) == 3
+
+
+@pytest.mark.asyncio
+async def test_prefetch_agent_keeps_fetched_sections_after_deadline(monkeypatch):
+    monkeypatch.setenv("NODE_DEADLINE_DATA_PREFETCH", "0.2")
+
+    async def fake_call(tool_name, tool_args):
+        if tool_name == "get_dividend_data":
+            await asyncio.sleep(3600)
+        return f"{tool_name}:{tool_args['code']}"
+
+    initial_state = AgentState(
+        messages=[],
+        data={"query": "分析贵州茅台", "stock_code": "sh.600519", "current_date": "2025-05-20"},
+        metadata={}
+    )
+
+    start = time.time()
+    with patch('src.agents.prefetch_agent.call_mcp_tool', new=AsyncMock(side_effect=fake_call)), \
+            patch('src.agents.prefetch_agent.get_kline_store', return_value=None):
+        data = (await prefetch_agent(initial_state))["data"]
+
+    assert time.time() - start < 5
+    assert data["prefetched"]["basic_info"] == "get_stock_basic_info:sh.600519"
+    assert "dividends" not in data["prefetched"]
+    assert len(data["prefetch_errors"]) == 3
+    assert all(error == "get_dividend_data: timed out after 0.2s"
+               for error in data["prefetch_errors"].values())
+
+
+@pytest.mark.asyncio
+async def test_prefetch_agent_skips_without_stock_code():
+    initial_state = AgentState(messages=[], data={"query": "分析贵州茅台"}, metadata={})
+
+    with patch('src.agents.prefetch_agent.call_mcp_tool', new=AsyncMock()) as mock_call:
+        result_state = await prefetch_agent(initial_state)
+
+    mock_call.assert_not_called()
+    assert "prefetched" not in result_state["data"]
+
+
+def test_format_prefetched_data_only_includes_requested_sections():
+    prefetched = {
+        "basic_info": "| code |",
+        "kline": "| date | close |",
+        "financials": {"profit": {"2025Q1": "| roe |"}},
+    }
+    text = format_prefetched_data(prefetched, ["basic_info", "financials"])
+    assert "| code |" in text
+    assert "#### profit 2025Q1" in text
+    assert "| date | close |" not in text
+    assert format_prefetched_data({}, ["kline"]) == ""
+
+
+@pytest.mark.asyncio
+async def test_prefetch_agent_reads_kline_and_valuation_from_store(tmp_path):
+    from src.analytics.kline_store import KlineStore, read_prefetched
+    from src.analytics.valuation import valuation_frame
+    from tests.analytics.test_kline_store import FakeMCP
+
+    mcp = FakeMCP()
+
+    async def fake_call(tool_name, tool_args):
+        if tool_name in ("get_historical_k_data", "get_adjust_factor_data"):
+            return await mcp(tool_name, tool_args)
+        return f"{tool_name}:{tool_args['code']}"
+
+    store = KlineStore(str(tmp_path))
+    state = AgentState(messages=[], metadata={},
+                       data={"stock_code": "sh.600519", "current_date": "2025-05-20"})
+    with patch('src.agents.prefetch_agent.call_mcp_tool', new=AsyncMock(side_effect=fake_call)), \
+            patch('src.agents.prefetch_agent.get_kline_store', return_value=store), \
+            patch('src.analytics.kline_store.get_kline_store', return_value=store):
+        data = (await prefetch_agent(state))["data"]
+        kline = read_prefetched(data, "kline")
+        valuation = read_prefetched(data, "valuation")
+
+    # K线和估值共用一次不复权日线请求（加一次复权因子请求），不再各自请求
+    assert [call[0] for call in mcp.calls] == ["get_historical_k_data", "get_adjust_factor_data"]
+    assert set(data["prefetch_sources"]) == {"kline", "valuation"}
+    assert data["prefetch_sources"]["kline"]["adjust"] == "forward"
+    assert data["prefetched"]["basic_info"] == "get_stock_basic_info:sh.600519"
+    assert kline["date"].iloc[0] >= "2024-11-18" and kline["date"].iloc[-1] == "2025-05-20"
+    assert valuation_frame(data["prefetched"]["valuation"])["date"].tolist() == valuation["date"].tolist()
@@ -0,0 +1,93 @@
+import os
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from src.agents import summary_agent as summary_module
+from src.utils.state_definition import AgentState
+
+PIECES = ["```markdown\n", "# 平安银行(000001) 综合分析报告\n", "## 执行摘要\n基本面良好，", "建议关注。\n```"]
+
+
+class FakeLLM:
+    async def ainvoke(self, messages, config=None):
+        return AIMessage(content="".join(PIECES))
+
+    async def astream(self, messages, config=None):
+        for piece in PIECES:
+            yield AIMessageChunk(content=piece)
+
+
+def make_state():
+    return AgentState(
+        messages=[],
+        data={"query": "分析平安银行", "stock_code": "sz.000001", "company_name": "平安银行",
+              "fundamental_analysis": "基本面良好", "technical_analysis": "技术面看涨",
+              "value_analysis": "估值合理"},
+        metadata={})
+
+
+@pytest.fixture(autouse=True)
+def llm_env(monkeypatch):
+    monkeypatch.setenv("OPENAI_COMPATIBLE_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_COMPATIBLE_BASE_URL", "http://localhost:1/v1")
+    monkeypatch.setenv("OPENAI_COMPATIBLE_MODEL", "test-model")
+    with patch.object(summary_module, "get_chat_model", return_value=FakeLLM()), \
+            patch.object(summary_module, "get_execution_logger", return_value=MagicMock()):
+        yield
+    summary_module.set_summary_streaming(False)
+
+
+async def run_summary(streaming):
+    summary_module.set_summary_streaming(streaming)
+    result = await summary_module.summary_agent(make_state())
+    data = result["data"]
+    with open(data["report_path"], "rb") as f:
+        content = f.read()
+    os.remove(data["report_path"])
+    return data["final_report"], content
+
+
+@pytest.mark.asyncio
+async def test_streamed_report_matches_non_streaming_output(capsys):
+    blocking_report, blocking_file = await run_summary(streaming=False)
+    capsys.readouterr()
+    streamed_report, streamed_file = await run_summary(streaming=True)
+
+    assert streamed_report == blocking_report
+    assert streamed_file == blocking_file == blocking_report.encode("utf-8")
+    # 终端上逐块输出模型的内容，去掉了代码块标记行
+    out = capsys.readouterr().out
+    assert "".join(PIECES[1:]).replace("```", "") in out
+    assert "```" not in out
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_written_to_report_file_as_they_arrive():
+    reports_dir = Path(summary_module.__file__).resolve().parents[2] / "reports"
+    seen_on_disk = []
+
+    class ObservingLLM(FakeLLM):
+        async def astream(self, messages, config=None):
+            for piece in PIECES:
+                yield AIMessageChunk(content=piece)
+                latest = max(reports_dir.glob("report_平安银行_000001_*.md"),
+                             key=lambda p: p.stat().st_mtime)
+                seen_on_disk.append(latest.read_text(encoding="utf-8"))
+
+    with patch.object(summary_module, "get_chat_model", return_value=ObservingLLM()):
+        await run_summary(streaming=True)
+
+    assert seen_on_disk[0] == PIECES[0]
+    assert seen_on_disk[-1] == "".join(PIECES)
+
+
+def test_fence_filter_drops_fence_lines_split_across_chunks():
+    fence_filter = summary_module._FenceFilter()
+    chunks = ["`", "``mark", "down\n# 标题\n正文 `code`", "\n``", "`\n", "```"]
+    out = "".join(fence_filter.feed(chunk) for chunk in chunks) + fence_filter.flush()
+    assert out == "# 标题\n正文 `code`\n"
+    # 确定不是代码块标记的行立即输出
+    assert summary_module._FenceFilter().feed("# 标") == "# 标"
@@ -0,0 +1,80 @@
+import numpy as np
+
+from src.analytics.financials import compute_ratios, financial_frame, financial_ratio_section
+
+
+def table(fields, values):
+    header = "| code | statDate | " + " | ".join(fields) + " |"
+    separator = "|" + "---|" * (len(fields) + 2)
+    row = "| sh.600519 | 2024-09-30 | " + " | ".join(str(value) for value in values) + " |"
+    return "\n".join([header, separator, row])
+
+
+def sample_financials(periods, cfo_to_np=0.8, roe_scale=1.0):
+    """收入按年增长20%、各季度均匀分布的累计值财务数据，杜邦ROE等于各因子之积乘以roe_scale"""
+    financials = {"profit": {}, "dupont": {}, "balance": {}, "cash_flow": {}}
+    for year, quarter in periods:
+        period = f"{year}Q{quarter}"
+        revenue = 1e10 * quarter * 1.2 ** (year - 2023)
+        financials["profit"][period] = table(
+            ["roeAvg", "npMargin", "gpMargin", "netProfit", "MBRevenue"],
+            [0.05 * quarter, 0.3, 0.6, revenue * 0.3, ""])
+        turnover = 0.1 * quarter * 1.2 ** (year - 2023)
+        financials["dupont"][period] = table(
+            ["dupontROE", "dupontAssetStoEquity", "dupontAssetTurn", "dupontPnitoni", "dupontNitogr"],
+            [0.9 * 0.3 * turnover * 2.0 * roe_scale ** (year - 2023), 2.0, turnover, 0.9, 0.3])
+        financials["balance"][period] = table(["liabilityToAsset", "currentRatio"], [0.5, 1.5])
+        financials["cash_flow"][period] = table(["CFOToNP", "CFOToOR"], [cfo_to_np, 0.24])
+    return financials
+
+
+PERIODS = [(2023, 3), (2023, 4), (2024, 1), (2024, 2), (2024, 3), (2024, 4)]
+
+
+def test_financial_frame_merges_sections_in_period_order():
+    financials = sample_financials(list(reversed(PERIODS)))
+    financials["growth"] = {"2024Q4": "没有数据"}
+    frame = financial_frame(financials)
+    assert frame.index.tolist() == [f"{y}Q{q}" for y, q in PERIODS]
+    assert {"netProfit", "dupontROE", "liabilityToAsset", "CFOToNP"} <= set(frame.columns)
+    assert financial_frame({}).empty
+
+
+def test_compute_ratios_derives_single_quarter_and_growth():
+    ratios = compute_ratios(financial_frame(sample_financials(PERIODS)))
+
+    # 营业收入由 净利润/净利率 推算；单季值由相邻季度累计值相减，Q1即累计值
+    np.testing.assert_allclose(ratios["revenue"], [3e10, 4e10, 1.2e10, 2.4e10, 3.6e10, 4.8e10])
+    np.testing.assert_allclose(ratios["revenue_q"][1:], [1e10, 1.2e10, 1.2e10, 1.2e10, 1.2e10])
+    assert np.isnan(ratios["revenue_q"].iloc[0])
+    np.testing.assert_allclose(ratios["revenue_yoy"].iloc[-2:], [0.2, 0.2])
+    np.testing.assert_allclose(ratios.loc["2024Q1", "net_profit_qoq"], 0.2)
+    np.testing.assert_allclose(ratios.loc["2024Q2", "net_profit_qoq"], 0.0, atol=1e-12)
+
+    np.testing.assert_allclose(ratios["roa"], ratios["dupont_roe"] / 2.0)
+    # 应计比率 = ROA × 4/季度 × (1 - 经营现金流/净利润)
+    np.testing.assert_allclose(ratios.loc["2024Q2", "accrual_ratio"], 0.054 * 2 * 1.2 / 2.0 * 2 * 0.2)
+
+
+def test_compute_ratios_leaves_gaps_as_nan():
+    ratios = compute_ratios(financial_frame(sample_financials([(2023, 4), (2024, 2), (2024, 3)])))
+    assert np.isnan(ratios.loc["2024Q2", "revenue_q"])
+    assert np.isnan(ratios.loc["2024Q3", "revenue_qoq"])
+    np.testing.assert_allclose(ratios.loc["2024Q3", "revenue_q"], 1.2e10)
+
+
+def test_financial_ratio_section_reports_dupont_drivers_and_quality():
+    section = financial_ratio_section(sample_financials(PERIODS, cfo_to_np=0.2))
+    assert "| 指标（金额单位：亿元） | 2023Q3 |" in section
+    assert "杜邦ROE相对 2023Q4" in section and "主要驱动因素为总资产周转率" in section
+    # 四个因子的对数变化之和等于ROE的对数变化，没有未解释部分
+    assert "ROE对数变化 +18.2%" in section and "总资产周转率 +18.2%" in section
+    assert "归母净利润占比 +0.0%" in section and "未解释部分" not in section
+    assert "利润的现金含量偏低" in section and "需关注盈利质量" in section
+    assert "利息保障倍数" not in section
+    assert financial_ratio_section({"profit": {"2024Q3": "查询失败"}}) == ""
+
+
+def test_dupont_decomposition_reports_unexplained_residual():
+    section = financial_ratio_section(sample_financials(PERIODS, roe_scale=1.1))
+    assert "ROE对数变化 +27.8%" in section and "其他（未解释部分） +9.5%" in section
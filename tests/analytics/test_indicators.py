@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analytics.indicators import (compute_indicators, ema, kdj, rolling_max, sma,
+                                      technical_indicator_section)
+from src.analytics.kline import kline_frame, parse_markdown_table
+
+
+def random_ohlcv(days=300, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, days)))
+    return {"open": close, "high": close * 1.01, "low": close * 0.99, "close": close,
+            "volume": rng.integers(100_000, 1_000_000, days).astype(float)}
+
+
+def kline_markdown(ohlcv, start="2024-01-01"):
+    dates = pd.bdate_range(start, periods=len(ohlcv["close"])).strftime("%Y-%m-%d")
+    lines = ["| date | code | open | high | low | close | volume | tradestatus |",
+             "|:-----|:-----|-----:|-----:|----:|------:|-------:|------------:|"]
+    for i, date in enumerate(dates):
+        lines.append(f"| {date} | sh.600519 | {ohlcv['open'][i]:.4f} | {ohlcv['high'][i]:.4f} | "
+                     f"{ohlcv['low'][i]:.4f} | {ohlcv['close'][i]:.4f} | {ohlcv['volume'][i]:.0f} | 1 |")
+    return "\n".join(lines)
+
+
+def test_parse_markdown_table_ignores_surrounding_text_and_suspended_days():
+    text = """Historical K-line data for sh.600519:
+
+| date | code | close | volume | tradestatus |
+|:-----|:-----|------:|-------:|------------:|
+| 2024-06-04 | sh.600519 | 1662.5 | 2500 | 1 |
+| 2024-06-03 | sh.600519 | 1650.0 | 0 | 0 |
+| 2024-05-31 | sh.600519 |  | 3100 | 1 |
+
+(Showing 3 rows)"""
+    df = parse_markdown_table(text)
+    assert list(df.columns) == ["date", "code", "close", "volume", "tradestatus"]
+    assert df["close"].isna().tolist() == [False, False, True]
+    assert df["code"].iloc[0] == "sh.600519"
+    assert parse_markdown_table("no table here").empty
+    # 缺少OHLCV字段的表格不是K线
+    assert kline_frame(text).empty
+
+
+def test_indicators_match_pandas_reference():
+    ohlcv = random_ohlcv()
+    indicators = compute_indicators(ohlcv)
+    close = pd.Series(ohlcv["close"])
+
+    np.testing.assert_allclose(indicators["MA20"], close.rolling(20).mean(), rtol=1e-10)
+    np.testing.assert_allclose(indicators["EMA12"], close.ewm(span=12, adjust=False).mean())
+    change = close.diff()
+    gain = change.clip(lower=0).ewm(alpha=1 / 6, adjust=False).mean()
+    loss = change.abs().ewm(alpha=1 / 6, adjust=False).mean()
+    np.testing.assert_allclose(indicators["RSI6"], 100 * gain / loss)
+    upper = close.rolling(20).mean() + 2 * close.rolling(20).std()
+    np.testing.assert_allclose(indicators["BOLL_UPPER"], upper, rtol=1e-9)
+    obv = (np.sign(change.fillna(0)) * ohlcv["volume"]).cumsum()
+    np.testing.assert_allclose(indicators["OBV"], obv)
+
+
+def test_universe_computation_matches_per_stock_computation():
+    stocks = [random_ohlcv(120, seed) for seed in range(3)]
+    universe = {field: np.stack([stock[field] for stock in stocks]) for field in stocks[0]}
+    # 第三只股票上市较晚，前20天用NaN填充
+    for field in universe:
+        universe[field][2, :20] = np.nan
+
+    batch = compute_indicators(universe)
+    for i, stock in enumerate(stocks[:2]):
+        single = compute_indicators(stock)
+        for name in ("MA60", "DIF", "RSI12", "K", "ATR14"):
+            np.testing.assert_allclose(batch[name][i], single[name])
+    late = compute_indicators({field: values[20:] for field, values in stocks[2].items()})
+    np.testing.assert_allclose(batch["MA5"][2, 20:], late["MA5"])
+    assert np.isnan(batch["MA5"][2, :24]).all()
+
+
+def test_rolling_helpers_and_kdj_conventions():
+    values = np.array([3.0, 1.0, 4.0, 1.0, 5.0, 9.0, 2.0])
+    np.testing.assert_array_equal(rolling_max(values, 3)[2:], [4, 4, 5, 9, 9])
+    np.testing.assert_allclose(sma(values, 7)[-1], values.mean())
+    assert np.isnan(ema(np.array([np.nan, np.nan]), 0.5)).all()
+
+    flat = np.full(15, 10.0)
+    result = kdj(flat, flat, flat)
+    # 价格没有波动时RSV取50，K、D保持初值50
+    assert result["K"][-1] == pytest.approx(50)
+    assert np.isnan(result["K"][:8]).all()
+
+
+def test_indicator_section_for_prompt():
+    section = technical_indicator_section(kline_markdown(random_ohlcv(130)), rows=5)
+    table_rows = [line for line in section.splitlines() if line.startswith("| 20")]
+    assert len(table_rows) == 5
+    assert "| 日期 | 收盘 | MA5 |" in section
+    assert "OBV" in section
+    assert technical_indicator_section("") == ""
@@ -0,0 +1,148 @@
+import asyncio
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analytics.kline_store import (CHINA_TZ, STORE_FIELDS, KlineStore, format_markdown,
+                                       frame_from_columns)
+from src.analytics.kline import kline_frame
+
+CODE = "sh.600519"
+DATES = pd.bdate_range("2023-01-02", "2025-05-20").strftime("%Y-%m-%d").tolist()
+CLOSE = 100 * np.exp(np.cumsum(np.random.default_rng(0).normal(0, 0.01, len(DATES))))
+FACTORS = ("| code | dividOperateDate | foreAdjustFactor | backAdjustFactor | adjustFactor |\n"
+           "|---|---|---|---|---|\n"
+           "| sh.600519 | 2023-06-30 | 0.9 | 1.1 | 1.1 |\n"
+           "| sh.600519 | 2024-06-19 | 1.0 | 1.2 | 1.2 |")
+
+
+class FakeMCP:
+    """按请求的日期范围返回不复权日线和复权因子，并记录调用"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, tool_name, tool_args):
+        self.calls.append((tool_name, tool_args["start_date"], tool_args["end_date"]))
+        if tool_name == "get_adjust_factor_data":
+            return FACTORS if tool_args["start_date"] <= "2024-06-19" else "没有复权因子数据"
+        assert tool_args["adjust_flag"] == "3" and tool_args["fields"] == STORE_FIELDS
+        lines = ["| date | code | open | high | low | close | volume | tradestatus | peTTM |",
+                 "|---|---|---|---|---|---|---|---|---|"]
+        for date, close in zip(DATES, CLOSE):
+            if tool_args["start_date"] <= date <= tool_args["end_date"]:
+                status = 0 if date == "2025-05-06" else 1
+                lines.append(f"| {date} | {CODE} | {close:.2f} | {close * 1.01:.2f} | {close * 0.99:.2f} | "
+                             f"{close:.2f} | 1000000 | {status} | {close / 5:.4f} |")
+        return "\n".join(lines)
+
+
+def at(day, hour):
+    return datetime.strptime(day, "%Y-%m-%d").replace(hour=hour, tzinfo=CHINA_TZ)
+
+
+def test_sync_fetches_only_new_bars_and_skips_until_next_data_ready(tmp_path):
+    store, mcp = KlineStore(str(tmp_path)), FakeMCP()
+
+    # 2025-05-10是周六，下一次日线就绪是周一17:30
+    assert asyncio.run(store.sync(CODE, "2023-01-01", "2025-05-10", mcp, now=at("2025-05-10", 20))) > 500
+    assert asyncio.run(store.sync(CODE, "2023-01-01", "2025-05-12", mcp, now=at("2025-05-12", 9))) == 0
+    assert asyncio.run(store.sync(CODE, "2023-01-01", "2025-05-20", mcp, now=at("2025-05-20", 20))) == 7
+
+    assert mcp.calls == [
+        ("get_historical_k_data", "2023-01-01", "2025-05-10"),
+        ("get_adjust_factor_data", "1990-01-01", "2025-05-10"),
+        ("get_historical_k_data", "2025-05-10", "2025-05-20"),
+        ("get_adjust_factor_data", "2024-06-20", "2025-05-20"),
+    ]
+    assert store.last_date(CODE) == "2025-05-20"
+    assert store.covers(CODE, "2024-01-01") and not store.covers(CODE, "2022-12-01")
+    assert store.meta(CODE)["factor_rows"] == 2
+
+
+def test_read_returns_zero_copy_slices_and_forward_adjusted_prices(tmp_path):
+    store = KlineStore(str(tmp_path))
+    asyncio.run(store.sync(CODE, "2023-01-01", "2025-05-20", FakeMCP(), now=at("2025-05-20", 20)))
+
+    raw = store.read(CODE, "2024-06-17", "2024-06-20", fields=["close", "volume"])
+    assert isinstance(raw["close"], np.memmap)
+    assert np.datetime_as_string(raw["date"]).tolist() == ["2024-06-17", "2024-06-18", "2024-06-19", "2024-06-20"]
+    np.testing.assert_allclose(raw["close"], np.round(CLOSE[DATES.index("2024-06-17"):][:4], 2))
+
+    adjusted = store.read(CODE, "2023-06-29", "2024-06-20", fields=["close"], adjust="forward")
+    factor = adjusted["close"] / store.read(CODE, "2023-06-29", "2024-06-20", fields=["close"])["close"]
+    np.testing.assert_allclose(factor[[0, 1, -3, -2, -1]], [1 / 1.2, 1.1 / 1.2, 1.1 / 1.2, 1.0, 1.0])
+
+    assert len(store.read("sz.000001")["date"]) == 0
+    with pytest.raises(ValueError):
+        store.read(CODE, adjust="backward")
+
+
+def test_interrupted_append_is_invisible_and_truncated(tmp_path):
+    store = KlineStore(str(tmp_path))
+    asyncio.run(store.sync(CODE, "2023-01-01", "2025-05-10", FakeMCP(), now=at("2025-05-10", 20)))
+    rows = store.meta(CODE)["rows"]
+
+    # 模拟追加了列数据但没有提交meta.json
+    with open(tmp_path / "sh.600519" / "close.bin", "ab") as f:
+        f.write(np.ones(3).tobytes())
+    assert len(store.read(CODE)["close"]) == rows
+
+    asyncio.run(store.sync(CODE, "2023-01-01", "2025-05-20", FakeMCP(), now=at("2025-05-20", 20)))
+    columns = store.read(CODE, "2025-05-09")
+    assert len(columns["close"]) == len(columns["date"]) == 8
+    np.testing.assert_allclose(columns["close"][1:], np.round(CLOSE[-7:], 2))
+
+
+def test_failed_or_empty_sync_writes_nothing(tmp_path):
+    store = KlineStore(str(tmp_path))
+
+    async def failing(tool_name, tool_args):
+        if tool_name == "get_adjust_factor_data":
+            raise RuntimeError("MCP server unavailable")
+        return await FakeMCP()(tool_name, tool_args)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(store.sync(CODE, "2023-01-01", "2025-05-20", failing))
+
+    async def no_data(tool_name, tool_args):
+        return "没有数据"
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(store.sync(CODE, "2023-01-01", "2025-05-20", no_data))
+    assert store.meta(CODE) is None and not (tmp_path / "sh.600519").exists()
+
+
+def test_error_reply_raises_and_does_not_mark_store_fresh(tmp_path):
+    store, mcp = KlineStore(str(tmp_path)), FakeMCP()
+    asyncio.run(store.sync(CODE, "2023-01-01", "2025-05-13", mcp, now=at("2025-05-13", 20)))
+    synced_at = store.meta(CODE)["synced_at"]
+
+    async def error_reply(tool_name, tool_args):
+        if tool_name == "get_historical_k_data":
+            return "Error: baostock login failed"
+        return await mcp(tool_name, tool_args)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(store.sync(CODE, "2023-01-01", "2025-05-20", error_reply, now=at("2025-05-20", 20)))
+    assert store.meta(CODE)["synced_at"] == synced_at and store.last_date(CODE) == "2025-05-13"
+    assert not store.is_fresh(CODE, now=at("2025-05-20", 21))
+
+    # 下一次同步照常请求MCP，补上缺少的K线
+    assert asyncio.run(store.sync(CODE, "2023-01-01", "2025-05-20", mcp, now=at("2025-05-20", 21))) == 5
+    assert store.last_date(CODE) == "2025-05-20"
+
+
+def test_markdown_and_frame_match_mcp_parsing(tmp_path):
+    store = KlineStore(str(tmp_path))
+    asyncio.run(store.sync(CODE, "2023-01-01", "2025-05-20", FakeMCP(), now=at("2025-05-20", 20)))
+    fields = ["open", "high", "low", "close", "volume", "tradestatus"]
+    columns = store.read(CODE, "2025-04-01", fields=fields, adjust="forward")
+
+    parsed = kline_frame(format_markdown(CODE, columns, fields))
+    frame = frame_from_columns(columns)
+    assert "2025-05-06" not in frame["date"].tolist()
+    assert parsed["date"].tolist() == frame["date"].tolist()
+    np.testing.assert_allclose(parsed["close"], frame["close"], rtol=1e-6)
@@ -0,0 +1,70 @@
+import numpy as np
+
+from src.analytics.levels import (REGIME_DOWN, REGIME_UP, find_levels, pivot_points,
+                                  scan_klines, scan_universe, support_resistance_section)
+from tests.analytics.test_indicators import kline_markdown, random_ohlcv
+
+
+def trending_ohlcv(days=200, drift=0.01, seed=1):
+    rng = np.random.default_rng(seed)
+    close = 50 * np.exp(np.cumsum(drift + rng.normal(0, 0.003, days)))
+    return {"open": close, "high": close * 1.005, "low": close * 0.995, "close": close,
+            "volume": np.full(days, 500_000.0)}
+
+
+def test_pivot_points_marks_local_extremes():
+    high = np.array([1, 2, 3, 9, 3, 2, 1, 2, 3, 2, 1], dtype=float)
+    low = high - 0.5
+    pivots = pivot_points(high, low, window=2)
+    assert np.flatnonzero(pivots["pivot_high"]).tolist() == [3, 8]
+    assert np.flatnonzero(pivots["pivot_low"]).tolist() == [6]
+
+
+def test_scan_universe_matches_single_stock_scans_with_late_listing():
+    stocks = [random_ohlcv(300, seed) for seed in range(3)]
+    # 第三只股票晚上市100天，前面补NaN
+    stocks[2] = {field: np.concatenate([np.full(100, np.nan), values[100:]])
+                 for field, values in stocks[2].items()}
+    stacked = {field: np.vstack([stock[field] for stock in stocks]) for field in stocks[0]}
+    universe = scan_universe(stacked)
+    for i, stock in enumerate(stocks):
+        single = scan_universe({field: values[~np.isnan(values)] for field, values in stock.items()})
+        for name in ("support", "resistance", "breakout", "regime"):
+            np.testing.assert_allclose(universe[name][i], single[name][0], equal_nan=True)
+        assert np.isnan(universe["support"][i]) or universe["support"][i] <= universe["close"][i]
+        assert np.isnan(universe["resistance"][i]) or universe["resistance"][i] >= universe["close"][i]
+
+
+def test_scan_universe_detects_breakout_and_trend_regime():
+    up = trending_ohlcv(drift=0.01)
+    down = trending_ohlcv(drift=-0.01, seed=2)
+    stacked = {field: np.vstack([up[field], down[field]]) for field in up}
+    scan = scan_universe(stacked)
+    assert scan["breakout"].tolist() == [1, -1]
+    assert scan["regime"].tolist() == [REGIME_UP, REGIME_DOWN]
+    assert scan["slope"][0] > 0 > scan["slope"][1]
+
+
+def test_find_levels_returns_ranked_levels_with_confidence():
+    result = find_levels(random_ohlcv(250, seed=3))
+    assert result["supports"] and result["resistances"]
+    for level in result["supports"]:
+        assert level["price"] <= result["close"]
+        assert 0 <= level["confidence"] <= 1
+    for level in result["resistances"]:
+        assert level["price"] >= result["close"]
+        assert 0 <= level["confidence"] <= 1
+    distances = [abs(level["distance_pct"]) for level in result["supports"]]
+    assert distances == sorted(distances)
+
+
+def test_support_resistance_section_and_batch_scan():
+    text = kline_markdown(random_ohlcv(150, seed=4))
+    section = support_resistance_section(text)
+    assert "支撑" in section and "阻力" in section and "趋势" in section
+    assert support_resistance_section(None) == ""
+
+    results = scan_klines([text, None, kline_markdown(trending_ohlcv(), start="2024-03-01")])
+    assert results[1] is None
+    assert results[2]["regime"] == "上升趋势"
+    assert results[0]["support"] is None or results[0]["support"] <= results[0]["close"]
@@ -0,0 +1,98 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from src.analytics.valuation import (analyze_valuation, dcf_grid, ddm_grid, dividend_events,
+                                     percentile_bands, valuation_section)
+
+DIVIDENDS = {
+    "2024": ("| code | dividPlanAnnounceDate | dividOperateDate | dividCashPsBeforeTax | dividCashStock |\n"
+             "|---|---|---|---|---|\n"
+             "| sh.600519 | 2024-06-07 | 2024-06-19 | 30.876 | 10派308.76元(含税) |\n"
+             "| sh.600519 | 2024-12-12 | 2024-12-20 | 23.882 | 10派238.82元(含税) |"),
+    "2023": ("| code | dividOperateDate | dividCashPsBeforeTax |\n|---|---|---|\n"
+             "| sh.600519 | 2023-06-30 | 25.911 |"),
+    "2022": "No dividend data found",
+}
+
+
+def valuation_markdown(days=500, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 1500 * np.exp(np.cumsum(rng.normal(0, 0.015, days)))
+    dates = pd.bdate_range("2023-03-01", periods=days).strftime("%Y-%m-%d")
+    lines = ["| date | code | close | peTTM | pbMRQ | psTTM | pcfNcfTTM |",
+             "|:-----|:-----|------:|------:|------:|------:|----------:|"]
+    for i, date in enumerate(dates):
+        lines.append(f"| {date} | sh.600519 | {close[i]:.2f} | {close[i] / 60:.4f} | "
+                     f"{close[i] / 200:.4f} | {close[i] / 120:.4f} | -3.5 |")
+    return "\n".join(lines), close
+
+
+def test_percentile_bands_excludes_non_positive_values():
+    values = np.array([10.0, -5.0, 20.0, np.nan, 30.0, 40.0, 25.0])
+    stats = percentile_bands(values, percentiles=(25, 50, 75))
+    valid = np.array([10.0, 20.0, 30.0, 40.0, 25.0])
+    np.testing.assert_allclose(stats["bands"], np.percentile(valid, [25, 50, 75]))
+    assert stats["current"] == 25.0 and stats["samples"] == 5
+    assert stats["rank"] == 60.0
+
+    stacked = percentile_bands(np.vstack([values, values * 2, -np.abs(values)]), percentiles=(25, 50, 75))
+    np.testing.assert_allclose(stacked["bands"][1], stats["bands"] * 2)
+    assert np.isnan(stacked["current"][2]) and np.isnan(stacked["bands"][2]).all()
+
+
+def test_dcf_and_ddm_grids_match_closed_form():
+    grid = dcf_grid(10.0, discount_rates=(0.02, 0.09, 0.1), growth_rates=(0.0, 0.05),
+                    terminal_growth=0.025, years=5)
+    r, g = 0.1, 0.05
+    flows = [10.0 * (1 + g) ** t for t in range(1, 6)]
+    expected = sum(cf / (1 + r) ** t for t, cf in enumerate(flows, 1))
+    expected += flows[-1] * 1.025 / (r - 0.025) / (1 + r) ** 5
+    assert grid.shape == (3, 2)
+    assert np.isclose(grid[2, 1], expected)
+    assert np.isnan(grid[0]).all()
+    assert (np.diff(grid[1:], axis=0) < 0).all() and (np.diff(grid[1:], axis=1) > 0).all()
+
+    ddm = ddm_grid(2.0, discount_rates=(0.03, 0.08), growth_rates=(0.0, 0.03))
+    np.testing.assert_allclose(ddm[1], [2.0 / 0.08, 2.0 * 1.03 / 0.05])
+    assert np.isnan(ddm[0, 1])
+
+
+def test_dividend_events_merge_years_and_keep_dates():
+    events = dividend_events(DIVIDENDS)
+    assert events["date"].tolist() == ["2023-06-30", "2024-06-19", "2024-12-20"]
+    assert events["cash"].tolist() == [25.911, 30.876, 23.882]
+
+
+def test_analyze_valuation_is_deterministic_and_serializable():
+    text, close = valuation_markdown()
+    prefetched = {"valuation": text, "dividends": DIVIDENDS}
+    result = analyze_valuation(prefetched)
+
+    assert result == analyze_valuation(prefetched)
+    json.dumps(result)
+    assert result["close"] == round(close[-1], 2)
+    pe = result["multiples"]["peTTM"]
+    assert pe["bands"] == sorted(pe["bands"])
+    assert 0 <= pe["rank"] <= 100
+    assert np.isclose(pe["implied_prices"][2], result["close"] * pe["bands"][2] / pe["current"], rtol=1e-3)
+    assert result["multiples"]["pcfNcfTTM"]["current"] is None
+    assert abs(result["dcf"]["base_eps"] - result["close"] / pe["current"]) < 0.01
+    assert len(result["dcf"]["values"]) == len(result["dcf"]["discount_rates"])
+
+    # 估值日期为2025-01-28，近12个月内有两次除息
+    assert result["as_of"] == "2025-01-28"
+    assert result["dividend"]["ex_dates"] == ["2024-06-19", "2024-12-20"]
+    assert result["dividend"]["yield_pct"] == round((30.876 + 23.882) / result["close"] * 100, 2)
+    assert result["ddm"]["base_dividend"] == 54.758
+
+
+def test_valuation_section_for_prompt():
+    text, _ = valuation_markdown(days=60)
+    section = valuation_section({"valuation": text})
+    assert "历史估值分位带" in section and "DCF每股价值" in section
+    assert "为负或缺失" in section
+    assert "股息率" not in section
+    assert valuation_section({}) == ""
+    assert valuation_section({"valuation": "查询失败"}) == ""
@@ -0,0 +1,91 @@
+import asyncio
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.batch import load_watchlist, run_batch
+from tests.analytics.test_indicators import kline_markdown, random_ohlcv
+
+
+class FakeApp:
+    """按查询返回结果并记录同时执行的分析数"""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+
+    async def ainvoke(self, state, config=None):
+        query = state["data"]["query"]
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.02)
+            if "000002" in query:
+                raise RuntimeError("MCP server unavailable")
+            if "000003" in query:
+                return {"data": {**state["data"], "summary_error": "LLM failed",
+                                 "final_report": "error report"}}
+            return {"data": {**state["data"], "final_report": "报告",
+                             "report_path": f"/reports/{query}.md"}}
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture(autouse=True)
+def execution_logger():
+    with patch("src.batch.get_execution_logger", return_value=MagicMock()):
+        yield
+
+
+def test_load_watchlist_skips_comments_blanks_and_duplicates(tmp_path):
+    path = tmp_path / "watchlist.txt"
+    path.write_text("# 自选股\n000001\n\n分析贵州茅台\n000001\n", encoding="utf-8")
+    assert load_watchlist(str(path)) == ["000001", "分析贵州茅台"]
+
+
+@pytest.mark.asyncio
+async def test_batch_respects_concurrency_and_records_failures(tmp_path):
+    app = FakeApp()
+    queries = [f"{600000 + i}" for i in range(6)] + ["000002", "000003"]
+
+    manifest = await run_batch(app, queries, concurrency=3, manifest_dir=str(tmp_path),
+                               log_dir=str(tmp_path / "stocks"))
+
+    assert app.max_active == 3
+    assert manifest["total"] == 8
+    assert manifest["succeeded"] == 6
+    stocks = {entry["query"]: entry for entry in manifest["stocks"]}
+    assert stocks["000002"]["error"] == "MCP server unavailable"
+    assert stocks["000003"]["status"] == "failed"
+    assert stocks["600000"]["stock_code"] == "sh.600000"
+    assert stocks["600000"]["report_path"] == "/reports/600000.md"
+    assert all(entry["duration_seconds"] > 0 for entry in manifest["stocks"])
+    assert len({entry["log_dir"] for entry in manifest["stocks"]}) == 8
+
+    with open(manifest["manifest_path"], encoding="utf-8") as f:
+        saved = json.load(f)
+    assert saved["failed"] == 2
+    assert [entry["query"] for entry in saved["stocks"]] == queries
+
+
+@pytest.mark.asyncio
+async def test_batch_manifest_includes_technical_scan(tmp_path):
+    class KlineApp(FakeApp):
+        async def ainvoke(self, state, config=None):
+            result = await super().ainvoke(state, config)
+            seed = int(state["data"]["query"]) % 10
+            result["data"]["prefetched"] = {"kline": kline_markdown(random_ohlcv(120, seed))}
+            return result
+
+    manifest = await run_batch(KlineApp(), ["600001", "600002", "000002"], concurrency=2,
+                               manifest_dir=str(tmp_path), log_dir=str(tmp_path / "stocks"))
+
+    stocks = {entry["query"]: entry for entry in manifest["stocks"]}
+    assert stocks["000002"]["technical_scan"] is None
+    for query in ("600001", "600002"):
+        scan = stocks[query]["technical_scan"]
+        assert scan["regime"] in ("上升趋势", "震荡", "下降趋势")
+        assert scan["breakout"] in (-1, 0, 1)
+    with open(manifest["manifest_path"], encoding="utf-8") as f:
+        assert json.load(f)["stocks"][0]["technical_scan"]["close"] == stocks["600001"]["technical_scan"]["close"]
@@ -0,0 +1,124 @@
+from collections import Counter
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.utils.checkpointing import FileCheckpointSaver
+from src.workflow import build_workflow, resume_analysis, run_analysis
+
+THREAD_ID = "20240603_101500_abcd1234"
+
+
+class FakeAgents:
+    """记录每个节点的调用次数，可以让指定节点失败"""
+
+    def __init__(self, crash=(), fail=()):
+        self.calls = Counter()
+        self.crash = set(crash)
+        self.fail = set(fail)
+
+    def node(self, name, output_key, error_key):
+        async def run(state):
+            self.calls[name] += 1
+            if name in self.crash:
+                raise TimeoutError(f"{name} timed out")
+            data = dict(state["data"])
+            data[output_key] = f"{name} output"
+            if name in self.fail:
+                data[error_key] = f"{name} failed"
+            return {"data": data}
+        return run
+
+    def patches(self):
+        nodes = {
+            "prefetch_agent": ("data_prefetch", "prefetched", None),
+            "fundamental_agent": ("fundamental_analyst", "fundamental_analysis",
+                                  "fundamental_analysis_error"),
+            "technical_agent": ("technical_analyst", "technical_analysis",
+                                "technical_analysis_error"),
+            "value_agent": ("value_analyst", "value_analysis", "value_analysis_error"),
+            "summary_agent": ("summarizer", "final_report", "summary_error"),
+        }
+        return [patch(f"src.workflow.{attr}", self.node(*spec)) for attr, spec in nodes.items()]
+
+
+def build(agents, checkpoint_dir):
+    """每次都用新的检查点存储实例，模拟重新启动进程"""
+    for p in agents.patches():
+        p.start()
+    try:
+        return build_workflow(checkpointer=FileCheckpointSaver(str(checkpoint_dir)))
+    finally:
+        patch.stopall()
+
+
+@pytest.fixture(autouse=True)
+def execution_logger():
+    with patch("src.workflow.get_execution_logger", return_value=MagicMock()):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_resume_after_crash_only_runs_failed_node(tmp_path):
+    first = FakeAgents(crash={"summarizer"})
+    with pytest.raises(TimeoutError):
+        await run_analysis(build(first, tmp_path), "分析600519", thread_id=THREAD_ID)
+    assert first.calls["value_analyst"] == 1
+    assert any((tmp_path / THREAD_ID).glob("*.pkl"))
+
+    second = FakeAgents()
+    final_state = await resume_analysis(build(second, tmp_path), THREAD_ID)
+
+    assert final_state["data"]["final_report"] == "summarizer output"
+    assert final_state["data"]["query"] == "分析600519"
+    assert second.calls == Counter({"summarizer": 1})
+
+
+@pytest.mark.asyncio
+async def test_resume_reruns_failed_analyst_and_summary(tmp_path):
+    first = FakeAgents(fail={"value_analyst"})
+    state = await run_analysis(build(first, tmp_path), "分析600519", thread_id=THREAD_ID)
+    assert state["data"]["value_analysis_error"] == "value_analyst failed"
+
+    second = FakeAgents()
+    final_state = await resume_analysis(build(second, tmp_path), THREAD_ID)
+
+    assert second.calls == Counter({"value_analyst": 1, "summarizer": 1})
+    assert not final_state["data"]["value_analysis_error"]
+    assert final_state["data"]["fundamental_analysis"] == "fundamental_analyst output"
+
+    # 已经完整结束的运行不再执行任何节点
+    third = FakeAgents()
+    await resume_analysis(build(third, tmp_path), THREAD_ID)
+    assert third.calls == Counter()
+
+
+@pytest.mark.asyncio
+async def test_resume_unknown_execution(tmp_path):
+    with pytest.raises(ValueError):
+        await resume_analysis(build(FakeAgents(), tmp_path), "missing")
+
+
+@pytest.mark.asyncio
+async def test_records_are_appended_not_rewritten(tmp_path):
+    await run_analysis(build(FakeAgents(), tmp_path), "分析600519", thread_id=THREAD_ID)
+    records = sorted((tmp_path / THREAD_ID).glob("*.pkl"))
+    first_record = records[0].read_bytes()
+
+    # 每个检查点和每个任务的输出各一个记录文件，已有记录不会被重写
+    await run_analysis(build(FakeAgents(), tmp_path), "分析600519", thread_id="other")
+    assert sorted((tmp_path / THREAD_ID).glob("*.pkl")) == records
+    assert records[0].read_bytes() == first_record
+    assert len(records) > 5
+
+
+def test_delete_thread_removes_records(tmp_path):
+    saver = FileCheckpointSaver(str(tmp_path))
+    record_dir = tmp_path / THREAD_ID
+    record_dir.mkdir()
+    (record_dir / "000000.pkl").write_bytes(b"")
+    assert saver.has_checkpoint(THREAD_ID)
+
+    saver.delete_thread(THREAD_ID)
+    assert not record_dir.exists()
+    assert not saver.has_checkpoint(THREAD_ID)
@@ -0,0 +1,104 @@
+import asyncio
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from langchain_core.tools import tool
+
+from src.utils import deadlines
+from src.utils.deadlines import get_node_deadline
+from src.workflow import build_workflow, run_analysis
+
+
+@tool
+def get_dividend_data(code: str) -> str:
+    """查询分红数据"""
+    return f"{code} 2023 每股派息 30.876"
+
+
+class SlowValueAgent:
+    """先完成一次工具调用，然后卡住直到被取消"""
+
+    def __init__(self, call_tool=True):
+        self.call_tool = call_tool
+        self.cancelled = False
+
+    async def __call__(self, state):
+        if self.call_tool:
+            await get_dividend_data.ainvoke({"code": "sh.600519"})
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return {"data": {"value_analysis": "never"}}
+
+
+async def analyst(state):
+    return {"data": {"fundamental_analysis": "基本面分析", "technical_analysis": "技术面分析"}}
+
+
+async def summarizer(state):
+    data = state["data"]
+    return {"data": {"final_report": f"{data['value_analysis']} | {data.get('value_analysis_error')}"}}
+
+
+async def node(state):
+    return {"data": {}}
+
+
+@pytest.fixture
+def execution_logger(monkeypatch):
+    monkeypatch.setattr(deadlines, "DEFAULT_NODE_DEADLINE", 0)
+    monkeypatch.setenv("NODE_DEADLINE_VALUE_ANALYST", "0.2")
+    execution_logger = MagicMock()
+    with patch("src.workflow.get_execution_logger", return_value=execution_logger):
+        yield execution_logger
+
+
+def build(value_agent):
+    with patch("src.workflow.prefetch_agent", node), \
+            patch("src.workflow.fundamental_agent", analyst), \
+            patch("src.workflow.technical_agent", analyst), \
+            patch("src.workflow.value_agent", value_agent), \
+            patch("src.workflow.summary_agent", summarizer):
+        return build_workflow()
+
+
+def test_node_deadline_from_environment(monkeypatch):
+    monkeypatch.setattr(deadlines, "DEFAULT_NODE_DEADLINE", 300)
+    assert get_node_deadline("fundamental_analyst") == 300
+    monkeypatch.setenv("NODE_DEADLINE_FUNDAMENTAL_ANALYST", "45")
+    assert get_node_deadline("fundamental_analyst") == 45
+    monkeypatch.setenv("NODE_DEADLINE_FUNDAMENTAL_ANALYST", "0")
+    assert get_node_deadline("fundamental_analyst") is None
+
+
+@pytest.mark.asyncio
+async def test_timed_out_branch_is_cancelled_and_summarized_as_partial(execution_logger):
+    value_agent = SlowValueAgent()
+    start = time.time()
+    final_state = await run_analysis(build(value_agent), "分析贵州茅台(600519)")
+
+    assert time.time() - start < 5
+    assert value_agent.cancelled
+    data = final_state["data"]
+    assert data["value_analysis"].startswith("【部分结果】")
+    assert "get_dividend_data" in data["value_analysis"]
+    assert "每股派息 30.876" in data["value_analysis"]
+    assert data["value_analysis_error"] == "Timed out after 0.2s (partial result)"
+    assert data["final_report"].startswith("【部分结果】")
+    assert data["fundamental_analysis"] == "基本面分析"
+
+    node_name, deadline, elapsed, partial, details = execution_logger.log_timeout.call_args.args
+    assert (node_name, deadline, partial, details) == ("value_analyst", 0.2, True, {"tool_calls": 1})
+    assert elapsed >= 0.2
+
+
+@pytest.mark.asyncio
+async def test_timed_out_branch_without_progress_is_marked_unavailable(execution_logger):
+    final_state = await run_analysis(build(SlowValueAgent(call_tool=False)), "分析贵州茅台(600519)")
+
+    data = final_state["data"]
+    assert data["value_analysis"].startswith("【结果不可用】")
+    assert data["value_analysis_error"] == "Timed out after 0.2s"
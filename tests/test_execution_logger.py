@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+import pytest
+
+from src.utils.execution_logger import (ExecutionLogger, finalize_execution_logger,
+                                        get_execution_logger, initialize_execution_logger)
+
+
+async def analysis(name, base_log_dir, step, finish_order):
+    """模拟一次分析：初始化记录器后在子任务中并发记录，再完成日志"""
+    execution_logger = initialize_execution_logger(str(base_log_dir))
+
+    async def node(i):
+        await asyncio.sleep(step)
+        get_execution_logger().record_cache_access(f"{name}_cache", hit=i % 2 == 0)
+
+    await asyncio.gather(*[asyncio.create_task(node(i)) for i in range(4)])
+    assert get_execution_logger() is execution_logger
+    finalize_execution_logger(success=True)
+    finish_order.append(name)
+    return execution_logger
+
+
+@pytest.mark.asyncio
+async def test_concurrent_runs_have_isolated_loggers(tmp_path):
+    finish_order = []
+    fast, slow = await asyncio.gather(
+        asyncio.create_task(analysis("fast", tmp_path, 0.001, finish_order)),
+        asyncio.create_task(analysis("slow", tmp_path, 0.02, finish_order)))
+
+    # 先结束的分析完成日志后，另一个分析仍然写入自己的记录器
+    assert finish_order == ["fast", "slow"]
+    assert fast.execution_dir != slow.execution_dir
+    for execution_logger, name in ((fast, "fast"), (slow, "slow")):
+        with open(execution_logger.execution_dir / "execution_info.json", encoding="utf-8") as f:
+            info = json.load(f)
+        assert info["summary"]["cache_stats"] == {f"{name}_cache": {"hits": 2, "misses": 2}}
+
+
+def test_timeouts_are_logged_and_summarized(tmp_path):
+    execution_logger = ExecutionLogger(str(tmp_path))
+    execution_logger.log_timeout("value_analyst", 180, 180.02, True, {"tool_calls": 3})
+    execution_logger.finalize_execution(success=True)
+
+    with open(execution_logger.execution_dir / "timeouts.jsonl", encoding="utf-8") as f:
+        event = json.loads(f.readline())
+    assert event["node"] == "value_analyst"
+    assert event["tool_calls"] == 3
+    with open(execution_logger.execution_dir / "execution_info.json", encoding="utf-8") as f:
+        assert json.load(f)["summary"]["timeouts"][0]["partial"] is True
+    summary = (execution_logger.execution_dir / "EXECUTION_SUMMARY.md").read_text(encoding="utf-8")
+    assert "value_analyst: 超过截止时间 180s" in summary
@@ -0,0 +1,127 @@
+from collections import Counter
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.utils import incremental
+from src.utils.incremental import AnalysisStore, analysis_fingerprint
+from src.workflow import build_workflow, run_analysis
+
+QUERY = "分析贵州茅台(600519)"
+
+PREFETCHED = {
+    "basic_info": {"get_stock_basic_info": "贵州茅台 白酒"},
+    "financials": {"get_profit_data": "2024Q1 roe 0.12"},
+    "dividends": {"get_dividend_data": "2023 每股派息 30.876"},
+    "valuation": {"get_historical_k_data": "pe 28.5"},
+    "kline": {"get_historical_k_data": "2024-06-03 close 1650"},
+}
+
+
+def make_data(**overrides):
+    prefetched = {**PREFETCHED, **overrides}
+    return {"stock_code": "sh.600519", "query": QUERY, "prefetched": prefetched}
+
+
+class FakeAgents:
+    """记录每个节点的调用次数，预取结果可以在两次运行之间修改"""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.prefetched = dict(PREFETCHED)
+
+    def node(self, name, output_key):
+        async def run(state):
+            self.calls[name] += 1
+            if name == "data_prefetch":
+                return {"data": {"prefetched": dict(self.prefetched)}}
+            return {"data": {output_key: f"{name} output #{self.calls[name]}"}}
+        return run
+
+    def build(self):
+        nodes = {
+            "prefetch_agent": ("data_prefetch", "prefetched"),
+            "fundamental_agent": ("fundamental_analyst", "fundamental_analysis"),
+            "technical_agent": ("technical_analyst", "technical_analysis"),
+            "value_agent": ("value_analyst", "value_analysis"),
+            "summary_agent": ("summarizer", "final_report"),
+        }
+        patches = [patch(f"src.workflow.{attr}", self.node(*spec)) for attr, spec in nodes.items()]
+        for p in patches:
+            p.start()
+        try:
+            return build_workflow()
+        finally:
+            for p in patches:
+                p.stop()
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path):
+    store = AnalysisStore(str(tmp_path / "analyses"))
+    with patch("src.workflow.get_analysis_store", return_value=store), \
+            patch("src.workflow.get_execution_logger", return_value=MagicMock()):
+        yield store
+    incremental.set_incremental_mode(False)
+
+
+def test_fingerprint_depends_only_on_declared_sections():
+    base = analysis_fingerprint("fundamental_agent", make_data())
+    # K线变化不影响基本面分析
+    assert analysis_fingerprint(
+        "fundamental_agent", make_data(kline={"get_historical_k_data": "new"})) == base
+    assert analysis_fingerprint(
+        "fundamental_agent", make_data(financials={"get_profit_data": "2024Q2"})) != base
+    assert analysis_fingerprint(
+        "technical_agent", make_data(kline={"get_historical_k_data": "new"})) != \
+        analysis_fingerprint("technical_agent", make_data())
+
+
+def test_fingerprint_is_none_when_inputs_missing_or_failed():
+    data = make_data()
+    del data["prefetched"]["financials"]
+    assert analysis_fingerprint("fundamental_agent", data) is None
+
+    data = make_data()
+    data["prefetch_errors"] = {"dividends/get_dividend_data": "timeout"}
+    assert analysis_fingerprint("fundamental_agent", data) is None
+    assert analysis_fingerprint("technical_agent", data) is not None
+
+
+def test_store_returns_record_only_for_matching_fingerprint(store):
+    store.save("sh.600519", "fundamental_agent", "abc", "基本面分析")
+    assert store.load("sh.600519", "fundamental_agent", "abc")["analysis"] == "基本面分析"
+    assert store.load("sh.600519", "fundamental_agent", "def") is None
+    assert store.load("sz.000001", "fundamental_agent", "abc") is None
+
+
+@pytest.mark.asyncio
+async def test_incremental_run_reuses_unchanged_analysts():
+    agents = FakeAgents()
+    app = agents.build()
+    await run_analysis(app, QUERY)
+
+    incremental.set_incremental_mode(True)
+    agents.prefetched["kline"] = {"get_historical_k_data": "2024-06-04 close 1662"}
+    final_state = await run_analysis(app, QUERY)
+
+    assert agents.calls["fundamental_analyst"] == 1
+    assert agents.calls["value_analyst"] == 1
+    assert agents.calls["technical_analyst"] == 2
+    assert agents.calls["summarizer"] == 2
+    data = final_state["data"]
+    assert data["fundamental_analysis"] == "fundamental_analyst output #1"
+    assert data["technical_analysis"] == "technical_analyst output #2"
+    assert "fundamental_analysis_reused_from" in data
+    assert "technical_analysis_reused_from" not in data
+
+
+@pytest.mark.asyncio
+async def test_reruns_everything_without_incremental_mode():
+    agents = FakeAgents()
+    app = agents.build()
+    await run_analysis(app, QUERY)
+    await run_analysis(app, QUERY)
+
+    assert agents.calls["fundamental_analyst"] == 2
+    assert agents.calls["value_analyst"] == 2
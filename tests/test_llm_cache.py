@@ -0,0 +1,163 @@
+import json
+import time
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+
+from src.utils.llm_cache import LLMResponseCache, make_llm_cache_key
+
+
+def chat_response(content):
+    return {"id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "test-model",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7}}
+
+
+@pytest.fixture(autouse=True)
+def execution_logger():
+    with patch("src.utils.llm_cache.get_execution_logger", return_value=MagicMock()):
+        yield
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = LLMResponseCache(cache_dir=str(tmp_path / "llm"), max_bytes=10 * 1024 * 1024)
+    with patch("src.utils.llm_registry.get_llm_cache", return_value=cache), \
+            patch("src.utils.llm_clients.get_llm_cache", return_value=cache):
+        yield cache
+
+
+def test_key_ignores_dict_order_and_clock_time():
+    a = {"model": "m", "messages": [{"role": "user", "content": "当前时间 2024-06-03 10:15:42"}]}
+    b = {"messages": [{"role": "user", "content": "当前时间 2024-06-03 10:16:05"}], "model": "m"}
+    c = {"model": "m", "messages": [{"role": "user", "content": "当前时间 2024-06-04 10:15:42"}]}
+    assert make_llm_cache_key(a) == make_llm_cache_key(b)
+    assert make_llm_cache_key(a) != make_llm_cache_key(c)
+
+
+def test_entries_are_content_addressed(cache):
+    payload = {"model": "m", "messages": ["hi"]}
+    cache.set(payload, "hello")
+    key = make_llm_cache_key(payload)
+    assert (cache.cache_dir / key[:2] / f"{key}.json").exists()
+    assert cache.get(payload) == "hello"
+    assert cache.get({"model": "m", "messages": ["bye"]}) is None
+    assert cache.stats == {"hits": 1, "misses": 1, "writes": 1, "evictions": 0}
+
+
+def test_size_bound_evicts_least_recently_used(tmp_path):
+    cache = LLMResponseCache(cache_dir=str(tmp_path), max_bytes=10 ** 6)
+    for i in range(3):
+        cache.set({"i": i}, "x" * 300)
+        time.sleep(0.01)
+    # room for exactly three entries
+    cache.max_bytes = sum(p.stat().st_size for p in tmp_path.glob("*/*.json")) + 10
+    cache.get({"i": 0})  # touch the oldest entry
+    cache.set({"i": 3}, "x" * 300)
+
+    assert cache.get({"i": 0}) is not None
+    assert cache.get({"i": 1}) is None
+    assert cache.stats["evictions"] >= 1
+
+
+def test_writes_do_not_rescan_cache_dir(tmp_path):
+    cache = LLMResponseCache(cache_dir=str(tmp_path), max_bytes=2000)
+    with patch.object(Path, "glob", autospec=True, side_effect=Path.glob) as glob:
+        for i in range(20):
+            cache.set({"i": i}, "x" * 300)
+    # 只在第一次写入时扫描目录，之后按内存中的LRU索引淘汰
+    assert glob.call_count == 1
+    assert cache.stats["evictions"] > 0
+    assert sum(p.stat().st_size for p in tmp_path.glob("*/*.json")) <= 2000
+
+
+def test_bypass_skips_reads_but_refreshes(cache):
+    cache.set({"q": 1}, "old")
+    cache.bypass = True
+    assert cache.get({"q": 1}) is None
+    cache.set({"q": 1}, "new")
+    cache.bypass = False
+    assert cache.get({"q": 1}) == "new"
+
+
+@pytest.mark.asyncio
+async def test_chat_model_replays_from_cache(cache, monkeypatch):
+    from src.utils.llm_registry import ManagedChatOpenAI
+    monkeypatch.setattr("src.utils.rate_limiter.get_execution_logger", MagicMock())
+
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json=chat_response("分析完成"))
+
+    llm = ManagedChatOpenAI(model="test-model", api_key="k", base_url="http://llm.test/v1",
+                            max_retries=0,
+                            http_async_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    first = await llm.ainvoke("分析600000")
+    second = await llm.ainvoke("分析600000")
+
+    assert first.content == second.content == "分析完成"
+    assert len(requests) == 1
+    assert second.tool_calls == []
+
+
+@pytest.mark.asyncio
+async def test_llm_client_completion_is_cached(cache):
+    from unittest.mock import AsyncMock
+    from types import SimpleNamespace
+    from src.utils.llm_clients import OpenAICompatibleClient
+
+    client = OpenAICompatibleClient(api_key="k", base_url="http://llm.test/v1", model="test-model")
+    client.acall_api = AsyncMock(return_value=SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="报告"))]))
+    messages = [{"role": "user", "content": "总结"}]
+
+    assert await client.aget_completion(messages) == "报告"
+    assert await client.aget_completion(messages) == "报告"
+    assert client.acall_api.await_count == 1
+
+
+def sse_response(pieces):
+    events = []
+    for piece in pieces:
+        events.append({"id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0,
+                       "model": "test-model",
+                       "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+    events.append({"id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0,
+                   "model": "test-model", "choices": [],
+                   "usage": {"prompt_tokens": 5, "completion_tokens": 3, "total_tokens": 8}})
+    body = "".join(f"data: {json.dumps(e, ensure_ascii=False)}\n\n" for e in events) + "data: [DONE]\n\n"
+    return httpx.Response(200, content=body.encode("utf-8"),
+                          headers={"content-type": "text/event-stream"})
+
+
+@pytest.mark.asyncio
+async def test_streamed_response_is_cached_and_shared_with_ainvoke(cache, monkeypatch):
+    from src.utils.llm_registry import ManagedChatOpenAI
+    monkeypatch.setattr("src.utils.rate_limiter.get_execution_logger", MagicMock())
+
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return sse_response(["## 执行", "摘要", "\n看涨"])
+
+    llm = ManagedChatOpenAI(model="test-model", api_key="k", base_url="http://llm.test/v1",
+                            max_retries=0, stream_usage=True,
+                            http_async_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    streamed = [chunk async for chunk in llm.astream("总结")]
+    replayed = [chunk async for chunk in llm.astream("总结")]
+    invoked = await llm.ainvoke("总结")
+
+    assert "".join(c.content for c in streamed) == "## 执行摘要\n看涨"
+    assert sum(c.usage_metadata["total_tokens"] for c in streamed if c.usage_metadata) == 8
+    assert requests[0]["stream_options"] == {"include_usage": True}
+    assert len(requests) == 1
+    assert "".join(c.content for c in replayed) == invoked.content == "## 执行摘要\n看涨"
+    assert replayed[0].response_metadata["llm_cache_hit"] is True
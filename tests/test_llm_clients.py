@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src.utils.llm_clients import GeminiClient, LLMClient, OpenAICompatibleClient
+
+MESSAGES = [{"role": "system", "content": "你是分析师"}, {"role": "user", "content": "分析600000"}]
+
+
+def chat_response(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture(autouse=True)
+def disable_llm_cache(monkeypatch):
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "false")
+
+
+@pytest.fixture
+def openai_client():
+    return OpenAICompatibleClient(api_key="test-key", base_url="http://localhost:1/v1", model="test-model")
+
+
+@pytest.mark.asyncio
+async def test_openai_aget_completion_uses_async_client(openai_client):
+    create = AsyncMock(return_value=chat_response("报告"))
+    openai_client.async_client.chat.completions.create = create
+
+    assert await openai_client.aget_completion(MESSAGES) == "报告"
+    create.assert_awaited_once_with(model="test-model", messages=MESSAGES, stream=False)
+
+
+@pytest.mark.asyncio
+async def test_openai_aget_completion_retries_without_blocking(openai_client):
+    openai_client.acall_api = AsyncMock(
+        side_effect=[TimeoutError("timed out"), chat_response("第二次成功")])
+
+    with patch("src.utils.retry_policy.asyncio.sleep", new=AsyncMock()) as async_sleep, \
+            patch("src.utils.retry_policy.time.sleep") as blocking_sleep, \
+            patch("src.utils.retry_policy.get_execution_logger"):
+        result = await openai_client.aget_completion(MESSAGES, initial_retry_delay=2)
+
+    assert result == "第二次成功"
+    async_sleep.assert_awaited_once()
+    assert 0 <= async_sleep.await_args.args[0] <= 2
+    blocking_sleep.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_gemini_aget_completion_builds_prompt():
+    client = GeminiClient(api_key="test-key", model="gemini-test")
+    client.agenerate_content = AsyncMock(return_value=SimpleNamespace(text="结果"))
+
+    assert await client.aget_completion(MESSAGES) == "结果"
+    client.agenerate_content.assert_awaited_once_with(
+        contents="User: 分析600000", config={"system_instruction": "你是分析师"})
+
+
+@pytest.mark.asyncio
+async def test_default_aget_completion_runs_sync_client_in_thread():
+    class SyncOnlyClient(LLMClient):
+        def get_completion(self, messages, **kwargs):
+            return "sync"
+
+    assert await SyncOnlyClient().aget_completion(MESSAGES) == "sync"
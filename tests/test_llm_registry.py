@@ -0,0 +1,76 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from langchain_core.tools import StructuredTool
+
+from src.utils.llm_registry import LLMRegistry, react_recursion_limit
+
+
+def make_tool(name):
+    async def call(**kwargs):
+        return ""
+    return StructuredTool(
+        name=name, description=f"{name} description", coroutine=call,
+        args_schema={"type": "object", "properties": {"code": {"type": "string"}}})
+
+
+@pytest.fixture(autouse=True)
+def llm_env(monkeypatch):
+    monkeypatch.setenv("OPENAI_COMPATIBLE_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_COMPATIBLE_BASE_URL", "http://localhost:1/v1")
+    monkeypatch.setenv("OPENAI_COMPATIBLE_MODEL", "test-model")
+    with patch("src.utils.llm_registry.get_execution_logger", return_value=MagicMock()):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_agents_are_compiled_once_per_config_and_toolset():
+    registry = LLMRegistry()
+    tools = [make_tool("get_stock_basic_info"), make_tool("get_historical_k_data")]
+
+    first = registry.get_react_agent(tools, temperature=0.3, max_tokens=3000)
+    second = registry.get_react_agent(list(reversed(tools)), temperature=0.3, max_tokens=3000)
+    other_toolset = registry.get_react_agent(tools[:1], temperature=0.3, max_tokens=3000)
+
+    assert first is second
+    assert other_toolset is not first
+    assert registry.stats["agent_misses"] == 2
+    assert registry.stats["agent_hits"] == 1
+    await registry.close()
+
+
+@pytest.mark.asyncio
+async def test_models_share_one_http_client():
+    registry = LLMRegistry()
+    analyst = registry.get_chat_model(temperature=0.3, max_tokens=3000)
+    summarizer = registry.get_chat_model(temperature=0.5, max_tokens=10000)
+
+    assert analyst is not summarizer
+    assert analyst.http_async_client is summarizer.http_async_client
+    assert registry.get_chat_model(temperature=0.3, max_tokens=3000) is analyst
+
+    http_client = registry.get_http_client()
+    await registry.close()
+    assert http_client.is_closed
+
+
+@pytest.mark.asyncio
+async def test_config_change_invalidates_entries(monkeypatch):
+    registry = LLMRegistry()
+    before = registry.get_chat_model(temperature=0.3, max_tokens=3000)
+
+    monkeypatch.setenv("OPENAI_COMPATIBLE_MODEL", "another-model")
+    after = registry.get_chat_model(temperature=0.3, max_tokens=3000)
+
+    assert after is not before
+    assert after.model_name == "another-model"
+    assert registry.stats["invalidations"] == 1
+    await registry.close()
+
+
+def test_settings_are_read_when_used(monkeypatch):
+    # 入口在导入本模块之后才加载.env，配置必须在使用时读取
+    monkeypatch.setenv("REACT_RECURSION_LIMIT", "7")
+    monkeypatch.setenv("LLM_HTTP_TIMEOUT", "5")
+    assert react_recursion_limit() == 7
+    assert LLMRegistry().get_http_client().timeout.read == 5
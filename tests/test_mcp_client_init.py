@@ -0,0 +1,88 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import src.tools.mcp_client as mcp_client
+
+
+class SlowPool:
+    """Stands in for MCPSessionPool; start() yields so callers overlap."""
+
+    instances = 0
+
+    def __init__(self, *args, **kwargs):
+        SlowPool.instances += 1
+        self.started = False
+
+    async def start(self):
+        await asyncio.sleep(0.05)
+        self.started = True
+
+    async def list_tools(self):
+        return [SimpleNamespace(name="get_stock_basic_info", description="basic info",
+                                inputSchema={"type": "object", "properties": {}})]
+
+    async def close(self):
+        self.started = False
+
+
+@pytest.fixture(autouse=True)
+def reset_client_state():
+    SlowPool.instances = 0
+    mcp_client._session_pool = None
+    mcp_client._mcp_tools = None
+    mcp_client._init_stats["max_concurrent_waiters"] = 0
+    with patch.object(mcp_client, "MCPSessionPool", SlowPool), \
+            patch.object(mcp_client, "print_tool_details"), \
+            patch.object(mcp_client, "get_execution_logger", return_value=MagicMock()):
+        yield
+    mcp_client._session_pool = None
+    mcp_client._mcp_tools = None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_get_mcp_tools_creates_one_pool():
+    results = await asyncio.gather(*(mcp_client.get_mcp_tools() for _ in range(5)))
+
+    assert SlowPool.instances == 1
+    assert all(tools is results[0] for tools in results)
+    assert [tool.name for tool in results[0]] == ["get_stock_basic_info"]
+
+    stats = mcp_client.get_mcp_init_stats()
+    assert stats["max_concurrent_waiters"] == 5
+    assert stats["tool_count"] == 1
+    assert stats["init_seconds"] >= 0.05
+
+    await mcp_client.close_mcp_client_sessions()
+
+
+@pytest.mark.asyncio
+async def test_warmup_starts_and_close_cancels_refresh():
+    await mcp_client.warmup_mcp_tools(refresh_interval=0.01)
+    refresh_task = mcp_client._refresh_task
+    assert refresh_task is not None
+
+    await asyncio.sleep(0.05)
+    assert mcp_client.get_mcp_init_stats()["refreshes"] >= 1
+
+    await mcp_client.close_mcp_client_sessions()
+    await asyncio.sleep(0)
+    assert refresh_task.cancelled()
+    assert mcp_client._refresh_task is None
+
+
+def test_tool_cache_is_created_on_first_use(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "mcp_tools"
+    monkeypatch.setenv("MCP_TOOL_CACHE_DIR", str(cache_dir))
+    monkeypatch.setattr(mcp_client, "_tool_cache", None)
+
+    monkeypatch.setenv("MCP_TOOL_CACHE_ENABLED", "false")
+    assert mcp_client.get_tool_cache() is None
+    assert not cache_dir.exists()
+
+    monkeypatch.setenv("MCP_TOOL_CACHE_ENABLED", "true")
+    cache = mcp_client.get_tool_cache()
+    assert cache is mcp_client.get_tool_cache()
+    assert cache_dir.exists()
@@ -0,0 +1,99 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import anyio
+import pytest
+
+from src.tools.mcp_session_pool import MCPSessionPool, is_transport_error
+
+
+class FakeSession:
+    def __init__(self, index):
+        self.index = index
+        self.broken = False
+        self.calls = []
+
+    async def call_tool(self, name, arguments):
+        if self.broken:
+            raise anyio.ClosedResourceError()
+        self.calls.append((name, arguments))
+        await asyncio.sleep(0)
+        return SimpleNamespace(session=self.index, name=name, arguments=arguments)
+
+    async def list_tools(self, cursor=None):
+        return SimpleNamespace(tools=[SimpleNamespace(name="get_stock_basic_info")], nextCursor=None)
+
+
+class FakeClient:
+    """Mimics MultiServerMCPClient.session() without spawning processes."""
+
+    def __init__(self):
+        self.opened = 0
+        self.closed = 0
+        self.sessions = []
+
+    @asynccontextmanager
+    async def session(self, server_name):
+        session = FakeSession(self.opened)
+        self.opened += 1
+        self.sessions.append(session)
+        try:
+            yield session
+        finally:
+            self.closed += 1
+
+
+@pytest.mark.asyncio
+async def test_pool_starts_sessions_once_and_reuses_them():
+    client = FakeClient()
+    pool = MCPSessionPool({}, "a_share_mcp_v2", size=2, client=client)
+    await pool.start()
+
+    results = await asyncio.gather(
+        *(pool.call_tool("get_stock_basic_info", {"code": "sh.600000"}) for _ in range(10)))
+
+    assert len(results) == 10
+    assert client.opened == 2  # no per-call spawning
+    assert pool.stats["calls"] == 10
+
+    await pool.close()
+    assert client.closed == 2
+
+
+@pytest.mark.asyncio
+async def test_pool_restarts_crashed_session_and_retries():
+    client = FakeClient()
+    pool = MCPSessionPool({}, "a_share_mcp_v2", size=1, client=client)
+    await pool.start()
+
+    client.sessions[0].broken = True
+    result = await pool.call_tool("get_stock_basic_info", {"code": "sz.000001"})
+
+    assert result.session == 1
+    assert pool.stats["restarts"] == 1
+    assert client.opened == 2
+
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_list_tools():
+    pool = MCPSessionPool({}, "a_share_mcp_v2", size=1, client=FakeClient())
+    await pool.start()
+    tools = await pool.list_tools()
+    assert [tool.name for tool in tools] == ["get_stock_basic_info"]
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_acquire_requires_started_pool():
+    pool = MCPSessionPool({}, "a_share_mcp_v2", size=1, client=FakeClient())
+    with pytest.raises(RuntimeError, match="not started"):
+        await pool.call_tool("get_stock_basic_info", {})
+
+
+def test_is_transport_error():
+    assert is_transport_error(anyio.BrokenResourceError())
+    assert is_transport_error(BrokenPipeError())
+    assert not is_transport_error(ValueError("bad args"))
@@ -0,0 +1,79 @@
+import io
+from unittest.mock import MagicMock, patch
+
+import pytest
+from langchain_core.tools import tool
+
+from src.utils.progress import ConsoleProgress
+from src.workflow import build_workflow, run_analysis
+
+
+@tool
+def get_stock_basic_info(code: str) -> str:
+    """查询股票基本信息"""
+    return f"{code} 基本信息"
+
+
+async def analyst(state):
+    await get_stock_basic_info.ainvoke({"code": "sh.600519"})
+    return {"data": {"fundamental_analysis": "基本面分析"}}
+
+
+async def failing_technical(state):
+    return {"data": {"technical_analysis": "失败", "technical_analysis_error": "timeout"}}
+
+
+async def node(state):
+    return {"data": {}}
+
+
+@pytest.fixture
+def app():
+    with patch("src.workflow.prefetch_agent", node), \
+            patch("src.workflow.fundamental_agent", analyst), \
+            patch("src.workflow.technical_agent", failing_technical), \
+            patch("src.workflow.value_agent", node), \
+            patch("src.workflow.summary_agent", node), \
+            patch("src.workflow.get_execution_logger", return_value=MagicMock()):
+        yield build_workflow()
+
+
+@pytest.mark.asyncio
+async def test_run_analysis_reports_node_and_tool_progress(app):
+    events = []
+    final_state = await run_analysis(app, "分析贵州茅台(600519)", on_event=events.append)
+
+    assert final_state["data"]["fundamental_analysis"] == "基本面分析"
+    started = [event["node"] for event in events if event["type"] == "node_start"]
+    assert started[0] == "data_prefetch"
+    assert started[-1] == "summarizer"
+    assert set(started) == {"data_prefetch", "fundamental_analyst", "technical_analyst",
+                            "value_analyst", "summarizer"}
+
+    tools = [event for event in events if event["type"].startswith("tool_")]
+    assert [(event["type"], event["node"], event["tool"]) for event in tools] == [
+        ("tool_start", "fundamental_analyst", "get_stock_basic_info"),
+        ("tool_end", "fundamental_analyst", "get_stock_basic_info"),
+    ]
+
+    statuses = {event["node"]: event["status"] for event in events if event["type"] == "node_end"}
+    assert statuses["technical_analyst"] == "failed"
+    assert statuses["fundamental_analyst"] == "completed"
+    assert all(event["elapsed"] >= 0 for event in events)
+
+
+def test_console_progress_summarizes_tokens_and_tools():
+    stream = io.StringIO()
+    progress = ConsoleProgress(stream)
+    progress({"type": "node_start", "node": "technical_analyst", "elapsed": 0.1})
+    progress({"type": "tool_start", "node": "technical_analyst",
+              "tool": "get_historical_k_data", "elapsed": 0.2})
+    progress({"type": "token", "node": "technical_analyst", "text": "趋势向上", "elapsed": 1.0})
+    progress({"type": "node_end", "node": "technical_analyst", "status": "completed",
+              "duration": 1.5, "elapsed": 1.6})
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 3
+    assert "技术面分析 开始" in lines[0]
+    assert "调用工具 get_historical_k_data" in lines[1]
+    assert "技术面分析 完成 (1.5s, 1 次工具调用, 输出 4 字)" in lines[2]
@@ -0,0 +1,75 @@
+import asyncio
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.utils.rate_limiter import (RateLimiter, estimate_request_tokens, estimate_text_tokens,
+                                    get_rate_limiter, reset_rate_limiters)
+
+
+@pytest.fixture(autouse=True)
+def execution_logger():
+    with patch("src.utils.rate_limiter.get_execution_logger", return_value=MagicMock()):
+        yield
+    reset_rate_limiters()
+
+
+def test_token_estimates():
+    assert estimate_text_tokens("分析贵州茅台") == 6
+    assert estimate_text_tokens("abcdefgh") == 2
+    messages = [{"role": "user", "content": "abcd"}]
+    assert estimate_request_tokens(messages, max_tokens=100) == 1 + 4 + 100
+
+
+@pytest.mark.asyncio
+async def test_disabled_limiter_does_not_wait():
+    limiter = RateLimiter()
+    start = time.monotonic()
+    for _ in range(100):
+        await limiter.acquire(1000)
+    assert time.monotonic() - start < 0.1
+
+
+@pytest.mark.asyncio
+async def test_rpm_limit_delays_requests():
+    limiter = RateLimiter(rpm=600)  # 10 requests/second
+    limiter.requests.tokens = 0
+
+    start = time.monotonic()
+    await limiter.acquire()
+    assert 0.05 <= time.monotonic() - start < 0.5
+    assert limiter.stats["throttled"] == 1
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_released_in_arrival_order():
+    limiter = RateLimiter(rpm=1200)  # one request every 50ms
+    limiter.requests.tokens = 0
+    order = []
+
+    async def request(i):
+        await limiter.acquire()
+        order.append(i)
+
+    await asyncio.gather(*(request(i) for i in range(5)))
+    assert order == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_tpm_reservation_is_reconciled_with_actual_usage():
+    limiter = RateLimiter(tpm=10000)
+    reserved = await limiter.acquire(4000)
+    assert limiter.tokens.tokens == pytest.approx(6000, abs=5)
+
+    limiter.reconcile(reserved, 1000)
+    assert limiter.tokens.tokens == pytest.approx(9000, abs=5)
+    assert limiter.stats["actual_tokens"] == 1000
+
+
+def test_limiters_are_shared_per_endpoint_and_model(monkeypatch):
+    monkeypatch.setenv("LLM_RATE_LIMIT_RPM", "60")
+    first = get_rate_limiter("https://api.example.com/v1", "model-a")
+    assert get_rate_limiter("https://api.example.com/v1", "model-a") is first
+    assert get_rate_limiter("https://api.example.com/v1", "model-b") is not first
+    assert first.requests.capacity == 60
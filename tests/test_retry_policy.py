@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.utils.retry_policy import RetryPolicy, is_retryable_error, retry_after_seconds
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+@pytest.fixture
+def execution_logger():
+    logger = MagicMock()
+    with patch("src.utils.retry_policy.get_execution_logger", return_value=logger):
+        yield logger
+
+
+@pytest.fixture
+def no_sleep():
+    with patch("src.utils.retry_policy.asyncio.sleep", new=AsyncMock()) as sleep:
+        yield sleep
+
+
+def test_error_classification():
+    assert is_retryable_error(StatusError(429))
+    assert is_retryable_error(StatusError(503))
+    assert is_retryable_error(TimeoutError())
+    assert is_retryable_error(ConnectionResetError())
+    assert not is_retryable_error(StatusError(400))
+    assert not is_retryable_error(StatusError(401))
+    assert not is_retryable_error(ValueError("bad request"))
+
+
+def test_retry_after_header():
+    assert retry_after_seconds(StatusError(429, {"retry-after": "7"})) == 7
+    assert retry_after_seconds(StatusError(429, {"retry-after-ms": "1500"})) == 1.5
+    assert retry_after_seconds(StatusError(429)) is None
+
+
+def test_full_jitter_is_capped():
+    policy = RetryPolicy(base_delay=1, max_delay=5)
+    for attempt in range(6):
+        assert 0 <= policy.compute_delay(attempt, TimeoutError()) <= min(5, 2 ** attempt)
+    assert policy.compute_delay(0, StatusError(429, {"retry-after": "3"})) == 3
+
+
+@pytest.mark.asyncio
+async def test_retries_until_success_and_records(execution_logger, no_sleep):
+    func = AsyncMock(side_effect=[StatusError(502), StatusError(429), "ok"])
+    policy = RetryPolicy(max_attempts=4, total_budget=60, name="test")
+
+    assert await policy.acall(func) == "ok"
+    assert func.await_count == 3
+    name, retries, _, success = execution_logger.record_retry.call_args.args
+    assert (name, retries, success) == ("test", 2, True)
+
+
+@pytest.mark.asyncio
+async def test_non_retryable_error_is_raised_immediately(execution_logger, no_sleep):
+    func = AsyncMock(side_effect=StatusError(400))
+    with pytest.raises(StatusError):
+        await RetryPolicy().acall(func)
+    assert func.await_count == 1
+    no_sleep.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_gives_up_when_budget_exhausted(execution_logger, no_sleep):
+    func = AsyncMock(side_effect=StatusError(429, {"retry-after": "30"}))
+    policy = RetryPolicy(max_attempts=10, total_budget=10)
+
+    with pytest.raises(StatusError):
+        await policy.acall(func)
+    assert func.await_count == 1
+    assert execution_logger.record_retry.call_args.args[3] is False
+
+
+def test_sync_call_respects_max_attempts(execution_logger):
+    func = MagicMock(side_effect=TimeoutError())
+    with patch("src.utils.retry_policy.time.sleep"):
+        with pytest.raises(TimeoutError):
+            RetryPolicy(max_attempts=3, base_delay=0.01).call(func)
+    assert func.call_count == 3
@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.server import create_app
+from src.utils.execution_logger import get_execution_logger
+
+
+class FakeWorkflow:
+    """模拟工作流：每个查询写入自己的执行日志，阻塞查询一直等到被取消"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+
+    async def ainvoke(self, state, config=None):
+        query = state["data"]["query"]
+        execution_logger = get_execution_logger()
+        execution_logger.record_cache_access(f"cache_{query}", True)
+        if query == "block":
+            await asyncio.sleep(3600)
+        await self.release.wait()
+        return {"data": {**state["data"], "final_report": f"# {query} 报告",
+                         "report_path": f"/reports/{query}.md",
+                         "log_dir": str(execution_logger.execution_dir)}}
+
+    async def astream_events(self, state, config=None, version=None):
+        """只产生总结节点的事件和token流，最后是整个图的结束事件"""
+        node_event = {"name": "summarizer", "run_id": "run-1",
+                      "metadata": {"langgraph_node": "summarizer"}, "parent_ids": ["root"]}
+        yield {**node_event, "event": "on_chain_start", "data": {}}
+        final_state = await self.ainvoke(state, config=config)
+        yield {**node_event, "event": "on_chat_model_stream", "name": "ChatOpenAI",
+               "data": {"chunk": type("Chunk", (), {"content": "报告"})()}}
+        yield {**node_event, "event": "on_chain_end", "data": {"output": {"data": {}}}}
+        yield {"event": "on_chain_end", "name": "LangGraph", "run_id": "root",
+               "metadata": {}, "parent_ids": [], "data": {"output": final_state}}
+
+
+@pytest_asyncio.fixture
+async def client(tmp_path):
+    workflow = FakeWorkflow()
+    app = create_app(workflow=workflow, warmup=False, log_dir=str(tmp_path), max_concurrency=4)
+    async with TestClient(TestServer(app)) as client:
+        client.workflow = workflow
+        yield client
+
+
+async def wait_for_status(client, job_id, statuses=("completed", "failed", "cancelled")):
+    for _ in range(200):
+        info = await (await client.get(f"/analyses/{job_id}")).json()
+        if info["status"] in statuses:
+            return info
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} stuck in {info['status']}")
+
+
+@pytest.mark.asyncio
+async def test_concurrent_jobs_get_isolated_execution_logs(client):
+    ids = []
+    for query in ("600519", "000001"):
+        response = await client.post("/analyses", json={"query": query})
+        assert response.status == 202
+        ids.append((await response.json())["id"])
+    await wait_for_status(client, ids[0], ("running",))
+    await wait_for_status(client, ids[1], ("running",))
+    client.workflow.release.set()
+
+    first, second = [await wait_for_status(client, job_id) for job_id in ids]
+    assert first["status"] == second["status"] == "completed"
+    assert first["result"]["final_report"] == "# 600519 报告"
+    assert first["log_dir"] != second["log_dir"]
+
+    with open(f"{first['log_dir']}/execution_info.json", encoding="utf-8") as f:
+        cache_stats = json.load(f)["summary"]["cache_stats"]
+    assert list(cache_stats) == ["cache_600519"]
+
+
+@pytest.mark.asyncio
+async def test_stream_ends_with_result_event(client):
+    job_id = (await (await client.post("/analyses", json={"query": "600519"})).json())["id"]
+    await wait_for_status(client, job_id, ("running",))
+
+    response = await client.get(f"/analyses/{job_id}/stream")
+    client.workflow.release.set()
+    body = (await response.read()).decode("utf-8")
+
+    events = [line.split(": ", 1)[1] for line in body.splitlines() if line.startswith("event: ")]
+    assert events[0] == "status"
+    assert events[-1] == "result"
+    assert "# 600519 报告" in body
+
+    progress = [json.loads(line.split(": ", 1)[1]) for event, line in
+                zip(events, [line for line in body.splitlines() if line.startswith("data: ")])
+                if event == "progress"]
+    assert [event["type"] for event in progress] == ["node_start", "token", "node_end"]
+    assert progress[-1]["status"] == "completed"
+
+
+@pytest.mark.asyncio
+async def test_token_events_are_not_replayed_to_late_subscribers(client):
+    client.workflow.release.set()
+    job_id = (await (await client.post("/analyses", json={"query": "600519"})).json())["id"]
+    await wait_for_status(client, job_id)
+
+    body = (await (await client.get(f"/analyses/{job_id}/stream")).read()).decode("utf-8")
+    assert '"node_start"' in body
+    assert '"token"' not in body
+
+
+@pytest.mark.asyncio
+async def test_cancel_running_job(client):
+    job_id = (await (await client.post("/analyses", json={"query": "block"})).json())["id"]
+    await wait_for_status(client, job_id, ("running",))
+
+    response = await client.delete(f"/analyses/{job_id}")
+    assert response.status == 202
+    info = await wait_for_status(client, job_id)
+    assert info["status"] == "cancelled"
+
+    assert (await client.delete(f"/analyses/{job_id}")).status == 409
+
+
+@pytest.mark.asyncio
+async def test_health_and_validation(client):
+    assert (await client.post("/analyses", json={})).status == 400
+    assert (await client.get("/analyses/missing")).status == 404
+
+    health = await (await client.get("/health")).json()
+    assert health["status"] == "ok"
+    assert health["max_concurrency"] == 4
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from src.tools.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_calls_share_one_execution():
+    flight = SingleFlight()
+    executions = 0
+
+    async def fetch():
+        nonlocal executions
+        executions += 1
+        await asyncio.sleep(0.01)
+        return "basic info"
+
+    results = await asyncio.gather(*(flight.do("get_stock_basic_info(sh.600000)", fetch) for _ in range(3)))
+
+    assert results == ["basic info"] * 3
+    assert executions == 1
+    assert not flight.in_flight("get_stock_basic_info(sh.600000)")
+
+
+@pytest.mark.asyncio
+async def test_different_keys_are_not_merged():
+    flight = SingleFlight()
+    executions = 0
+
+    async def fetch():
+        nonlocal executions
+        executions += 1
+        await asyncio.sleep(0)
+        return 1
+
+    await asyncio.gather(flight.do("a", fetch), flight.do("b", fetch))
+    assert executions == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_with_all_waiters():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise ValueError("MCP error")
+
+    results = await asyncio.gather(flight.do("k", fetch), flight.do("k", fetch), return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_cancelling_one_waiter_keeps_call_alive_for_others():
+    flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def fetch():
+        started.set()
+        await asyncio.sleep(0.05)
+        return "done"
+
+    first = asyncio.create_task(flight.do("k", fetch))
+    await started.wait()
+    second = asyncio.create_task(flight.do("k", fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "done"
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+
+@pytest.mark.asyncio
+async def test_call_is_cancelled_when_all_waiters_cancel():
+    flight = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def fetch():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    waiter = asyncio.create_task(flight.do("k", fetch))
+    await asyncio.sleep(0.01)
+    waiter.cancel()
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
@@ -0,0 +1,100 @@
+import time
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from src.tools.tool_cache import (
+    CHINA_TZ, ToolResultCache, TradingCalendar, compute_expiry, make_cache_key)
+
+
+def test_cache_key_normalizes_arguments():
+    key_a = make_cache_key("get_profit_data", {"code": "SH.600000", "year": 2024, "quarter": 1})
+    key_b = make_cache_key("get_profit_data", {"quarter": "1", "year": "2024", "code": " sh.600000 "})
+    key_c = make_cache_key("get_growth_data", {"code": "sh.600000", "year": 2024, "quarter": 1})
+    assert key_a == key_b
+    assert key_a != key_c
+
+
+def test_intraday_kline_expires_in_minutes():
+    now = datetime(2025, 3, 4, 10, 0, tzinfo=CHINA_TZ)  # Tuesday
+    expiry = compute_expiry("get_historical_k_data", {"frequency": "5"}, now=now)
+    assert expiry - now.timestamp() == 5 * 60
+
+
+def test_daily_bars_expire_at_next_trading_day_close():
+    friday_evening = datetime(2025, 3, 7, 20, 0, tzinfo=CHINA_TZ)
+    expiry = compute_expiry("get_historical_k_data", {"frequency": "d"}, now=friday_evening)
+    assert datetime.fromtimestamp(expiry, CHINA_TZ) == datetime(2025, 3, 10, 17, 30, tzinfo=CHINA_TZ)
+
+    tuesday_morning = datetime(2025, 3, 4, 9, 0, tzinfo=CHINA_TZ)
+    expiry = compute_expiry("get_historical_k_data", {}, now=tuesday_morning)
+    assert datetime.fromtimestamp(expiry, CHINA_TZ) == datetime(2025, 3, 4, 17, 30, tzinfo=CHINA_TZ)
+
+
+def test_holidays_are_skipped():
+    calendar = TradingCalendar(["2025-03-10"])
+    friday_evening = datetime(2025, 3, 7, 20, 0, tzinfo=CHINA_TZ)
+    expiry = compute_expiry("get_stock_basic_info", {}, now=friday_evening, calendar=calendar)
+    assert datetime.fromtimestamp(expiry, CHINA_TZ).date().isoformat() == "2025-03-11"
+
+
+def test_quarterly_data_expires_at_next_reporting_season():
+    june = datetime(2025, 6, 10, 12, 0, tzinfo=CHINA_TZ)
+    expiry = compute_expiry("get_profit_data", {"year": "2024", "quarter": 4}, now=june)
+    assert datetime.fromtimestamp(expiry, CHINA_TZ) == datetime(2025, 7, 1, tzinfo=CHINA_TZ)
+
+    # Inside a disclosure window new reports can land any day.
+    april = datetime(2025, 4, 15, 20, 0, tzinfo=CHINA_TZ)
+    expiry = compute_expiry("get_profit_data", {}, now=april)
+    assert datetime.fromtimestamp(expiry, CHINA_TZ) == datetime(2025, 4, 16, 17, 30, tzinfo=CHINA_TZ)
+
+
+def test_memory_lru_eviction():
+    cache = ToolResultCache(max_entries=2)
+    future = time.time() + 60
+    cache.set("t", {"code": "a"}, "A", expires_at=future)
+    cache.set("t", {"code": "b"}, "B", expires_at=future)
+    assert cache.get("t", {"code": "a"}) == "A"  # refresh "a"
+    cache.set("t", {"code": "c"}, "C", expires_at=future)
+
+    assert cache.get("t", {"code": "b"}) is None
+    assert cache.get("t", {"code": "a"}) == "A"
+    assert cache.stats["evictions"] == 1
+
+
+def test_expired_entries_are_misses():
+    cache = ToolResultCache()
+    cache.set("t", {"code": "a"}, "A", expires_at=time.time() - 1)
+    assert cache.get("t", {"code": "a"}) is None
+    assert cache.stats["misses"] == 1
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    future = time.time() + 60
+    first = ToolResultCache(cache_dir=tmp_path)
+    first.set("get_stock_basic_info", {"code": "sh.600000"}, "basic", expires_at=future)
+
+    second = ToolResultCache(cache_dir=tmp_path)
+    assert second.get("get_stock_basic_info", {"code": "sh.600000"}) == "basic"
+    assert second.stats["disk_hits"] == 1
+
+
+def test_disk_tier_is_size_capped(tmp_path):
+    cache = ToolResultCache(max_entries=1, cache_dir=tmp_path, max_disk_entries=2)
+    future = time.time() + 60
+    for code in ("a", "b", "c"):
+        cache.set("t", {"code": code}, code, expires_at=future)
+    assert len(list(tmp_path.glob("*.json"))) == 2
+
+
+def test_disk_writes_do_not_rescan_cache_dir(tmp_path):
+    cache = ToolResultCache(max_entries=1, cache_dir=tmp_path, max_disk_entries=3)
+    future = time.time() + 60
+    with patch.object(Path, "glob", autospec=True, side_effect=Path.glob) as glob:
+        for code in "abcdefgh":
+            cache.set("t", {"code": code}, code, expires_at=future)
+    assert glob.call_count == 1
+    assert len(list(tmp_path.glob("*.json"))) == 3
+    assert cache.get("t", {"code": "h"}) == "h"
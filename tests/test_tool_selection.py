@@ -0,0 +1,78 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from langchain_core.tools import StructuredTool
+
+from src.tools.tool_selection import (AGENT_TOOLSETS, estimate_schema_tokens,
+                                      select_tools_for_agent)
+
+TOOL_NAMES = [
+    "get_stock_basic_info", "get_historical_k_data", "get_adjust_factor_data",
+    "get_profit_data", "get_balance_data", "get_dividend_data", "get_stock_industry",
+    "get_hs300_stocks", "get_shibor_data", "get_loan_rate_data", "get_money_supply_data_month",
+]
+
+
+def make_tool(name):
+    async def call(**kwargs):
+        return ""
+    return StructuredTool(
+        name=name, description=f"{name} description", coroutine=call,
+        args_schema={"type": "object", "properties": {"code": {"type": "string"}}})
+
+
+@pytest.fixture
+def tools():
+    return [make_tool(name) for name in TOOL_NAMES]
+
+
+@pytest.fixture(autouse=True)
+def execution_logger():
+    logger = MagicMock()
+    with patch("src.tools.tool_selection.get_execution_logger", return_value=logger):
+        yield logger
+
+
+def test_technical_agent_gets_kline_tools_only(tools, execution_logger):
+    selected = select_tools_for_agent("technical_agent", tools)
+    assert [tool.name for tool in selected] == [
+        "get_stock_basic_info", "get_historical_k_data", "get_adjust_factor_data"]
+
+    name, stats = execution_logger.log_component_stats.call_args.args
+    assert name == "tool_selection.technical_agent"
+    assert stats["schema_tokens_saved"] > 0
+    assert stats["fallback"] is False
+
+
+def test_patterns_match_tag_wildcards(tools):
+    selected = {tool.name for tool in select_tools_for_agent("value_agent", tools)}
+    assert {"get_hs300_stocks", "get_loan_rate_data", "get_money_supply_data_month"} <= selected
+
+
+def test_missing_required_tool_falls_back_to_full_set(tools, execution_logger):
+    without_kline = [tool for tool in tools if tool.name != "get_historical_k_data"]
+    assert select_tools_for_agent("technical_agent", without_kline) == without_kline
+    assert execution_logger.log_component_stats.call_args.args[1]["fallback"] is True
+
+
+def test_unknown_agent_gets_full_set(tools):
+    assert select_tools_for_agent("summary_agent", tools) is tools
+
+
+def test_custom_toolsets(tools):
+    toolsets = {"custom_agent": {"patterns": ["get_*_rate_data"], "required": []}}
+    selected = select_tools_for_agent("custom_agent", tools, toolsets)
+    assert [tool.name for tool in selected] == ["get_loan_rate_data"]
+
+
+def test_estimate_schema_tokens_grows_with_tools(tools):
+    assert estimate_schema_tokens(tools) > estimate_schema_tokens(tools[:1]) > 0
+    assert set(AGENT_TOOLSETS) == {"fundamental_agent", "technical_agent", "value_agent"}
+
+
+def test_schema_tokens_are_estimated_once_per_toolset(tools, execution_logger):
+    select_tools_for_agent("technical_agent", tools)
+    with patch("src.tools.tool_selection.estimate_schema_tokens") as estimate:
+        select_tools_for_agent("technical_agent", [make_tool(name) for name in TOOL_NAMES])
+    estimate.assert_not_called()
+    assert execution_logger.log_component_stats.call_count == 2
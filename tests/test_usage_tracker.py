@@ -0,0 +1,75 @@
+import json
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+
+from src.utils.execution_logger import ExecutionLogger
+from src.utils.usage_tracker import UsageCallbackHandler, compute_cost, reset_price_table
+
+PRICES = {"test-model": {"input": 2.0, "cached_input": 1.0, "output": 8.0}}
+
+
+def chat_response(content, prompt_tokens, completion_tokens, cached_tokens=0):
+    return {"id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "test-model",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens,
+                      "prompt_tokens_details": {"cached_tokens": cached_tokens}}}
+
+
+@pytest.fixture(autouse=True)
+def price_table(monkeypatch):
+    monkeypatch.setenv("LLM_PRICE_TABLE", json.dumps(PRICES))
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "false")
+    reset_price_table()
+    yield
+    reset_price_table()
+
+
+@pytest.fixture
+def execution_logger(tmp_path):
+    logger = ExecutionLogger(base_log_dir=str(tmp_path))
+    with patch("src.utils.usage_tracker.get_execution_logger", return_value=logger), \
+            patch("src.utils.rate_limiter.get_execution_logger", return_value=logger):
+        yield logger
+
+
+def test_compute_cost_uses_cached_input_price():
+    # 1000 uncached + 1000 cached prompt tokens, 500 output tokens
+    assert compute_cost("test-model", 2000, 500, 1000) == pytest.approx(
+        (1000 * 2 + 1000 * 1 + 500 * 8) / 1_000_000)
+    assert compute_cost("unknown-model", 100, 100) is None
+
+
+@pytest.mark.asyncio
+async def test_usage_is_aggregated_per_agent_model_and_run(execution_logger):
+    from src.utils.llm_registry import ManagedChatOpenAI
+
+    responses = iter([chat_response("一", 1000, 200, cached_tokens=400),
+                      chat_response("二", 3000, 100)])
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json=next(responses)))
+    llm = ManagedChatOpenAI(model="test-model", api_key="k", base_url="http://llm.test/v1",
+                            max_retries=0, http_async_client=httpx.AsyncClient(transport=transport))
+
+    technical = UsageCallbackHandler("technical_agent")
+    summary = UsageCallbackHandler("summary_agent")
+    await llm.ainvoke("第一步", config={"callbacks": [technical]})
+    await llm.ainvoke("总结", config={"callbacks": [summary]})
+
+    assert technical.totals["prompt_tokens"] == 1000
+    assert technical.totals["cached_tokens"] == 400
+    assert technical.totals["cost"] == pytest.approx(compute_cost("test-model", 1000, 200, 400))
+
+    usage = execution_logger.token_usage
+    assert usage["run"]["calls"] == 2
+    assert usage["run"]["total_tokens"] == 4300
+    assert set(usage["by_agent"]) == {"technical_agent", "summary_agent"}
+    assert usage["by_model"]["test-model"]["completion_tokens"] == 300
+    assert usage["run"]["first_token_seconds"] > 0
+
+    info = execution_logger.finalize_execution()
+    assert info["summary"]["token_usage"]["by_agent"]["summary_agent"]["prompt_tokens"] == 3000
+    summary_md = (execution_logger.execution_dir / "EXECUTION_SUMMARY.md").read_text(encoding="utf-8")
+    assert "Token用量与成本" in summary_md